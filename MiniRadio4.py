@@ -1,333 +1,620 @@
 import tkinter as tk
-from tkinter import ttk, messagebox, scrolledtext, filedialog
-import serial.tools.list_ports
-from serial import Serial, SerialException
+from tkinter import ttk, messagebox # Dialog modules, scrolledtext, PIL and list_ports are imported where first used
 import threading
 import queue
 import platform
 import io # For byte streams
-from PIL import Image, ImageTk # For image handling
 import time 
 import re # For parsing memory slot data
 import math 
+import bisect
+import shutil
+import json
+from collections import deque
+import csv
+import os
+import sys
+import argparse
+from radio_core import (CMD_VOLUME_UP, CMD_VOLUME_DOWN, CMD_BAND_NEXT, CMD_BAND_PREV, CMD_MODE_NEXT, CMD_MODE_PREV, CMD_STEP_NEXT, CMD_STEP_PREV,
+                        CMD_BW_NEXT, CMD_BW_PREV, CMD_AGC_ATT_UP, CMD_AGC_ATT_DOWN, CMD_BL_UP, CMD_BL_DOWN, CMD_CAL_UP, CMD_CAL_DOWN,
+                        CMD_SLEEP_ON, CMD_SLEEP_OFF, CMD_SCREENSHOT, CMD_SHOW_MEM, CMD_ENCODER_UP, CMD_ENCODER_DOWN, CMD_ENCODER_BTN,
+                        MODES, BANDS, MemorySlotSync, RadioStatus, TelemetryLogger, ConsoleLog, RadioController, ProcessRadioController, PortProber)
 
 # --- Tooltip Class ---
 class Tooltip:
+    shared_window = None; shared_label = None # One Toplevel reused by every tooltip, shown/withdrawn on hover
+
     def __init__(self, widget, text):
-        self.widget = widget; self.text = text; self.tooltip_window = None
+        self.widget = widget; self.text = text
         self.widget.bind("<Enter>", self.show_tip)
         self.widget.bind("<Leave>", self.hide_tip)
         self.widget.bind("<ButtonPress>", self.hide_tip) 
 
     def show_tip(self, event=None):
         if not self.widget.winfo_exists(): return
-        if self.tooltip_window: self.tooltip_window.destroy(); self.tooltip_window = None
-        
-        x = event.x_root + 15 
-        y = event.y_root + 10 
-        
-        self.tooltip_window = tk.Toplevel(self.widget)
-        self.tooltip_window.wm_overrideredirect(True)
-        self.tooltip_window.wm_geometry(f"+{x}+{y}")
-
-        label = ttk.Label(self.tooltip_window, text=self.text, justify='left', 
-                          relief='solid', borderwidth=1, padding=(2,2), background="#FFFFE0", foreground="#000000")
-        label.pack(ipadx=1)
-
-    def hide_tip(self, event=None):
-        if self.tooltip_window: self.tooltip_window.destroy(); self.tooltip_window = None
-
-# --- Serial Command Constants ---
-CMD_VOLUME_UP = 'V'; CMD_VOLUME_DOWN = 'v'; CMD_BAND_NEXT = 'B'; CMD_BAND_PREV = 'b'
-CMD_MODE_NEXT = 'M'; CMD_MODE_PREV = 'm'; CMD_STEP_NEXT = 'S'; CMD_STEP_PREV = 's'
-CMD_BW_NEXT = 'W'; CMD_BW_PREV = 'w'; CMD_AGC_ATT_UP = 'A'; CMD_AGC_ATT_DOWN = 'a'
-CMD_BL_UP = 'L'; CMD_BL_DOWN = 'l'; CMD_CAL_UP = 'I'; CMD_CAL_DOWN = 'i'
-CMD_SLEEP_ON = 'O'; CMD_SLEEP_OFF = 'o'; CMD_TOGGLE_LOG = 't'; CMD_SCREENSHOT = 'C'
-CMD_SHOW_MEM = '$'; CMD_SET_MEM_PREFIX = '#'
-CMD_ENCODER_UP = 'R'; CMD_ENCODER_DOWN = 'r'; CMD_ENCODER_BTN = 'e'
-CMD_THEME_EDITOR_TOGGLE = 'T'; CMD_THEME_GET = '@'; CMD_THEME_SET_SUFFIX = '!'
-
-
-class RadioController:
-    SCREENSHOT_DATA_INACTIVITY_TIMEOUT = 10.0 
-    MEMORY_DATA_INACTIVITY_TIMEOUT = 1.2 
-    THEME_DATA_INACTIVITY_TIMEOUT = 3.0 
-    MEMORY_SLOT_PATTERN = re.compile(r"^#?\s*(\d{1,2})\s*,\s*([^,]*?)\s*,\s*(\d+)\s*,\s*([^,]*?)\s*$")
-    DATA_LOG_PATTERN = re.compile(r"^\s*\d+\s*(?:,\s*[^,]*\s*){14}$")
-    THEME_STRING_LINE_PATTERN = re.compile(r"^Color theme [^:]*:\s*((?:x[0-9a-fA-F]{4})+)$")
-
-
-    def __init__(self):
-        self.ser = None; self.running = False
-        self.data_queue = queue.Queue(); self.data_received = False
-        self.sleep_mode = False
-        self.expecting_screenshot_data = False; self.screenshot_hex_buffer = ""; self.last_screenshot_hex_byte_time = 0 
-        self.screenshot_request_time = 0 
-        self.expecting_memory_slots = False; self.memory_slots_buffer = []; self.last_memory_slot_time = 0
-        self.log_is_on_before_special_op = False 
-        self.line_assembly_buffer_bytes = b"" 
-
-        self.expecting_theme_string = False
-        self.theme_string_buffer = ""
-        self.last_theme_data_time = 0
-        self.theme_get_sequence_active = False
-
-
-    def connect(self, port, baudrate=115200):
-        try:
-            self.ser = Serial(port, int(baudrate), timeout=0.1) 
-            self.running = True; self.data_received = False
-            self.expecting_screenshot_data = False; self.screenshot_hex_buffer = ""; self.last_screenshot_hex_byte_time = 0
-            self.screenshot_request_time = 0
-            self.expecting_memory_slots = False; self.memory_slots_buffer = []; self.last_memory_slot_time = 0
-            self.line_assembly_buffer_bytes = b"" 
-            
-            self.expecting_theme_string = False; self.theme_string_buffer = ""; 
-            self.last_theme_data_time = 0; self.theme_get_sequence_active = False
-
-            threading.Thread(target=self.read_serial, daemon=True).start()
-            self.send_command(CMD_TOGGLE_LOG, is_user_toggle=True) 
-            return True
-        except ValueError: messagebox.showerror("Baud Rate Error", f"Invalid baud rate: {baudrate}."); return False
-        except SerialException as e: messagebox.showerror("Connection Error", f"Failed to connect to {port} at {baudrate} baud: {str(e)}"); return False
-        except Exception as e: messagebox.showerror("Error", f"An unexpected error during connection: {str(e)}"); return False
-
-    def disconnect(self):
-        self.running = False; time.sleep(0.05) 
-        if self.ser and self.ser.is_open: self.ser.close(); print("Serial port closed by disconnect().")
-        self.data_received = False; self.expecting_screenshot_data = False; self.expecting_memory_slots = False
-        self.screenshot_hex_buffer = ""; self.memory_slots_buffer = []
-        self.last_screenshot_hex_byte_time = 0; self.last_memory_slot_time = 0
-        self.line_assembly_buffer_bytes = b""
-        
-        self.expecting_theme_string = False; self.theme_string_buffer = ""; 
-        self.last_theme_data_time = 0; self.theme_get_sequence_active = False
-
-
-    def _send_raw_command(self, cmd_char):
-        if self.ser and self.ser.is_open:
-            try:
-                self.ser.write(cmd_char.encode() + b'\n')
-            except Exception as e:
-                print(f"Controller: Error sending raw command '{cmd_char}': {e}")
-
-    def send_command(self, cmd, is_user_toggle=False):
-        if not (self.ser and self.ser.is_open):
-            if cmd in [CMD_SCREENSHOT, CMD_SHOW_MEM]: 
-                messagebox.showwarning("Not Connected", "Connect to radio first.")
+        Tooltip.show_shared(self.widget, self.text, event.x_root + 15, event.y_root + 10)
+
+    def hide_tip(self, event=None): Tooltip.hide_shared()
+
+    @classmethod
+    def show_shared(cls, widget, text, x, y):
+        if cls.shared_window is None or not cls.shared_window.winfo_exists():
+            cls.shared_window = tk.Toplevel(widget.nametowidget('.'))
+            cls.shared_window.wm_overrideredirect(True)
+            cls.shared_label = ttk.Label(cls.shared_window, justify='left', 
+                                         relief='solid', borderwidth=1, padding=(2,2), background="#FFFFE0", foreground="#000000")
+            cls.shared_label.pack(ipadx=1)
+        cls.shared_label.config(text=text)
+        cls.shared_window.wm_geometry(f"+{x}+{y}")
+        cls.shared_window.deiconify(); cls.shared_window.lift()
+
+    @classmethod
+    def hide_shared(cls, event=None):
+        if cls.shared_window is not None and cls.shared_window.winfo_exists(): cls.shared_window.withdraw()
+
+# --- Swatch Canvas ---
+class SwatchCanvas(tk.Canvas):
+    """Draws color swatches as items on one canvas. Items are updated in place and share the Tooltip window."""
+    SWATCH_SIZE = 20; SWATCH_CELL = 22; TITLE_HEIGHT = 20
+
+    def __init__(self, parent, **kwargs):
+        super().__init__(parent, width=1, height=1, highlightthickness=0, **kwargs)
+        self.bands = {}; self.item_info = {}; self.hover_item = None
+        self.bind("<Motion>", self._on_motion)
+        self.bind("<Leave>", self._on_leave)
+        self.bind("<Button-1>", self._on_click)
+
+    def set_band(self, name, top, swatches=(), title=None, bold=True):
+        # swatches: (col, row, fill, tooltip[, on_click[, outline]]) relative to the band's top-left corner
+        band = self.bands.get(name)
+        if band is None: band = self.bands[name] = {'rects': [], 'title': self.create_text(0, 0, anchor='n')}
+        swatches = list(swatches); rects = band['rects']
+        self.itemconfigure(band['title'], text=title or "", font=('Helvetica', 10, 'bold' if bold else 'normal'), state='normal' if title else 'hidden')
+        swatch_top = top + (self.TITLE_HEIGHT if title else 0)
+
+        while len(rects) < len(swatches): rects.append(self.create_rectangle(0, 0, 0, 0))
+        cols = rows = 0
+        for item_id, (col, row, fill, tip, *extra) in zip(rects, swatches):
+            x = col * self.SWATCH_CELL + 1; y = swatch_top + row * self.SWATCH_CELL + 1
+            self.coords(item_id, x, y, x + self.SWATCH_SIZE, y + self.SWATCH_SIZE)
+            self.itemconfigure(item_id, fill=fill, outline=extra[1] if len(extra) > 1 else 'grey', state='normal')
+            self.item_info[item_id] = (tip, extra[0] if extra else None)
+            cols = max(cols, col + 1); rows = max(rows, row + 1)
+        for item_id in rects[len(swatches):]:
+            self.itemconfigure(item_id, state='hidden'); self.item_info.pop(item_id, None)
+
+        title_bbox = self.bbox(band['title']) if title else None
+        band.update(top=top, width=max(cols * self.SWATCH_CELL, (title_bbox[2] - title_bbox[0]) if title_bbox else 0),
+                    bottom=swatch_top + rows * self.SWATCH_CELL)
+        self._fit()
+
+    def _fit(self):
+        width = max([band['width'] for band in self.bands.values()] + [1])
+        height = max([band['bottom'] for band in self.bands.values()] + [1])
+        for band in self.bands.values(): self.coords(band['title'], width / 2, band['top'] + 2)
+        self.configure(width=width + 2, height=height + 2)
+
+    def _on_motion(self, event):
+        current = self.find_withtag('current'); item_id = current[0] if current else None
+        if item_id == self.hover_item: return
+        self.hover_item = item_id
+        info = self.item_info.get(item_id)
+        if info: Tooltip.show_shared(self, info[0], event.x_root + 15, event.y_root + 10)
+        else: Tooltip.hide_shared()
+
+    def _on_leave(self, event=None):
+        self.hover_item = None; Tooltip.hide_shared()
+
+    def _on_click(self, event):
+        self._on_leave()
+        current = self.find_withtag('current'); info = self.item_info.get(current[0]) if current else None
+        if info and info[1]: info[1]()
+
+# --- Virtual Table ---
+class VirtualTable(ttk.Frame):
+    """Canvas table that draws only the visible rows from a reused item pool.
+    Rows are (values, sort_keys, payload) tuples; sort, filter and type-ahead work on plain lists, so 100k rows stay responsive."""
+    ROW_HEIGHT = 20; HEADER_HEIGHT = 22; CHAR_WIDTH = 7; TYPEAHEAD_RESET = 1.0
+
+    def __init__(self, parent, columns, on_activate=None, activate_column=0, stretch_column=None, typeahead_column=0, **kwargs):
+        # columns: (title, width, anchor); clicking activate_column (or Enter / double-click) calls on_activate(payload)
+        super().__init__(parent, **kwargs)
+        self.columns = columns; self.on_activate = on_activate; self.activate_column = activate_column
+        self.stretch_column = stretch_column; self.typeahead_column = typeahead_column
+        self.rows = []; self.search_text = []; self.view = []; self.filter_text = ""; self.sort_column = None; self.sort_reverse = False
+        self.top = 0; self.selected_payload = None; self.selected_view_idx = None
+        self.typeahead_prefix = ""; self.typeahead_time = 0
+        self.header_items = []; self.row_pool = []
+
+        self.canvas = tk.Canvas(self, highlightthickness=0, background="white", takefocus=1)
+        self.scrollbar = ttk.Scrollbar(self, orient=tk.VERTICAL, command=self._on_scrollbar)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.canvas.bind("<Configure>", lambda e: self.redraw())
+        self.canvas.bind("<Button-1>", self._on_click)
+        self.canvas.bind("<Double-Button-1>", lambda e: self._activate_selected())
+        self.canvas.bind("<MouseWheel>", lambda e: self.scroll(-3 if e.delta > 0 else 3))
+        self.canvas.bind("<Button-4>", lambda e: self.scroll(-3))
+        self.canvas.bind("<Button-5>", lambda e: self.scroll(3))
+        self.canvas.bind("<Key>", self._on_key)
+
+    @staticmethod
+    def search_texts(rows): return ["\x1f".join(r[0]).lower() for r in rows]
+
+    def set_rows(self, rows, search_text=None):
+        # search_text (one per row, from search_texts) lets callers reuse it for rows that did not change
+        self.rows = rows; self.search_text = self.search_texts(rows) if search_text is None else search_text # Filtering is a plain substring scan
+        self._rebuild_view(); self.redraw()
+
+    def set_filter(self, text):
+        text = text.strip().lower()
+        narrowing = bool(self.filter_text) and text.startswith(self.filter_text) # Typing more only narrows the current view
+        self.filter_text = text; self._rebuild_view(narrowing); self.top = 0; self.redraw()
+
+    def sort_by(self, column):
+        if self.sort_column == column: self.sort_reverse = not self.sort_reverse
+        else: self.sort_column = column; self.sort_reverse = False
+        self._rebuild_view(); self.redraw()
+
+    def scroll(self, delta_rows):
+        self.top += delta_rows; self.redraw()
+
+    def _rebuild_view(self, narrowing=False):
+        rows = self.rows
+        candidates = self.view if narrowing else range(len(rows))
+        if self.filter_text:
+            needle = self.filter_text; search_text = self.search_text
+            candidates = [i for i in candidates if needle in search_text[i]]
+        view = list(candidates)
+        if self.sort_column is not None and not narrowing:
+            col = self.sort_column
+            view.sort(key=lambda i: rows[i][1][col], reverse=self.sort_reverse)
+        self.view = view; self.selected_view_idx = None
+
+    def _visible_count(self): return max(1, (self.canvas.winfo_height() - self.HEADER_HEIGHT) // self.ROW_HEIGHT)
+
+    def _column_positions(self, width):
+        extra = max(0, width - sum(c[1] for c in self.columns))
+        positions = []; x = 0
+        for i, (title, col_width, anchor) in enumerate(self.columns):
+            col_width += extra if i == self.stretch_column else 0
+            positions.append((x, col_width, anchor)); x += col_width
+        return positions
+
+    def _selected_index(self):
+        if self.selected_payload is None: return None
+        idx = self.selected_view_idx
+        if idx is None or idx >= len(self.view) or self.rows[self.view[idx]][2] != self.selected_payload:
+            idx = next((vi for vi, ri in enumerate(self.view) if self.rows[ri][2] == self.selected_payload), None)
+            self.selected_view_idx = idx
+        return idx
+
+    def redraw(self):
+        width = max(self.canvas.winfo_width(), 1); visible = self._visible_count()
+        self.top = max(0, min(self.top, len(self.view) - visible))
+        positions = self._column_positions(width)
+
+        if not self.header_items:
+            for _ in self.columns:
+                self.header_items.append((self.canvas.create_rectangle(0, 0, 0, 0, fill="#e4e4e4", outline="#b0b0b0", tags="header"),
+                                          self.canvas.create_text(0, 0, font=('Helvetica', 9, 'bold'), tags="header")))
+        for i, ((x, col_width, anchor), (rect_id, text_id)) in enumerate(zip(positions, self.header_items)):
+            arrow = (" ▼" if self.sort_reverse else " ▲") if i == self.sort_column else ""
+            self.canvas.coords(rect_id, x, 0, x + col_width, self.HEADER_HEIGHT)
+            self.canvas.coords(text_id, x + col_width / 2, self.HEADER_HEIGHT / 2)
+            self.canvas.itemconfigure(text_id, text=self.columns[i][0] + arrow)
+
+        while len(self.row_pool) < visible + 1:
+            self.row_pool.append((self.canvas.create_rectangle(0, 0, 0, 0, width=0),
+                                  [self.canvas.create_text(0, 0) for _ in self.columns]))
+        selected_idx = self._selected_index()
+        for slot, (bg_id, text_ids) in enumerate(self.row_pool):
+            view_idx = self.top + slot
+            if slot > visible or view_idx >= len(self.view):
+                self.canvas.itemconfigure(bg_id, state='hidden')
+                for text_id in text_ids: self.canvas.itemconfigure(text_id, state='hidden')
+                continue
+            values = self.rows[self.view[view_idx]][0]
+            y = self.HEADER_HEIGHT + slot * self.ROW_HEIGHT
+            fill = "#cce4ff" if view_idx == selected_idx else ("#f4f4f4" if view_idx % 2 else "white")
+            self.canvas.coords(bg_id, 0, y, width, y + self.ROW_HEIGHT); self.canvas.itemconfigure(bg_id, fill=fill, state='normal')
+            for (x, col_width, anchor), text_id, value in zip(positions, text_ids, values):
+                max_chars = max(1, (col_width - 6) // self.CHAR_WIDTH)
+                text = value if len(value) <= max_chars else value[:max_chars - 1] + "…"
+                text_x = x + 3 if anchor == 'w' else (x + col_width - 3 if anchor == 'e' else x + col_width / 2)
+                self.canvas.coords(text_id, text_x, y + self.ROW_HEIGHT / 2)
+                self.canvas.itemconfigure(text_id, text=text, anchor=anchor if anchor in ('w', 'e') else 'center', state='normal')
+        self.canvas.tag_raise("header")
+
+        total = len(self.view)
+        if total: self.scrollbar.set(self.top / total, min(1.0, (self.top + visible) / total))
+        else: self.scrollbar.set(0, 1)
+
+    def _on_scrollbar(self, action, value, unit=None):
+        if action == 'moveto': self.top = int(float(value) * len(self.view))
+        elif action == 'scroll': self.top += int(value) * (1 if unit == 'units' else self._visible_count())
+        self.redraw()
+
+    def _column_at(self, x):
+        for i, (col_x, col_width, _) in enumerate(self._column_positions(max(self.canvas.winfo_width(), 1))):
+            if col_x <= x < col_x + col_width: return i
+        return None
+
+    def _select_view_index(self, view_idx):
+        if not self.view: return
+        view_idx = max(0, min(view_idx, len(self.view) - 1))
+        self.selected_payload = self.rows[self.view[view_idx]][2]; self.selected_view_idx = view_idx
+        visible = self._visible_count()
+        if view_idx < self.top: self.top = view_idx
+        elif view_idx >= self.top + visible: self.top = view_idx - visible + 1
+        self.redraw()
+
+    def _activate_selected(self):
+        if self.on_activate and self.selected_payload is not None: self.on_activate(self.selected_payload)
+
+    def _on_click(self, event):
+        self.canvas.focus_set()
+        column = self._column_at(event.x)
+        if event.y < self.HEADER_HEIGHT:
+            if column is not None: self.sort_by(column)
             return
+        view_idx = self.top + int((event.y - self.HEADER_HEIGHT) // self.ROW_HEIGHT)
+        if view_idx >= len(self.view): return
+        self._select_view_index(view_idx)
+        if column == self.activate_column: self._activate_selected()
+
+    def _on_key(self, event):
+        selected_idx = self._selected_index(); current = selected_idx if selected_idx is not None else -1
+        moves = {'Up': -1, 'Down': 1, 'Prior': -self._visible_count(), 'Next': self._visible_count(), 'Home': -len(self.view), 'End': len(self.view)}
+        if event.keysym in moves: self._select_view_index(current + moves[event.keysym]); return "break"
+        if event.keysym == 'Return': self._activate_selected(); return "break"
+        if event.char and event.char.isprintable():
+            now = time.monotonic()
+            if now - self.typeahead_time > self.TYPEAHEAD_RESET: self.typeahead_prefix = ""
+            self.typeahead_prefix += event.char.lower(); self.typeahead_time = now
+            col = self.sort_column if self.sort_column is not None else self.typeahead_column
+            for view_idx, row_idx in enumerate(self.view):
+                if self.rows[row_idx][0][col].lower().startswith(self.typeahead_prefix):
+                    self._select_view_index(view_idx); break
+            return "break"
+
+
+# --- Preset Library ---
+class PresetLibrary:
+    """Unlimited local station presets kept in a CSV file (name, band, freq_hz, mode)."""
+    DEFAULT_PATH = os.path.join(os.path.expanduser("~"), ".miniradio", "presets.csv")
+    FIELDS = ['name', 'band', 'freq_hz', 'mode']
+
+    def __init__(self, path=DEFAULT_PATH):
+        self.path = path; self.presets = None; self.version = 0
+
+    def load(self):
+        if self.presets is None:
+            try: self.presets = self.read_csv(self.path) if os.path.exists(self.path) else []
+            except (OSError, ValueError, csv.Error) as e: print(f"App: Could not load presets: {e}"); self.presets = []
+        return self.presets
+
+    @classmethod
+    def read_csv(cls, file_path):
+        presets = []
+        with open(file_path, newline='', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                freq_str = str(row.get('freq_hz') or '').strip()
+                if freq_str.isdigit():
+                    presets.append({'name': (row.get('name') or '').strip(), 'band': (row.get('band') or '').strip(),
+                                    'freq_hz': int(freq_str), 'mode': (row.get('mode') or '').strip()})
+        return presets
+
+    def add(self, presets):
+        self.load().extend(presets); self.version += 1; self.save()
+
+    def save(self):
         try:
-            if cmd in [CMD_SCREENSHOT, CMD_SHOW_MEM]: 
-                if self.log_is_on_before_special_op: 
-                    self._send_raw_command(CMD_TOGGLE_LOG); time.sleep(0.05)
-            
-            if cmd == CMD_SCREENSHOT:
-                self.expecting_screenshot_data = True 
-                self.screenshot_hex_buffer = ""; self.last_screenshot_hex_byte_time = time.time() 
-                self.screenshot_request_time = time.time() 
-                self.ser.write(cmd.encode() + b'\n')
-            elif cmd == CMD_SHOW_MEM:
-                self.expecting_memory_slots = True
-                self.memory_slots_buffer = []; self.last_memory_slot_time = time.time()
-                self.ser.write(cmd.encode() + b'\n')
-            else: 
-                self.ser.write(cmd.encode() + b'\n') 
-
-            if cmd == CMD_TOGGLE_LOG and is_user_toggle: 
-                self.log_is_on_before_special_op = not self.log_is_on_before_special_op 
-                print(f"Ctrl: Log toggled by user. Assumed radio log state: {'ON' if self.log_is_on_before_special_op else 'OFF'}")
-
-        except Exception as e: 
-            print(f"Ctrl: Error sending '{cmd}': {e}"); self.data_queue.put(('serial_error_disconnect', f"Send error: {e}"))
-
-    def request_theme_data(self):
-        if not (self.ser and self.ser.is_open):
-            self.data_queue.put(('theme_data_error', "Not connected to radio."))
-            return
-        
-        if self.log_is_on_before_special_op: 
-            self._send_raw_command(CMD_TOGGLE_LOG) 
-            time.sleep(0.05) 
-
-        self._send_raw_command(CMD_THEME_EDITOR_TOGGLE) 
-        time.sleep(0.05) 
-
-        self.expecting_theme_string = True
-        self.theme_string_buffer = ""
-        self.last_theme_data_time = time.time()
-        self.theme_get_sequence_active = True 
-
-        self._send_raw_command(CMD_THEME_GET) 
-
-
-    def _is_hex_string(self, s): return bool(s) and all(c in "0123456789abcdefABCDEF" for c in s)
-    def _is_memory_slot_line(self, line): return bool(self.MEMORY_SLOT_PATTERN.match(line.strip()))
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, 'w', newline='', encoding='utf-8') as f:
+                writer = csv.DictWriter(f, fieldnames=self.FIELDS); writer.writeheader(); writer.writerows(self.load())
+            os.replace(tmp_path, self.path)
+        except OSError as e: print(f"App: Could not save presets: {e}")
+
+
+# --- Station Database ---
+class StationDatabase:
+    """Broadcast schedule entries indexed by frequency (sorted array + bisect) for per-status station lookup.
+
+    Reads EiBi-style ';' schedules (kHz;Time(UTC);Days;ITU;Station;Lng;...) and plain CSV files with
+    freq_khz or freq_hz, name, language and optional start_utc/end_utc (HHMM) columns.
+    """
+    DEFAULT_DIR = os.path.join(os.path.expanduser("~"), ".miniradio", "stations")
+    FILE_EXTENSIONS = ('.csv', '.txt')
+    MATCH_TOLERANCE_HZ = 2500; FM_MATCH_TOLERANCE_HZ = 50000
+    MAX_NAMES_SHOWN = 3
+
+    def __init__(self, directory=DEFAULT_DIR):
+        self.directory = directory
+        self.index = ([], []) # (sorted freq_hz list, entries in the same order); swapped as one object after a load
+        self.loading = False
+        self._last_lookup = (None, None)
+
+    def __len__(self): return len(self.index[0])
+
+    @staticmethod
+    def _parse_hhmm(text):
+        text = text.strip()
+        if len(text) != 4 or not text.isdigit(): return None
+        return int(text[:2]) * 60 + int(text[2:])
+
+    @classmethod
+    def read_file(cls, file_path):
+        """Returns a list of (freq_hz, start_min, end_min, name, language) entries; start/end are None for all day."""
+        entries = []
+        with open(file_path, newline='', encoding='utf-8', errors='replace') as f:
+            header_line = f.readline()
+            delimiter = ';' if header_line.count(';') > header_line.count(',') else ','
+            header = [re.sub(r':\d+$', '', h.strip().lower()) for h in next(csv.reader([header_line], delimiter=delimiter))] # EiBi headers carry widths, e.g. 'kHz:75'
+            def column(*names): return next((header.index(n) for n in names if n in header), None)
+            khz_col = column('khz', 'freq_khz', 'frequency_khz'); hz_col = column('freq_hz')
+            name_col = column('station', 'name'); lang_col = column('lng', 'language', 'lang')
+            time_col = column('time(utc)', 'time_utc'); start_col = column('start_utc'); end_col = column('end_utc')
+            if (khz_col is None and hz_col is None) or name_col is None: raise ValueError("No frequency/name columns in header.")
+            for row in csv.reader(f, delimiter=delimiter):
+                try:
+                    freq_hz = int(row[hz_col]) if hz_col is not None else int(round(float(row[khz_col]) * 1000))
+                    name = row[name_col].strip()
+                except (ValueError, IndexError): continue
+                if freq_hz <= 0 or not name: continue
+                start = end = None
+                if time_col is not None and time_col < len(row) and '-' in row[time_col]:
+                    start_text, end_text = row[time_col].split('-', 1); start = cls._parse_hhmm(start_text); end = cls._parse_hhmm(end_text)
+                elif start_col is not None and end_col is not None and end_col < len(row):
+                    start = cls._parse_hhmm(row[start_col]); end = cls._parse_hhmm(row[end_col])
+                if start is None or end is None or (end - start) % 1440 == 0: start = end = None # 0000-2400 and unknown windows mean all day
+                language = row[lang_col].strip() if lang_col is not None and lang_col < len(row) else ''
+                entries.append((freq_hz, start, end, name, language))
+        return entries
+
+    def schedule_files(self):
+        try: names = sorted(os.listdir(self.directory))
+        except OSError: return []
+        return [os.path.join(self.directory, n) for n in names if n.lower().endswith(self.FILE_EXTENSIONS)]
+
+    def load(self):
+        """Reads every schedule file in the directory and swaps in a new index. Safe to run off the GUI thread."""
+        self.loading = True
+        try:
+            entries = []
+            for file_path in self.schedule_files():
+                try: entries.extend(self.read_file(file_path))
+                except (OSError, ValueError, csv.Error) as e: print(f"App: Skipping station schedule '{file_path}': {e}")
+            entries.sort(key=lambda e: e[0])
+            self.index = ([e[0] for e in entries], entries)
+            self._last_lookup = (None, None)
+            print(f"App: Station database loaded {len(entries)} entries.")
+            return len(entries)
+        finally: self.loading = False
+
+    def install(self, file_path):
+        """Validates a schedule file and copies it into the database directory. Returns its entry count."""
+        count = len(self.read_file(file_path))
+        os.makedirs(self.directory, exist_ok=True)
+        shutil.copyfile(file_path, os.path.join(self.directory, os.path.basename(file_path)))
+        return count
+
+    def lookup(self, freq_hz, mode=None, utc_minute=None):
+        """Returns the names on air at freq_hz (nearest frequency first), or '' when nothing matches."""
+        if utc_minute is None: utc_minute = int(time.time() // 60) % 1440
+        index = self.index
+        key = (id(index), freq_hz, mode, utc_minute)
+        if self._last_lookup[0] == key: return self._last_lookup[1] # Status frames repeat the same frequency most of the time
+        freqs, entries = index
+        tolerance = self.FM_MATCH_TOLERANCE_HZ if mode == 'FM' else self.MATCH_TOLERANCE_HZ
+        lo = bisect.bisect_left(freqs, freq_hz - tolerance); hi = bisect.bisect_right(freqs, freq_hz + tolerance)
+        on_air = []
+        for entry_freq, start, end, name, language in entries[lo:hi]:
+            if start is not None and not (start <= utc_minute < end if start < end else (utc_minute >= start or utc_minute < end)): continue
+            on_air.append((abs(entry_freq - freq_hz), name, language))
+        on_air.sort(key=lambda m: m[0])
+        names = []
+        for _, name, language in on_air:
+            label = f"{name} ({language})" if language else name
+            if label not in names: names.append(label)
+        result = " / ".join(names[:self.MAX_NAMES_SHOWN]) + (f" +{len(names) - self.MAX_NAMES_SHOWN}" if len(names) > self.MAX_NAMES_SHOWN else "")
+        self._last_lookup = (key, result)
+        return result
+
+
+# --- Memory Slot Cache ---
+class MemorySlotCache:
+    """Persists the last known memory slots per radio, keyed by port and firmware version, so the viewer opens instantly."""
+    DEFAULT_PATH = os.path.join(os.path.expanduser("~"), ".miniradio", "memory_cache.json")
+
+    def __init__(self, path=DEFAULT_PATH):
+        self.path = path; self.entries = {}
+        try:
+            with open(self.path, encoding='utf-8') as f: self.entries = json.load(f)
+        except (OSError, ValueError): self.entries = {}
 
-    def _finalize_special_op(self, operation_type):
-        if operation_type == "Screenshot":
-            self.expecting_screenshot_data = False; self.last_screenshot_hex_byte_time = 0
-            if self.screenshot_hex_buffer: 
-                transfer_duration = time.time() - self.screenshot_request_time
-                self.data_queue.put(('screenshot_data', (self.screenshot_hex_buffer, transfer_duration) ))
-            else: 
-                self.data_queue.put(('screenshot_error', "No screenshot data received."))
-            self.screenshot_hex_buffer = ""
-        elif operation_type == "Memory":
-            self.expecting_memory_slots = False; self.last_memory_slot_time = 0
-            if self.memory_slots_buffer:  
-                self.data_queue.put(('memory_slots_data', list(self.memory_slots_buffer)))
-            else: 
-                 self.data_queue.put(('memory_slots_error', "No memory slot data received."))
-            self.memory_slots_buffer = []
-        elif operation_type == "ThemeGet":
-            self.expecting_theme_string = False
-            self.last_theme_data_time = 0
-            
-            self._send_raw_command(CMD_THEME_EDITOR_TOGGLE) 
-            time.sleep(0.05) 
-            self.theme_get_sequence_active = False
+    @staticmethod
+    def key(port, firmware_version): return f"{port}|{firmware_version if firmware_version is not None else 'unknown'}"
 
-            if self.theme_string_buffer:
-                self.data_queue.put(('theme_data', self.theme_string_buffer))
-            else:
-                self.data_queue.put(('theme_data_error', "No theme string received or timeout." ))
-            self.theme_string_buffer = ""
-        
-        if self.log_is_on_before_special_op and operation_type != "ThemeEditorToggle": 
-            time.sleep(0.1); self._send_raw_command(CMD_TOGGLE_LOG);
-        
+    def get(self, port, firmware_version): return self.entries.get(self.key(port, firmware_version))
 
-    def read_serial(self):
-        while self.running and self.ser and self.ser.is_open:
-            try:
-                new_bytes = self.ser.readline() 
-                if new_bytes:
-                    self.line_assembly_buffer_bytes += new_bytes
-                elif not self.line_assembly_buffer_bytes: 
-                    if self.expecting_screenshot_data and \
-                       self.screenshot_hex_buffer and \
-                       self.last_screenshot_hex_byte_time > 0 and \
-                       (time.time() - self.last_screenshot_hex_byte_time > self.SCREENSHOT_DATA_INACTIVITY_TIMEOUT):
-                        self._finalize_special_op("Screenshot")
-                    elif self.expecting_memory_slots and self.memory_slots_buffer and \
-                         self.last_memory_slot_time > 0 and \
-                         (time.time() - self.last_memory_slot_time > self.MEMORY_DATA_INACTIVITY_TIMEOUT):
-                        self._finalize_special_op("Memory")
-                    elif self.expecting_theme_string and self.last_theme_data_time > 0 and \
-                         (time.time() - self.last_theme_data_time > self.THEME_DATA_INACTIVITY_TIMEOUT):
-                        self._finalize_special_op("ThemeGet")
-                    time.sleep(0.01); continue
-
-                while b'\n' in self.line_assembly_buffer_bytes:
-                    complete_line_bytes, self.line_assembly_buffer_bytes = self.line_assembly_buffer_bytes.split(b'\n', 1)
-                    line_str = ""
-                    try:
-                        line_str = complete_line_bytes.decode('ascii').strip()
-                    except UnicodeDecodeError:
-                        op_type_on_error = None
-                        if self.expecting_screenshot_data: op_type_on_error = "Screenshot"
-                        elif self.expecting_memory_slots: op_type_on_error = "Memory"
-                        elif self.expecting_theme_string: op_type_on_error = "ThemeGet"
-                        
-                        if op_type_on_error:
-                            print(f"Ctrl: UnicodeError during {op_type_on_error}.")
-                            err_key = 'screenshot_error' if op_type_on_error == "Screenshot" else \
-                                      'memory_slots_error' if op_type_on_error == "Memory" else 'theme_data_error'
-                            current_buffer = self.screenshot_hex_buffer if op_type_on_error == "Screenshot" else \
-                                             self.memory_slots_buffer if op_type_on_error == "Memory" else \
-                                             self.theme_string_buffer
-                            msg = f"UnicodeDecodeError at start of {op_type_on_error} data."
-                            if current_buffer: msg = f"Unicode corruption after receiving some data for {op_type_on_error}."
-                            self.data_queue.put((err_key, msg))
-
-                            if op_type_on_error == "Screenshot": self.screenshot_hex_buffer = ""
-                            elif op_type_on_error == "Memory": self.memory_slots_buffer = []
-                            elif op_type_on_error == "ThemeGet": self.theme_string_buffer = "" 
-                            self._finalize_special_op(op_type_on_error) 
-                        else: 
-                            try: line_str = complete_line_bytes.decode('utf-8').strip()
-                            except UnicodeDecodeError: print(f"Ctrl: Persistent UnicodeDecodeError: {complete_line_bytes[:60]}..."); line_str = None
-                        
-                        if line_str and not (self.expecting_screenshot_data or self.expecting_memory_slots or self.expecting_theme_string): 
-                            self.data_queue.put(line_str)
-                        continue 
-
-                    if not line_str: 
-                        if self.expecting_screenshot_data and self.screenshot_hex_buffer: self.last_screenshot_hex_byte_time = time.time() 
-                        elif self.expecting_memory_slots and self.memory_slots_buffer: self.last_memory_slot_time = time.time()
-                        elif self.expecting_theme_string: self.last_theme_data_time = time.time() 
-                        continue
+    def store(self, port, firmware_version, slots, read_duration=None):
+        key = self.key(port, firmware_version)
+        previous = self.entries.get(key, {})
+        self.entries[key] = {'updated_at': time.time(), 'read_duration': read_duration if read_duration is not None else previous.get('read_duration'),
+                             'slots': [{k: e.get(k) for k in ('slot_num', 'band', 'freq_hz', 'mode', 'read_at', 'source')} for e in slots]}
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f: json.dump(self.entries, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e: print(f"App: Could not save memory cache: {e}")
+
+
+# --- Console History ---
+class ConsoleHistory:
+    """The serial console widget's lines: the newest max_lines in a ring buffer, and the ones the widget has not shown
+    yet, also at most max_lines, so a stalled GUI catches up with one insert. Every line is also in the session's
+    ConsoleLog, written by the controller's reader, and search reads that file. The log grows for the whole session
+    (about 0.4 MB per hour of status frames); only the ConsoleLog.KEEP_SESSIONS newest logs are kept."""
+    MAX_LINES = 2000
+
+    def __init__(self, max_lines=MAX_LINES):
+        self.max_lines = max_lines; self.lines = deque(maxlen=max_lines); self.pending = deque(maxlen=max_lines)
+
+    def add(self, text):
+        for line in text.rstrip('\n').split('\n'): self.lines.append(line); self.pending.append(line)
+
+    def take_pending(self):
+        pending = list(self.pending); self.pending.clear(); return pending
+
+
+# --- Profiler ---
+class Profiler:
+    """--profile mode: times every Tk 'after' callback and data_queue item, samples all thread stacks on a timer,
+    and on exit writes PREFIX.collapsed (flamegraph.pl / speedscope input) and PREFIX-handlers.txt (slowest handlers)."""
+    SAMPLE_INTERVAL = 0.005
+
+    def __init__(self, prefix="miniradio-profile", sample_interval=SAMPLE_INTERVAL):
+        self.prefix = prefix; self.sample_interval = sample_interval
+        self.handlers = {} # name -> [calls, total_seconds, max_seconds]
+        self.stacks = {}; self.samples = 0
+        self.running = False; self.current_item = None; self._original_after = None; self.sampler = None
+
+    def start(self):
+        original_after = self._original_after = tk.Misc.after; profiler = self
+        def after(widget, ms, func=None, *args):
+            return original_after(widget, ms, profiler.wrap(func) if func is not None else None, *args)
+        tk.Misc.after = after # Every widget's after/after_idle goes through here
+        self.running = True
+        self.sampler = threading.Thread(target=self._sample_loop, name="profiler-sampler", daemon=True); self.sampler.start()
+
+    def record(self, name, seconds):
+        stats = self.handlers.get(name)
+        if stats is None: stats = self.handlers[name] = [0, 0.0, 0.0]
+        stats[0] += 1; stats[1] += seconds; stats[2] = max(stats[2], seconds)
+
+    def wrap(self, func):
+        name = "after:" + getattr(func, '__qualname__', repr(func))
+        def timed(*args):
+            started_at = time.perf_counter()
+            try: return func(*args)
+            finally: self.record(name, time.perf_counter() - started_at)
+        return timed
+
+    def begin_item(self, queue_item):
+        self.end_item()
+        name = f"queue:{queue_item[0]}" if isinstance(queue_item, tuple) else "queue:line"
+        self.current_item = (name, time.perf_counter())
+
+    def end_item(self):
+        if self.current_item:
+            name, started_at = self.current_item; self.current_item = None
+            self.record(name, time.perf_counter() - started_at)
+
+    def _sample_loop(self):
+        own_ident = threading.get_ident()
+        while self.running:
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own_ident: continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{getattr(code, 'co_qualname', code.co_name)} ({os.path.basename(code.co_filename)})".replace(';', ','))
+                    frame = frame.f_back
+                key = names.get(ident, str(ident)).replace(';', ',') + ';' + ';'.join(reversed(stack))
+                self.stacks[key] = self.stacks.get(key, 0) + 1
+            self.samples += 1
+            time.sleep(self.sample_interval)
+
+    def stop(self):
+        if not self.running: return
+        self.running = False; self.end_item()
+        if self._original_after: tk.Misc.after = self._original_after
+        if self.sampler: self.sampler.join(timeout=1.0) # A sample in flight would change stacks while it is written out
+        try:
+            with open(self.prefix + ".collapsed", 'w', encoding='utf-8') as f:
+                for stack, count in sorted(dict(self.stacks).items()): f.write(f"{stack} {count}\n")
+            with open(self.prefix + "-handlers.txt", 'w', encoding='utf-8') as f: f.write(self.format_handlers())
+            print(f"App: Profile written to {self.prefix}.collapsed ({self.samples} samples) and {self.prefix}-handlers.txt")
+        except OSError as e: print(f"App: Could not write profile: {e}")
+
+    def format_handlers(self):
+        lines = [f"{'Handler':<70}{'Calls':>8}{'Total ms':>12}{'Mean ms':>10}{'Max ms':>10}"]
+        for name, (calls, total, longest) in sorted(self.handlers.items(), key=lambda kv: kv[1][2], reverse=True):
+            lines.append(f"{name[:69]:<70}{calls:>8}{total * 1000:>12.1f}{total / calls * 1000:>10.3f}{longest * 1000:>10.1f}")
+        return "\n".join(lines) + "\n"
+
+
+# --- Offline Theme Preview ---
+class ThemePreview:
+    """Recolors a screenshot for an edited theme via a 64K-entry RGB565 lookup table, without radio traffic."""
+    _rgb565_to_rgb888_table = None
+    _np = None # numpy module, False when it isn't installed; imported with the first preview
+
+    @classmethod
+    def _numpy(cls):
+        if cls._np is None:
+            try: import numpy; cls._np = numpy
+            except ImportError: cls._np = False
+        return cls._np
+
+    def __init__(self, pil_image):
+        self.rgb_image = pil_image.convert('RGB'); np = self._numpy()
+        if np:
+            self.rgb_array = np.asarray(self.rgb_image, dtype=np.uint8)
+            a = self.rgb_array.astype(np.uint16)
+            self.pixels_rgb565 = ((a[..., 0] >> 3) << 11) | ((a[..., 1] >> 2) << 5) | (a[..., 2] >> 3)
+        else:
+            self.pixels_rgb565 = [((r >> 3) << 11) | ((g >> 2) << 5) | (b >> 3) for r, g, b in self.rgb_image.getdata()]
+
+    @staticmethod
+    def rgb565_to_rgb888(v): return ((((v >> 11) & 0x1F) * 255 + 15) // 31, (((v >> 5) & 0x3F) * 255 + 31) // 63, ((v & 0x1F) * 255 + 15) // 31)
+
+    @classmethod
+    def _rgb888_table(cls):
+        if cls._rgb565_to_rgb888_table is None:
+            np = cls._numpy(); v = np.arange(65536, dtype=np.uint32)
+            cls._rgb565_to_rgb888_table = np.stack([(((v >> 11) & 0x1F) * 255 + 15) // 31, (((v >> 5) & 0x3F) * 255 + 31) // 63,
+                                                    ((v & 0x1F) * 255 + 15) // 31], axis=-1).astype(np.uint8)
+        return cls._rgb565_to_rgb888_table
+
+    def render(self, original_theme, edited_theme):
+        swaps = {old: new for old, new in zip(original_theme, edited_theme) if old != new}
+        if not swaps: return self.rgb_image
+        from PIL import Image
+        np = self._numpy()
+        if np:
+            lut = np.arange(65536, dtype=np.uint16)
+            lut[np.fromiter(swaps.keys(), dtype=np.uint16)] = np.fromiter(swaps.values(), dtype=np.uint16)
+            remapped = lut[self.pixels_rgb565]
+            changed = remapped != self.pixels_rgb565
+            out = self.rgb_array.copy(); out[changed] = self._rgb888_table()[remapped[changed]]
+            return Image.fromarray(out, 'RGB')
+        out_pixels = list(self.rgb_image.getdata())
+        for i, v in enumerate(self.pixels_rgb565):
+            if v in swaps: out_pixels[i] = self.rgb565_to_rgb888(swaps[v])
+        out_image = Image.new('RGB', self.rgb_image.size); out_image.putdata(out_pixels)
+        return out_image
 
-                    if self.expecting_screenshot_data:
-                        is_hex = self._is_hex_string(line_str)
-                        if is_hex: 
-                            self.screenshot_hex_buffer += line_str
-                        self.last_screenshot_hex_byte_time = time.time() 
-                        
-                        if not is_hex: 
-                            is_simple_ignorable = line_str.strip().upper() == "OK" or \
-                                                  "ERROR: EXPECTED NEWLINE" in line_str.upper() or \
-                                                  line_str.strip().upper() == CMD_SCREENSHOT.upper()
-                            is_data_log = self.DATA_LOG_PATTERN.match(line_str)
-
-                            if is_simple_ignorable:
-                                pass 
-                            elif is_data_log:
-                                self.data_queue.put(line_str)
-                        continue 
-                    
-                    elif self.expecting_memory_slots:
-                        is_slot = self._is_memory_slot_line(line_str)
-                        is_log = self.DATA_LOG_PATTERN.match(line_str)
-                        is_simple_resp = line_str.strip().upper() == "OK" or "Error: Expected newline" in line_str
-
-                        if is_slot: 
-                            self.memory_slots_buffer.append(line_str); self.last_memory_slot_time = time.time()
-                            if len(self.memory_slots_buffer) >= 32: self._finalize_special_op("Memory"); continue
-                        elif self.memory_slots_buffer: 
-                            if is_log or (line_str and not is_simple_resp): 
-                                self._finalize_special_op("Memory")
-                                if is_log: self.data_queue.put(line_str) 
-                                continue
-                            elif is_simple_resp: self.last_memory_slot_time = time.time() 
-                        elif not self.memory_slots_buffer and line_str: 
-                            if is_log: self.data_queue.put(line_str)
-                    
-                    elif self.expecting_theme_string:
-                        match = self.THEME_STRING_LINE_PATTERN.match(line_str)
-                        if match:
-                            self.theme_string_buffer = match.group(1) 
-                            print(f"Ctrl: Matched theme string: {self.theme_string_buffer[:60]}...") 
-                            self._finalize_special_op("ThemeGet") 
-                        elif line_str: 
-                            self.last_theme_data_time = time.time() 
-                    
-                    elif line_str: 
-                        if self.DATA_LOG_PATTERN.match(line_str): self.data_queue.put(line_str)
-
-            except SerialException as e: print(f"Ctrl: Serial read error: {e}"); self.data_queue.put(('serial_error_disconnect', f"Serial read error: {e}")); self.running = False; break 
-            except Exception as e: 
-                print(f"Ctrl: Unexpected error in read loop: {e}")
-                op_type = "Screenshot" if self.expecting_screenshot_data else \
-                          "Memory" if self.expecting_memory_slots else \
-                          "ThemeGet" if self.expecting_theme_string else None
-                if op_type: self._finalize_special_op(op_type)
-                self.data_queue.put(('serial_error_disconnect', f"Read loop error: {e}")); self.running = False; break
 
 class RadioApp(tk.Tk):
     MIN_BATTERY_VOLTAGE = 3.2; MAX_BATTERY_VOLTAGE = 4.2; MAX_VOLUME = 63; MAX_RSSI_SNR = 127
     PERCENTAGE_MULTIPLIER = 100; LABEL_WIDTH = 14; EMOJI_BUTTON_WIDTH = 2 
-    UP_ARROW_EMOJI = "⬆️"; DOWN_ARROW_EMOJI = "⬇️"; REFRESH_EMOJI = "🔃"; SCREENSHOT_EMOJI = "📸"; MEMORY_SLOTS_EMOJI = "💾"
+    UP_ARROW_EMOJI = "⬆️"; DOWN_ARROW_EMOJI = "⬇️"; REFRESH_EMOJI = "🔃"; SCREENSHOT_EMOJI = "📸"; MEMORY_SLOTS_EMOJI = "💾"; DIAGNOSTICS_EMOJI = "📈"
     ENCODER_LEFT_EMOJI = "⬅️"; ENCODER_RIGHT_EMOJI = "➡️"; ENCODER_ARROW_BUTTON_WIDTH = 4 
     BAUD_RATES = [9600, 19200, 38400, 57600, 115200]; DEFAULT_BAUD_RATE = 9600 
     PAD_X_CONN = 2; PAD_Y_CONN = 2; PAD_X_CTRL_GROUP = 5; PAD_Y_CTRL_GROUP = 5 
     PAD_X_MAIN = 5; PAD_Y_MAIN = 5; PAD_LARGE = 10; PAD_MEDIUM = 5; PAD_SMALL = 2
-    MODES = ["AM", "FM", "LSB", "USB", "CW"]; BANDS = ["VHF", "ALL", "LW", "MW", "SW", "160M", "80M", "60M", "40M", "30M", "20M", "17M", "15M", "12M", "10M", "6M", "CB"] 
+    MODES = MODES; BANDS = BANDS 
     KNOB_SIZE = 50; KNOB_INDICATOR_LENGTH = 18; ARROWHEAD_LENGTH = 7; ARROWHEAD_WIDTH = 5
     
     MAX_SWATCHES_TO_DISPLAY = 32 
     MIN_COLOR_COUNT_FOR_PALETTE = 16 
     MAX_THEME_SWATCHES = 37 
+    THEME_MATCH_MAX_DELTA_E = 10.0 # CIELAB distance under which a theme color lines up with a screenshot color
     
     DEFAULT_SCAN_DWELL_TIME = 0.5 
     DEFAULT_FM_SCAN_SNR_THRESHOLD = 12
@@ -336,9 +623,14 @@ class RadioApp(tk.Tk):
     FM_STEP_CYCLE_STRINGS = ["10k", "50k", "100k", "200k", "1m"] 
     FM_SCAN_TARGET_STEP_STR = "100k"
 
+    PRESET_TUNE_SETTLE_TIME = 0.35 
+    PRESET_TUNE_MAX_PASSES = 8 
+    PRESET_TUNE_MAX_BURST = 60 
 
-    def __init__(self):
+
+    def __init__(self, profiler=None, console_lines=ConsoleHistory.MAX_LINES, controller=None):
         super().__init__()
+        self.profiler = profiler
         self.title("ATS-Mini Radio Controller")
         self.resizable(True, True) 
         self.minsize(650, 550) 
@@ -362,31 +654,69 @@ class RadioApp(tk.Tk):
         self.snr_var = tk.StringVar(master=self, value="SNR: --")
         self.batt_var = tk.StringVar(master=self, value="Battery: --")
         self.fw_var = tk.StringVar(master=self, value="Firmware: --")
+        self.station_var = tk.StringVar(master=self, value="Station: --")
+        self.station_db = StationDatabase()
+        self.port_prober = PortProber()
         
-        self.controller = RadioController()
+        self.controller = controller or RadioController()
+        self.controller.report = self.show_controller_report
         self.connected = False
         self.console_visible = False 
-        
-        self.memory_slots_data = [{'slot_num': i, 'band': '', 'freq_hz': '', 'mode': ''} for i in range(1, 33)]
+        self.console_frame = None; self.console = None
+        self.port_scan_active = False; self.port_serial_numbers = {} # Device -> USB serial number, from the last port scan
+        self.console_history = ConsoleHistory(max_lines=console_lines)
+        self.console_log_file = ConsoleLog(ConsoleLog.new_session_path()) # App messages; the controller's reader writes the radio's lines
+        self.controller.console_log_path = self.console_log_file.path
+        self.console_widget_lines = 0
+        self.console_search_var = tk.StringVar(master=self)
+        self.console_search_status_var = tk.StringVar(master=self)
+        self.console_search_after_id = None
+        self.console_search_generation = 0
+        
+        self.memory_slots_data = [{'slot_num': i, 'band': '', 'freq_hz': '', 'mode': '', 'read_at': None, 'source': None} for i in range(1, 33)]
         self.memory_viewer_window = None
-        self.memory_slot_display_vars = {}
-        self.waiting_for_memory_data_to_build_viewer = False 
-        
+        self.memory_table = None
+        self.memory_filter_var = tk.StringVar(master=self)
+        self.memory_filter_after_id = None
+        self.preset_library = PresetLibrary()
+        self.preset_rows_cache = (None, [], [])
+        self.preset_tune_active = False
+        self.current_band = None; self.current_mode = None; self.current_step_str = None; self.current_frequency_hz = None
+        self.memory_cache = MemorySlotCache()
+        self.memory_cache_read_duration = None
+        self.memory_read_started_at = 0
+        self.memory_status_var = tk.StringVar(master=self)
+        self.current_firmware_version = None
+        
+        self.diagnostics_window = None
+        self.diagnostics_text_var = tk.StringVar(master=self)
+
         self.screenshot_window = None 
         self.ss_image_label = None
         self.ss_palette_outer_frame = None
-        self.ss_theme_palette_frame = None 
+        self.ss_swatch_canvas = None 
+        self._lab_cache = {}
         self.ss_refresh_button = None
         self.ss_info_label = None 
         self.last_screenshot_rgb565_palette_order = [] 
         self.initial_screenshot_geometry = None 
 
-        self.theme_palette_frame = None 
+        self.last_screenshot_image = None
+        self.last_radio_theme_colors = []
+        self.theme_editor_window = None
+        self.theme_editor_colors = []
+        self.theme_editor_base_colors = []
+        self.theme_editor_swatch_canvas = None
+        self.theme_preview = None
+        self.theme_preview_label = None
+        self.theme_preview_info_var = tk.StringVar(master=self)
+        self.theme_send_button = None
         self.encoder_click_buttons = [] 
         self.knob_angle_degrees = 0 
 
         self.fm_scan_active = False
         self.fm_scan_stop_requested = False
+        self.auto_reconnect = True; self.reconnecting = False; self.connection_stats = None
         self.fm_scan_results = []
         self.scan_cycle_start_freq_str = "" 
         self.scan_cycle_start_freq_mhz = 0.0 
@@ -430,7 +760,8 @@ class RadioApp(tk.Tk):
         
         self.bind_arrow_keys() 
         self.after(100, lambda: self.process_serial_queue())
-        self.refresh_ports()
+        self.after_idle(self.refresh_ports) # After the first paint
+        self._load_station_database()
         self.protocol("WM_DELETE_WINDOW", self.on_closing); 
 
     def create_styles(self):
@@ -470,8 +801,12 @@ class RadioApp(tk.Tk):
             time.sleep(self.current_scan_dwell_time + 0.2) 
 
         if hasattr(self, 'screenshot_window') and self.screenshot_window and self.screenshot_window.winfo_exists(): self.screenshot_window.destroy() 
+        if self.theme_editor_window and self.theme_editor_window.winfo_exists(): self.theme_editor_window.destroy()
         if self.memory_viewer_window and self.memory_viewer_window.winfo_exists(): self.memory_viewer_window.destroy()
         if self.connected: self.controller.disconnect()
+        if self.controller.latency.histograms: print("App: Latency diagnostics at exit:\n" + self.controller.latency.format_report() + "\n" + self.controller.data_queue.format_counters())
+        if self.connection_stats: print("App: " + RadioController.format_connection_stats(self.connection_stats))
+        self.controller.close_logs(); self.console_log_file.close()
         self.destroy()
 
     def set_os_theme(self): 
@@ -491,6 +826,7 @@ class RadioApp(tk.Tk):
             {'type': 'button', 'text': self.REFRESH_EMOJI, 'command': self.refresh_ports, 'width': self.EMOJI_BUTTON_WIDTH, 'sticky': "w", 'padx': (0, self.PAD_X_CONN), 'tooltip': "Refresh available COM Ports list.", 'name': 'refresh_btn', 'style': 'Emoji.TButton'},
             {'type': 'button', 'text': self.SCREENSHOT_EMOJI, 'command': self.request_screenshot, 'width': self.EMOJI_BUTTON_WIDTH, 'state': tk.DISABLED, 'sticky': "w", 'padx': (0, self.PAD_X_CONN), 'tooltip': "Request Screenshot from Radio (disables log temporarily).", 'name': 'screenshot_btn', 'style': 'Emoji.TButton'},
             {'type': 'button', 'text': self.MEMORY_SLOTS_EMOJI, 'command': self.open_memory_viewer, 'width': self.EMOJI_BUTTON_WIDTH, 'state': tk.DISABLED, 'sticky':"w", 'padx': (0,self.PAD_X_CONN), 'tooltip': "Open Memory Slot Viewer (disables log temporarily).", 'name': 'memory_btn', 'style': 'Emoji.TButton'},
+            {'type': 'button', 'text': self.DIAGNOSTICS_EMOJI, 'command': self.open_diagnostics_window, 'width': self.EMOJI_BUTTON_WIDTH, 'sticky':"w", 'padx': (0,self.PAD_X_CONN), 'tooltip': "Show latency diagnostics (p50/p99 per stage, status frame rate).", 'name': 'diagnostics_btn', 'style': 'Emoji.TButton'},
             {'type': 'button', 'text': "Sleep", 'command': self.toggle_sleep, 'width': 6, 'state': tk.DISABLED, 'sticky': "w", 'padx': (0, self.PAD_X_CONN), 'tooltip': "Toggle Radio Sleep/Wake Mode.", 'name': 'sleep_btn'},
             {'type': 'spacer', 'weight': 1}, 
             {'type': 'checkbutton', 'text': "Console", 'variable_obj': self.console_var, 'command': self.toggle_console, 'sticky': "e", 'padx': (self.PAD_X_MAIN, self.PAD_X_CONN), 'tooltip': "Show/Hide Serial Console Log.", 'name': 'console_chk'},
@@ -518,6 +854,7 @@ class RadioApp(tk.Tk):
             {'var_name': 'agc_status_var', 'initial': "Gain Control: --", 'row': 1, 'col': 0, 'columnspan': 2, 'sticky': "w"}, 
             {'var_name': 'rssi_var',       'initial': "RSSI: --",         'row': 1, 'col': 2, 'sticky': "w"},
             {'var_name': 'fw_var',         'initial': "Firmware: --",     'row': 1, 'col': 3, 'sticky': "w"},
+            {'var_name': 'station_var',    'initial': "Station: --",      'row': 2, 'col': 0, 'columnspan': 4, 'sticky': "w"},
         ]
 
     def create_widgets(self):
@@ -670,12 +1007,60 @@ class RadioApp(tk.Tk):
                 self.snr_level_indicator.grid(row=config['row'], column=config['col'] + 1, padx=(0, self.PAD_SMALL), pady=self.PAD_Y_CONN, sticky="w")
                 Tooltip(self.snr_level_indicator, "Green if SNR >= Floor, Grey otherwise.")
                 self._update_snr_indicator() 
-
-
-        self.console_frame = ttk.LabelFrame(self.main_layout_frame, text="Serial Console") 
-        self.console = scrolledtext.ScrolledText(self.console_frame, height=8, width=70, state=tk.DISABLED, relief="sunken", borderwidth=1, padx=self.PAD_X_CONN, pady=self.PAD_Y_CONN) 
-        self.console.pack(fill="both", expand=True, padx=self.PAD_X_CONN, pady=self.PAD_Y_CONN)
-
+            elif config['var_name'] == 'station_var':
+                label.bind("<Double-Button-1>", lambda e: self.import_station_schedule())
+                Tooltip(label, f"Station on air at the current frequency, from schedules in {StationDatabase.DEFAULT_DIR}.\nDouble-click to import a schedule file (EiBi or CSV).")
+
+
+    def _load_station_database(self, on_done=None):
+        def worker():
+            try: count = self.station_db.load()
+            except Exception as e: print(f"App: Station database load failed: {e}"); count = None
+            if on_done: self.after(0, lambda: on_done(count))
+        threading.Thread(target=worker, daemon=True).start()
+
+    def _update_station_label(self):
+        if not len(self.station_db) or self.current_frequency_hz is None: return
+        station = self.station_db.lookup(self.current_frequency_hz, self.current_mode)
+        text = f"Station: {station}" if station else "Station: --"
+        if text != self.station_var.get(): self.station_var.set(text)
+
+    def import_station_schedule(self):
+        from tkinter import filedialog
+        if self.station_db.loading: messagebox.showinfo("Loading", "The station database is still loading."); return
+        file_path = filedialog.askopenfilename(filetypes=[("Schedule files", "*.csv *.txt"), ("All files", "*.*")], title="Import Station Schedule")
+        if not file_path: return
+        try: count = self.station_db.install(file_path)
+        except Exception as e: messagebox.showerror("Import Error", f"Failed to read station schedule: {e}"); return
+        if not count: messagebox.showwarning("Import", "No station entries found in the file."); return
+        self.station_var.set("Station: loading schedules...")
+        def done(total):
+            self.station_var.set("Station: --"); self._update_station_label()
+            if total is not None: messagebox.showinfo("Schedule Imported", f"Imported {count} entries. Station database now holds {total}.")
+        self._load_station_database(done)
+
+    def _record_line_latency(self, line, dequeued_at, parse_seconds):
+        if getattr(line, 'received_at', None) is None: return
+        now = time.monotonic(); tracer = self.controller.latency
+        tracer.record('queue_wait', dequeued_at - line.queued_at); tracer.record('parse', parse_seconds)
+        tracer.record('tk_apply', now - dequeued_at - parse_seconds); tracer.record('total', now - line.received_at)
+
+    def open_diagnostics_window(self):
+        if self.diagnostics_window and self.diagnostics_window.winfo_exists(): self.diagnostics_window.lift(); return
+        self.diagnostics_window = tk.Toplevel(self); self.diagnostics_window.title("Latency Diagnostics"); self.diagnostics_window.resizable(False, False)
+        ttk.Label(self.diagnostics_window, textvariable=self.diagnostics_text_var, font=('Courier', 10), justify=tk.LEFT).pack(padx=self.PAD_LARGE, pady=self.PAD_LARGE, anchor="w")
+        ttk.Label(self.diagnostics_window, text="reader: byte arrival to queue; queue_wait: in data_queue; parse: status frame; tk_apply: label updates.",
+                  wraplength=460, justify=tk.LEFT).pack(padx=self.PAD_LARGE, anchor="w")
+        button_frame = ttk.Frame(self.diagnostics_window); button_frame.pack(pady=self.PAD_LARGE)
+        ttk.Button(button_frame, text="Reset", command=self.controller.latency.reset).pack(side=tk.LEFT, padx=self.PAD_MEDIUM)
+        ttk.Button(button_frame, text="Close", command=self.diagnostics_window.destroy).pack(side=tk.LEFT, padx=self.PAD_MEDIUM)
+        self._refresh_diagnostics()
+
+    def _refresh_diagnostics(self):
+        if not (self.diagnostics_window and self.diagnostics_window.winfo_exists()): return
+        self.diagnostics_text_var.set(self.controller.latency.format_report() + "\n" + self.controller.data_queue.format_counters() +
+                                      ("\n" + RadioController.format_connection_stats(self.connection_stats) if self.connection_stats else ""))
+        self.after(1000, self._refresh_diagnostics)
 
     def _update_snr_threshold(self, value):
         self.current_fm_scan_snr_threshold = int(float(value))
@@ -764,133 +1149,233 @@ class RadioApp(tk.Tk):
         
         if self.memory_viewer_window and self.memory_viewer_window.winfo_exists():
             self.memory_viewer_window.lift(); self.memory_viewer_window.focus_set()
-            if not self.controller.expecting_memory_slots: 
+            if not (self.controller.expecting_memory_slots or "Memory" in self.controller.queued_ops): 
                 self.special_op_active_for_blink = True 
                 self.refresh_memory_slots_from_radio()
             return
+        cached = self.memory_cache.get(self.port_var.get(), self.current_firmware_version)
+        if cached: # Show the last known slots immediately; the radio read below refreshes them in the background
+            cached_by_num = {e['slot_num']: e for e in cached.get('slots', [])}
+            for entry in self.memory_slots_data: entry.update(cached_by_num.get(entry['slot_num'], {}))
+            self.memory_cache_read_duration = cached.get('read_duration')
+        self._build_and_show_memory_viewer()
         self.special_op_active_for_blink = True 
-        self.waiting_for_memory_data_to_build_viewer = True
         self.refresh_memory_slots_from_radio()
 
     def _build_and_show_memory_viewer(self):
         if self.memory_viewer_window and self.memory_viewer_window.winfo_exists():
             self.memory_viewer_window.destroy() 
         
-        self.memory_viewer_window = tk.Toplevel(self); self.memory_viewer_window.title("Memory Slot Viewer")
-        self.memory_viewer_window.resizable(False, True) 
+        self.memory_viewer_window = tk.Toplevel(self); self.memory_viewer_window.title("Memory & Preset Browser")
+        self.memory_viewer_window.geometry("780x560"); self.memory_viewer_window.minsize(560, 300)
         
         editor_frame = ttk.Frame(self.memory_viewer_window, padding=self.PAD_LARGE) 
         editor_frame.pack(fill="both", expand=True)
 
-        refresh_button = ttk.Button(editor_frame, text="Refresh Slots from Radio", command=self.refresh_memory_slots_from_radio)
-        refresh_button.pack(pady=(0, self.PAD_MEDIUM)); Tooltip(refresh_button, "Fetch current memory slot data from the radio")
-
-        slots_canvas_frame = ttk.Frame(editor_frame) 
-        slots_canvas_frame.pack(fill="both", expand=True)
-
-        slots_canvas = tk.Canvas(slots_canvas_frame)
-        slots_scrollbar = ttk.Scrollbar(slots_canvas_frame, orient="vertical", command=slots_canvas.yview)
-        slots_scrollable_frame = ttk.Frame(slots_canvas) 
-
-        slots_scrollable_frame.bind("<Configure>", lambda e: slots_canvas.configure(scrollregion=slots_canvas.bbox("all")))
-        slots_canvas.create_window((0, 0), window=slots_scrollable_frame, anchor="nw")
-        slots_canvas.configure(yscrollcommand=slots_scrollbar.set)
-
-        slots_canvas.pack(side="left", fill="both", expand=True)
-        slots_scrollbar.pack(side="right", fill="y")
-        
-        self.memory_slot_display_vars = {} 
-        num_cols = 4
-        est_content_width_per_slot_item = 150 
-
-        for i in range(32):
-            slot_num = i + 1; row = i // num_cols; col = i % num_cols
-            slot_frame = ttk.LabelFrame(slots_scrollable_frame, text=f"Slot {slot_num:02d}", padding=(self.PAD_MEDIUM, self.PAD_SMALL))
-            slot_frame.grid(row=row, column=col, padx=self.PAD_X_CTRL_GROUP, pady=self.PAD_Y_CTRL_GROUP, sticky="nsew")
-            
-            band_var = tk.StringVar(); ttk.Label(slot_frame, text="Band:").grid(row=0, column=0, sticky="nw", pady=1); 
-            ttk.Label(slot_frame, textvariable=band_var, anchor="w", wraplength=est_content_width_per_slot_item - 50).grid(row=0, column=1, sticky="ew", padx=self.PAD_X_CONN, pady=1)
-            
-            freq_var = tk.StringVar(); ttk.Label(slot_frame, text="Freq:").grid(row=1, column=0, sticky="nw", pady=1);  
-            ttk.Label(slot_frame, textvariable=freq_var, anchor="w").grid(row=1, column=1, sticky="ew", padx=self.PAD_X_CONN, pady=1)
-            
-            mode_var = tk.StringVar(); ttk.Label(slot_frame, text="Mode:").grid(row=2, column=0, sticky="nw", pady=1); 
-            ttk.Label(slot_frame, textvariable=mode_var, anchor="w").grid(row=2, column=1, sticky="ew", padx=self.PAD_X_CONN, pady=1)
-            
-            slot_frame.grid_columnconfigure(1, weight=1) 
-            self.memory_slot_display_vars[slot_num] = {'band': band_var, 'freq': freq_var, 'mode': mode_var}
+        button_row = ttk.Frame(editor_frame)
+        button_row.pack(pady=(0, self.PAD_MEDIUM))
+        refresh_button = ttk.Button(button_row, text="Refresh Slots from Radio", command=self.refresh_memory_slots_from_radio)
+        refresh_button.pack(side=tk.LEFT, padx=self.PAD_SMALL); Tooltip(refresh_button, "Fetch current memory slot data from the radio")
+        export_button = ttk.Button(button_row, text="Export Profile...", command=self.export_memory_profile)
+        export_button.pack(side=tk.LEFT, padx=self.PAD_SMALL); Tooltip(export_button, "Save the slots last read from the radio as a JSON or CSV profile")
+        import_button = ttk.Button(button_row, text="Import & Sync Profile...", command=self.import_and_sync_memory_profile)
+        import_button.pack(side=tk.LEFT, padx=self.PAD_SMALL); Tooltip(import_button, "Load a JSON or CSV profile and write only the slots that differ, then verify by read-back")
+        import_presets_button = ttk.Button(button_row, text="Import Presets...", command=self.import_presets)
+        import_presets_button.pack(side=tk.LEFT, padx=self.PAD_SMALL); Tooltip(import_presets_button, "Add stations from a CSV file (name, band, freq_hz, mode) to the local preset library")
+        add_preset_button = ttk.Button(button_row, text="Add Current", command=self.add_current_as_preset)
+        add_preset_button.pack(side=tk.LEFT, padx=self.PAD_SMALL); Tooltip(add_preset_button, "Save the station the radio is tuned to in the local preset library")
+        ttk.Label(editor_frame, textvariable=self.memory_status_var, anchor=tk.CENTER).pack(fill=tk.X, pady=(0, self.PAD_SMALL))
+
+        filter_row = ttk.Frame(editor_frame)
+        filter_row.pack(fill=tk.X, pady=(0, self.PAD_SMALL))
+        ttk.Label(filter_row, text="Filter:").pack(side=tk.LEFT)
+        filter_entry = ttk.Entry(filter_row, textvariable=self.memory_filter_var)
+        filter_entry.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=(self.PAD_SMALL, 0))
+        filter_entry.bind("<KeyRelease>", self._schedule_memory_filter)
+        Tooltip(filter_entry, "Show only rows containing this text. In the table, type to jump to a row; click a header to sort.")
+
+        self.memory_table = VirtualTable(editor_frame, columns=[("", 24, 'center'), ("Source", 70, 'w'), ("Name", 200, 'w'), ("Band", 60, 'w'),
+                                                                ("Frequency", 110, 'e'), ("Mode", 50, 'w'), ("Age", 80, 'w')],
+                                         on_activate=self._tune_to_table_row, activate_column=0, stretch_column=2, typeahead_column=2)
+        self.memory_table.pack(fill="both", expand=True)
+        self.memory_table.set_filter(self.memory_filter_var.get())
         
         self.update_memory_viewer_display() 
 
-        self.memory_viewer_window.update_idletasks() 
-        content_width = slots_scrollable_frame.winfo_reqwidth()
-        scrollbar_width = slots_scrollbar.winfo_width() if slots_scrollbar.winfo_ismapped() else 20 
-        window_width = content_width + scrollbar_width + (self.PAD_LARGE * 2) + 30 
-        
-        est_row_height = 0
-        if self.memory_slot_display_vars and slots_scrollable_frame.winfo_children(): 
-            first_slot_frame = slots_scrollable_frame.winfo_children()[0]
-            first_slot_frame.update_idletasks()
-            est_row_height = first_slot_frame.winfo_reqheight() + self.PAD_Y_CTRL_GROUP
-        else: est_row_height = 75 
-        
-        num_rows_to_show = 8 
-        content_height = est_row_height * num_rows_to_show
-        window_height = content_height + refresh_button.winfo_reqheight() + (self.PAD_LARGE * 2) + self.PAD_MEDIUM + 40 
-        window_height = max(400, min(window_height, 700)) 
-
-        self.memory_viewer_window.geometry(f"{int(window_width)}x{int(window_height)}")
-        self.memory_viewer_window.minsize(int(window_width * 0.95), 300) 
-
         self.memory_viewer_window.lift()
         self.memory_viewer_window.focus_set()
 
+    def _schedule_memory_filter(self, event=None):
+        if self.memory_filter_after_id: self.after_cancel(self.memory_filter_after_id)
+        self.memory_filter_after_id = self.after(150, self._apply_memory_filter)
+
+    def _apply_memory_filter(self):
+        self.memory_filter_after_id = None
+        if self.memory_table and self.memory_table.winfo_exists(): self.memory_table.set_filter(self.memory_filter_var.get())
 
     def refresh_memory_slots_from_radio(self):
         if not self.connected: messagebox.showwarning("Not Connected", "Connect to radio to refresh memory slots."); return
         self.special_op_active_for_blink = True
+        self.memory_read_started_at = time.monotonic(); self._update_memory_status(refreshing=True)
         print("Requesting memory slot data from radio..."); self.controller.send_command(CMD_SHOW_MEM)
 
-    def update_memory_viewer_display(self): 
-        if not (self.memory_viewer_window and self.memory_viewer_window.winfo_exists()): return
-        for slot_num_one_based, data in enumerate(self.memory_slots_data, 1):
-            if slot_num_one_based in self.memory_slot_display_vars:
-                vars_dict = self.memory_slot_display_vars[slot_num_one_based]
-                
-                band_val = data.get('band', '')
-                freq_hz_str = data.get('freq_hz', '')
-                mode_val = data.get('mode', '')
-
-                display_band = band_val if band_val else "-"
-                display_mode = mode_val if mode_val else "-"
-                display_freq = "-"
-
-                if freq_hz_str and freq_hz_str.isdigit():
-                    freq_hz = int(freq_hz_str)
-                    if freq_hz == 0 and not band_val and not mode_val: 
-                        pass 
-                    elif mode_val == "FM":
-                        freq_mhz = freq_hz / 1000000.0
-                        display_freq = f"{freq_mhz:.1f} MHz"
-                    else: 
-                        freq_khz = freq_hz / 1000.0
-                        if freq_hz == 0: 
-                             display_freq = "0 kHz"
-                        elif freq_khz == int(freq_khz): 
-                            display_freq = f"{int(freq_khz)} kHz"
-                        else: 
-                            display_freq = f"{freq_khz:.3f} kHz"
-                elif freq_hz_str: 
-                    display_freq = freq_hz_str 
-                
-                vars_dict['band'].set(display_band)
-                vars_dict['freq'].set(display_freq)
-                vars_dict['mode'].set(display_mode)
+    def _format_age(self, seconds):
+        if seconds < 60: return f"{int(seconds)}s"
+        if seconds < 3600: return f"{int(seconds // 60)}m"
+        if seconds < 86400: return f"{int(seconds // 3600)}h {int(seconds % 3600 // 60)}m"
+        return f"{int(seconds // 86400)}d {int(seconds % 86400 // 3600)}h"
+
+    def _update_memory_status(self, refreshing=False):
+        read_times = [e['read_at'] for e in self.memory_slots_data if e.get('read_at')]
+        cost = f"a full read takes {self.memory_cache_read_duration:.1f} s" if self.memory_cache_read_duration else "full read time unknown"
+        if not read_times: status = "Reading slots from radio..." if refreshing else "No slot data."
+        else:
+            age = self._format_age(max(0, time.time() - min(read_times)))
+            status = f"Oldest entry {age} old - {'refreshing from radio, ' if refreshing else ''}{cost}"
+        self.memory_status_var.set(status)
+
+    def export_memory_profile(self):
+        from tkinter import filedialog
+        file_path = filedialog.asksaveasfilename(defaultextension=".json", filetypes=[("JSON profile", "*.json"), ("CSV profile", "*.csv"), ("All files", "*.*")],
+                                                 title="Export Memory Profile", parent=self.memory_viewer_window)
+        if file_path:
+            try: MemorySlotSync.export_profile(file_path, self.memory_slots_data); messagebox.showinfo("Export Successful", f"Memory profile saved to:\n{file_path}", parent=self.memory_viewer_window)
+            except Exception as e: messagebox.showerror("Export Error", f"Failed to export memory profile: {e}", parent=self.memory_viewer_window)
+
+    def import_and_sync_memory_profile(self):
+        if not self.connected: messagebox.showwarning("Not Connected", "Connect to the radio to sync memory slots."); return
+        if self.controller.expecting_memory_slots or "Memory" in self.controller.queued_ops: messagebox.showinfo("In Progress", "A memory slot operation is already in progress."); return
+        from tkinter import filedialog
+        file_path = filedialog.askopenfilename(filetypes=[("Memory profiles", "*.json *.csv"), ("All files", "*.*")],
+                                               title="Import Memory Profile", parent=self.memory_viewer_window)
+        if not file_path: return
+        try: desired_slots = MemorySlotSync.import_profile(file_path)
+        except Exception as e: messagebox.showerror("Import Error", f"Failed to read memory profile: {e}", parent=self.memory_viewer_window); return
+
+        changed_slots = MemorySlotSync.diff(self.memory_slots_data, desired_slots)
+        if not changed_slots:
+            messagebox.showinfo("Memory Sync", "Radio already matches this profile. Nothing to write.", parent=self.memory_viewer_window); return
+        slot_list = ", ".join(f"{e['slot_num']:02d}" for e in changed_slots)
+        if not messagebox.askyesno("Memory Sync", f"Write {len(changed_slots)} changed slot(s) to the radio?\nSlots: {slot_list}", parent=self.memory_viewer_window): return
+        self.special_op_active_for_blink = True
+        self.memory_read_started_at = time.monotonic()
+        print(f"App: Writing {len(changed_slots)} memory slot(s): {slot_list}")
+        self.controller.write_memory_slots(changed_slots)
+
+    def _apply_memory_slot_lines(self, lines, written_slot_nums=()):
+        slots = MemorySlotSync.slots_from_lines(lines); now = time.time()
+        for i in range(32): 
+            self.memory_slots_data[i].update(slots.get(i + 1, {'band': '', 'freq_hz': '', 'mode': ''}))
+            self.memory_slots_data[i].update(read_at=now, source='app_write' if i + 1 in written_slot_nums else 'radio')
+        if self.memory_read_started_at: self.memory_cache_read_duration = time.monotonic() - self.memory_read_started_at; self.memory_read_started_at = 0
+        self.memory_cache.store(self.port_var.get(), self.current_firmware_version, self.memory_slots_data, self.memory_cache_read_duration)
+        self._update_memory_status()
+
+    def _format_slot_frequency(self, freq_hz_str, band_val, mode_val):
+        display_freq = "-"
+        if freq_hz_str and freq_hz_str.isdigit():
+            freq_hz = int(freq_hz_str)
+            if freq_hz == 0 and not band_val and not mode_val: 
+                pass 
+            elif mode_val == "FM":
+                freq_mhz = freq_hz / 1000000.0
+                display_freq = f"{freq_mhz:.1f} MHz"
+            else: 
+                freq_khz = freq_hz / 1000.0
+                if freq_hz == 0: 
+                     display_freq = "0 kHz"
+                elif freq_khz == int(freq_khz): 
+                    display_freq = f"{int(freq_khz)} kHz"
+                else: 
+                    display_freq = f"{freq_khz:.3f} kHz"
+        elif freq_hz_str: 
+            display_freq = freq_hz_str 
+        return display_freq
+
+    def _preset_rows(self):
+        # Preset rows and their search text are rebuilt only when the library changes, not on every slot refresh
+        if self.preset_rows_cache[0] != self.preset_library.version:
+            rows = []
+            for i, p in enumerate(self.preset_library.load()):
+                rows.append((("▶", "Preset", p['name'], p['band'] or "-", self._format_slot_frequency(str(p['freq_hz']), p['band'], p['mode']), p['mode'] or "-", ""),
+                             ((1, i), (1, i), p['name'].lower(), p['band'], p['freq_hz'], p['mode'], float('inf')),
+                             {'kind': 'preset', 'index': i, 'name': p['name'], 'band': p['band'], 'freq_hz': p['freq_hz'], 'mode': p['mode']}))
+            self.preset_rows_cache = (self.preset_library.version, rows, VirtualTable.search_texts(rows))
+        return self.preset_rows_cache[1:]
 
+    def update_memory_viewer_display(self): 
+        if not (self.memory_viewer_window and self.memory_viewer_window.winfo_exists() and self.memory_table): return
+        now = time.time(); rows = []
+        for data in self.memory_slots_data:
+            slot_num = data['slot_num']; band_val = data.get('band', ''); mode_val = data.get('mode', '')
+            freq_hz_str = str(data.get('freq_hz', '') or ''); freq_hz = int(freq_hz_str) if freq_hz_str.isdigit() else 0
+            read_at = data.get('read_at')
+            age_text = (self._format_age(max(0, now - read_at)) if read_at else "") + (" ✓" if data.get('source') == 'app_write' else "")
+            rows.append((("▶" if freq_hz else "", f"Slot {slot_num:02d}", "", band_val or "-", self._format_slot_frequency(freq_hz_str, band_val, mode_val), mode_val or "-", age_text),
+                         ((0, slot_num), (0, slot_num), "", band_val, freq_hz, mode_val, now - read_at if read_at else float('inf')),
+                         {'kind': 'slot', 'slot_num': slot_num, 'name': f"Slot {slot_num:02d}", 'band': band_val, 'freq_hz': freq_hz, 'mode': mode_val}))
+        preset_rows, preset_search_text = self._preset_rows()
+        self.memory_table.set_rows(rows + preset_rows, VirtualTable.search_texts(rows) + preset_search_text)
+
+    def import_presets(self):
+        from tkinter import filedialog
+        file_path = filedialog.askopenfilename(filetypes=[("CSV files", "*.csv"), ("All files", "*.*")], title="Import Presets", parent=self.memory_viewer_window)
+        if not file_path: return
+        try: presets = PresetLibrary.read_csv(file_path)
+        except Exception as e: messagebox.showerror("Import Error", f"Failed to read presets: {e}", parent=self.memory_viewer_window); return
+        self.preset_library.add(presets)
+        self.update_memory_viewer_display()
+        messagebox.showinfo("Presets Imported", f"Added {len(presets)} preset(s). Library now holds {len(self.preset_library.load())}.", parent=self.memory_viewer_window)
+
+    def add_current_as_preset(self):
+        if not self.current_frequency_hz: messagebox.showwarning("No Station", "No frequency received from the radio yet.", parent=self.memory_viewer_window); return
+        from tkinter import simpledialog
+        name = simpledialog.askstring("Add Preset", "Preset name:", parent=self.memory_viewer_window)
+        if name is None: return
+        self.preset_library.add([{'name': name.strip(), 'band': self.current_band or '', 'freq_hz': self.current_frequency_hz, 'mode': self.current_mode or ''}])
+        self.update_memory_viewer_display()
+
+    def _tune_to_table_row(self, payload):
+        if not payload.get('freq_hz'): return
+        if not self.connected: messagebox.showwarning("Not Connected", "Connect to the radio to tune.", parent=self.memory_viewer_window); return
+        if self.fm_scan_active: messagebox.showwarning("Scan Active", "Cannot tune during FM scan.", parent=self.memory_viewer_window); return
+        if self.preset_tune_active: messagebox.showinfo("Tuning", "Already tuning to a station.", parent=self.memory_viewer_window); return
+        self.preset_tune_active = True
+        self.memory_status_var.set(f"Tuning to {payload['name'] or 'preset'}: {payload['band']} {self._format_slot_frequency(str(payload['freq_hz']), payload['band'], payload['mode'])} {payload['mode']}...")
+        threading.Thread(target=self._tune_to_preset_thread, args=(payload['band'], payload['freq_hz'], payload['mode']), daemon=True).start()
+
+    def _step_to_hz(self, step_str): return RadioStatus.step_to_hz(step_str)
+
+    def _cycle_radio_setting(self, attr_name, target, cmd_next, max_presses):
+        for _ in range(max_presses):
+            if getattr(self, attr_name) == target or not self.connected: break
+            self.controller.send_command(cmd_next); time.sleep(self.PRESET_TUNE_SETTLE_TIME)
+        return getattr(self, attr_name) == target
+
+    def _tune_to_preset_thread(self, band, freq_hz, mode):
+        result = "Tuned."
+        try:
+            if band in self.BANDS and not self._cycle_radio_setting('current_band', band, CMD_BAND_NEXT, len(self.BANDS)): result = f"Could not select band {band}."
+            elif mode in self.MODES and not self._cycle_radio_setting('current_mode', mode, CMD_MODE_NEXT, len(self.MODES)): result = f"Could not select mode {mode}."
+            else:
+                for _ in range(self.PRESET_TUNE_MAX_PASSES):
+                    step_hz = self._step_to_hz(self.current_step_str)
+                    if not self.connected or self.current_frequency_hz is None or not step_hz: result = "Tuning stopped: no frequency/step data."; break
+                    steps_needed = round((freq_hz - self.current_frequency_hz) / step_hz)
+                    if steps_needed == 0: break
+                    cmd = CMD_ENCODER_UP if steps_needed > 0 else CMD_ENCODER_DOWN
+                    for _ in range(min(abs(steps_needed), self.PRESET_TUNE_MAX_BURST)):
+                        self.controller.send_command(cmd); time.sleep(0.03)
+                    time.sleep(self.PRESET_TUNE_SETTLE_TIME)
+                else: result = "Tuned as close as the current step allows."
+        finally:
+            self.preset_tune_active = False
+            print(f"App: Preset tune finished: {result}")
+            self.after(0, lambda r=result: self.memory_status_var.set(r))
 
     def request_screenshot(self): 
         if not self.connected: messagebox.showwarning("Not Connected", "Connect to the radio to request a screenshot."); return
-        if self.controller.expecting_screenshot_data: messagebox.showinfo("Screenshot In Progress", "Already waiting for screenshot data."); return
+        if self.controller.expecting_screenshot_data or "Screenshot" in self.controller.queued_ops: messagebox.showinfo("Screenshot In Progress", "Already waiting for screenshot data."); return
         
         self.special_op_active_for_blink = True
         if hasattr(self, 'screenshot_btn'):
@@ -906,7 +1391,7 @@ class RadioApp(tk.Tk):
         self.screenshot_window = None
         self.ss_image_label = None
         self.ss_palette_outer_frame = None
-        self.theme_palette_frame = None 
+        self.ss_swatch_canvas = None
         self.ss_button_frame = None
         self.ss_refresh_button = None
         self.ss_save_png_button = None
@@ -922,16 +1407,12 @@ class RadioApp(tk.Tk):
         if not self.connected:
             messagebox.showwarning("Not Connected", "Connect to the radio to get theme data.")
             return
-        if self.controller.expecting_theme_string or self.controller.theme_get_sequence_active:
+        if self.controller.expecting_theme_string or self.controller.theme_get_sequence_active or "ThemeGet" in self.controller.queued_ops:
             messagebox.showinfo("In Progress", "Already trying to get theme data.")
             return
         
         self.special_op_active_for_blink = True
-        if self.screenshot_window and self.screenshot_window.winfo_exists() and self.theme_palette_frame: 
-            for widget in self.theme_palette_frame.winfo_children(): 
-                widget.destroy()
-            loading_label = ttk.Label(self.theme_palette_frame, text="Fetching theme from radio...") 
-            loading_label.pack(pady=5)
+        self._set_theme_band_message("Fetching theme from radio...")
 
         self.controller.request_theme_data()
 
@@ -952,24 +1433,37 @@ class RadioApp(tk.Tk):
         b8 = (b5 * 255 + 15) // 31
         return (r8, g8, b8)
 
+    def _rgb565_to_lab(self, rgb565_int):
+        lab = self._lab_cache.get(rgb565_int)
+        if lab is None:
+            def linear(c8): c = c8 / 255.0; return c / 12.92 if c <= 0.04045 else ((c + 0.055) / 1.055) ** 2.4
+            def f(t): return t ** (1 / 3) if t > 0.008856 else 7.787 * t + 16 / 116
+            r, g, b = (linear(c8) for c8 in self._rgb565_to_rgb888(rgb565_int))
+            fx = f((0.4124 * r + 0.3576 * g + 0.1805 * b) / 0.95047)
+            fy = f(0.2126 * r + 0.7152 * g + 0.0722 * b)
+            fz = f((0.0193 * r + 0.1192 * g + 0.9505 * b) / 1.08883)
+            lab = self._lab_cache[rgb565_int] = (116 * fy - 16, 500 * (fx - fy), 200 * (fy - fz))
+        return lab
+
+    def _nearest_palette_color(self, rgb565_int, palette_rgb565):
+        if not palette_rgb565: return None, None
+        if rgb565_int in palette_rgb565: return palette_rgb565.index(rgb565_int), 0.0
+        lab = self._rgb565_to_lab(rgb565_int)
+        delta_e, idx = min((math.dist(lab, self._rgb565_to_lab(p)), i) for i, p in enumerate(palette_rgb565))
+        return idx, delta_e
+
+    def _set_theme_band_message(self, text):
+        if self.ss_swatch_canvas and self.ss_swatch_canvas.winfo_exists():
+            self.ss_swatch_canvas.set_band('theme', SwatchCanvas.SWATCH_CELL + self.PAD_LARGE, title=text, bold=False)
+
     def _display_radio_theme_swatches(self, theme_data_x_hex_str):
         if not (self.screenshot_window and self.screenshot_window.winfo_exists()):
             return
-        
-        if not self.theme_palette_frame or not self.theme_palette_frame.winfo_exists():
-            self.theme_palette_frame = ttk.Frame(self.screenshot_window)
-            self.theme_palette_frame.pack(pady=self.PAD_SMALL, fill='x')
-
-        for widget in self.theme_palette_frame.winfo_children(): 
-            widget.destroy()
 
         if not theme_data_x_hex_str:
-            ttk.Label(self.theme_palette_frame, text="No theme data received.").pack(pady=5)
+            self._set_theme_band_message("No theme data received.")
             return
 
-        theme_title_label = ttk.Label(self.theme_palette_frame, text="Theme Colors", font=('Helvetica', 10, 'bold'), anchor=tk.CENTER)
-        theme_title_label.pack(pady=(self.PAD_SMALL, self.PAD_SMALL))
-
         theme_rgb565_with_indices = []
         raw_theme_colors = [val for val in theme_data_x_hex_str.split('x') if val]
         for i, hex_val_str in enumerate(raw_theme_colors):
@@ -980,51 +1474,121 @@ class RadioApp(tk.Tk):
                     print(f"App: Invalid theme hex value '{hex_val_str}' at index {i}")
             else:
                 print(f"App: Skipping invalid length theme hex value: {hex_val_str}")
+        self.last_radio_theme_colors = [tc['rgb565'] for tc in theme_rgb565_with_indices]
+        self._draw_theme_band(theme_rgb565_with_indices)
+
+    def _draw_theme_band(self, theme_rgb565_with_indices):
+        if not (self.ss_swatch_canvas and self.ss_swatch_canvas.winfo_exists()): return
+        # Each theme color is stacked under its perceptually nearest screenshot palette column; unmatched colors follow
+        palette = self.last_screenshot_rgb565_palette_order[:self.MAX_SWATCHES_TO_DISPLAY]
+        unmatched_columns = {}; column_heights = {}; swatches = []
+        for theme_entry in theme_rgb565_with_indices[:self.MAX_THEME_SWATCHES]:
+            rgb565_int = theme_entry['rgb565']
+            col, delta_e = self._nearest_palette_color(rgb565_int, palette)
+            if col is None or delta_e > self.THEME_MATCH_MAX_DELTA_E:
+                col = unmatched_columns.setdefault(rgb565_int, len(palette) + len(unmatched_columns))
+                match_text = "No screenshot match"
+            elif delta_e == 0: match_text = "Exact screenshot match"
+            else: match_text = f"Near screenshot 0x{palette[col]:04X} (dE {delta_e:.1f})"
+            row = column_heights.get(col, 0); column_heights[col] = row + 1
+            r8_disp, g8_disp, b8_disp = self._rgb565_to_rgb888(rgb565_int)
+            swatches.append((col, row, f"#{r8_disp:02x}{g8_disp:02x}{b8_disp:02x}",
+                             f"RGB565: 0x{rgb565_int:04X}\nIndex: {theme_entry['index']}\n{match_text}"))
+        self.ss_swatch_canvas.set_band('theme', SwatchCanvas.SWATCH_CELL + self.PAD_LARGE, swatches, title="Theme Colors")
 
-        swatch_container = ttk.Frame(self.theme_palette_frame)
-        swatch_container.pack() 
-
-        ordered_theme_swatches_to_draw = []
-        temp_theme_colors_dict = {tc['rgb565']: [] for tc in theme_rgb565_with_indices}
-        for tc in theme_rgb565_with_indices:
-            temp_theme_colors_dict[tc['rgb565']].append(tc)
-        
-        processed_theme_colors = set()
-
-        if hasattr(self, 'last_screenshot_rgb565_palette_order') and self.last_screenshot_rgb565_palette_order:
-            for ss_rgb565 in self.last_screenshot_rgb565_palette_order:
-                if ss_rgb565 in temp_theme_colors_dict:
-                    ordered_theme_swatches_to_draw.extend(temp_theme_colors_dict[ss_rgb565])
-                    processed_theme_colors.add(ss_rgb565)
-        
-        for rgb565_val, entries in temp_theme_colors_dict.items():
-            if rgb565_val not in processed_theme_colors:
-                ordered_theme_swatches_to_draw.extend(entries)
 
+    def open_theme_editor(self):
+        if not self.last_radio_theme_colors: messagebox.showinfo("Theme Editor", "Fetch the radio theme first (Get Theme)."); return
+        if self.last_screenshot_image is None: messagebox.showinfo("Theme Editor", "Take a screenshot first to preview the theme on."); return
+        if self.theme_editor_window and self.theme_editor_window.winfo_exists():
+            self.theme_editor_window.lift(); self.theme_editor_window.focus_set(); return
 
-        color_to_column_frame = {} 
-        for theme_entry in ordered_theme_swatches_to_draw[:self.MAX_THEME_SWATCHES]:
-            rgb565_int = theme_entry['rgb565']
-            original_index = theme_entry['index']
-            r8_disp, g8_disp, b8_disp = self._rgb565_to_rgb888(rgb565_int)
-            display_hex_color = f"#{r8_disp:02x}{g8_disp:02x}{b8_disp:02x}"
-            
-            target_column_frame = None
-            if rgb565_int not in color_to_column_frame:
-                column_frame = ttk.Frame(swatch_container)
-                column_frame.pack(side=tk.LEFT, padx=1, anchor=tk.N) 
-                color_to_column_frame[rgb565_int] = column_frame
-                target_column_frame = column_frame
-            else:
-                target_column_frame = color_to_column_frame[rgb565_int]
+        self.theme_editor_colors = list(self.last_radio_theme_colors)
+        self.theme_editor_base_colors = list(self.last_radio_theme_colors) # Theme the screenshot was drawn with
+        self.theme_preview = ThemePreview(self.last_screenshot_image)
 
-            swatch = tk.Canvas(target_column_frame, width=20, height=20, bg=display_hex_color,
-                               highlightthickness=1, highlightbackground='grey')
-            swatch.pack(side=tk.TOP, pady=1) 
-            Tooltip(swatch, f"RGB565: 0x{rgb565_int:04X}\nIndex: {original_index}")
+        self.theme_editor_window = tk.Toplevel(self); self.theme_editor_window.title("Theme Editor (Offline Preview)")
+        self.theme_editor_window.resizable(False, False)
+        editor_frame = ttk.Frame(self.theme_editor_window, padding=self.PAD_LARGE)
+        editor_frame.pack(fill="both", expand=True)
 
+        self.theme_preview_label = ttk.Label(editor_frame)
+        self.theme_preview_label.pack(pady=(0, self.PAD_MEDIUM))
+        ttk.Label(editor_frame, textvariable=self.theme_preview_info_var, anchor=tk.CENTER).pack(fill=tk.X)
+
+        self.theme_editor_swatch_canvas = SwatchCanvas(editor_frame, cursor="hand2")
+        self.theme_editor_swatch_canvas.pack(pady=self.PAD_MEDIUM)
+
+        button_frame = ttk.Frame(editor_frame)
+        button_frame.pack(pady=(self.PAD_MEDIUM, 0))
+        reset_btn = ttk.Button(button_frame, text="Reset", command=self._reset_theme_editor)
+        reset_btn.pack(side=tk.LEFT, padx=5); Tooltip(reset_btn, "Discard edits and restore the theme read from the radio.")
+        self.theme_send_button = ttk.Button(button_frame, text="Send to Radio", command=self._send_edited_theme)
+        self.theme_send_button.pack(side=tk.LEFT, padx=5); Tooltip(self.theme_send_button, "Write the edited theme to the radio once and verify it by read-back.")
+
+        self._refresh_theme_editor_swatches()
+        self._update_theme_preview()
+        self.theme_editor_window.lift(); self.theme_editor_window.focus_set()
+
+    def _refresh_theme_editor_swatches(self):
+        if not (self.theme_editor_swatch_canvas and self.theme_editor_swatch_canvas.winfo_exists()): return
+        swatches = []
+        for i, rgb565_int in enumerate(self.theme_editor_colors):
+            r8, g8, b8 = self._rgb565_to_rgb888(rgb565_int)
+            edited = self.theme_editor_colors[i:i+1] != self.last_radio_theme_colors[i:i+1]
+            swatches.append((i % 19, i // 19, f"#{r8:02x}{g8:02x}{b8:02x}", f"Slot {i}: 0x{rgb565_int:04X}\nClick to change color",
+                             lambda idx=i: self._edit_theme_slot_color(idx), 'red' if edited else 'grey'))
+        self.theme_editor_swatch_canvas.set_band('theme', 0, swatches)
+
+    def _update_theme_preview(self):
+        if not (self.theme_editor_window and self.theme_editor_window.winfo_exists() and self.theme_preview): return
+        render_start = time.perf_counter()
+        preview_image = self.theme_preview.render(self.theme_editor_base_colors, self.theme_editor_colors)
+        render_ms = (time.perf_counter() - render_start) * 1000
+        from PIL import ImageTk
+        tk_image = ImageTk.PhotoImage(preview_image)
+        self.theme_preview_label.config(image=tk_image); self.theme_preview_label.image = tk_image
+        edited = sum(1 for a, b in zip(self.last_radio_theme_colors, self.theme_editor_colors) if a != b)
+        self.theme_preview_info_var.set(f"{edited} slot(s) edited - preview rendered in {render_ms:.1f} ms")
+
+    def _edit_theme_slot_color(self, idx):
+        r8, g8, b8 = self._rgb565_to_rgb888(self.theme_editor_colors[idx])
+        from tkinter import colorchooser
+        rgb, _ = colorchooser.askcolor(color=f"#{r8:02x}{g8:02x}{b8:02x}", parent=self.theme_editor_window, title=f"Theme Slot {idx}")
+        if not rgb: return
+        self.theme_editor_colors[idx] = self._rgb888_to_rgb565(*(int(c) for c in rgb))
+        self._refresh_theme_editor_swatches()
+        self._update_theme_preview()
+
+    def _reset_theme_editor(self):
+        self.theme_editor_colors = list(self.last_radio_theme_colors)
+        self._refresh_theme_editor_swatches()
+        self._update_theme_preview()
+
+    def _send_edited_theme(self):
+        if not self.connected: messagebox.showwarning("Not Connected", "Connect to the radio to send the theme."); return
+        if self.controller.expecting_theme_string or self.controller.theme_get_sequence_active or "ThemeGet" in self.controller.queued_ops:
+            messagebox.showinfo("In Progress", "A theme operation is already in progress."); return
+        if self.theme_editor_colors == self.last_radio_theme_colors:
+            messagebox.showinfo("Theme Editor", "No changes to send."); return
+        self.special_op_active_for_blink = True
+        if self.theme_send_button and self.theme_send_button.winfo_exists(): self.theme_send_button.config(state=tk.DISABLED, text="Sending...")
+        self.controller.request_theme_set(''.join(f"x{c:04x}" for c in self.theme_editor_colors))
+
+    def _handle_theme_set_result(self, expected_theme_str, readback_theme_str):
+        if self.theme_send_button and self.theme_send_button.winfo_exists(): self.theme_send_button.config(state=tk.NORMAL, text="Send to Radio")
+        if expected_theme_str.lower() == readback_theme_str.lower():
+            self._display_radio_theme_swatches(readback_theme_str)
+            if self.screenshot_window is None or not self.screenshot_window.winfo_exists():
+                self.last_radio_theme_colors = [int(v, 16) for v in readback_theme_str.split('x') if len(v) == 4]
+            self._refresh_theme_editor_swatches()
+            self._update_theme_preview()
+            messagebox.showinfo("Theme Sent", "Theme written to radio and verified by read-back.")
+        else:
+            messagebox.showerror("Theme Verify Failed", "Theme read back from the radio does not match the theme sent.")
 
     def display_screenshot(self, hex_data, transfer_duration=None): 
+        from PIL import Image, ImageTk
         local_proc_start_time = time.time()
         image_bytes = b'' 
         pil_image = None 
@@ -1071,9 +1635,8 @@ class RadioApp(tk.Tk):
 
                 self.ss_palette_outer_frame = ttk.Frame(self.screenshot_window)
                 self.ss_palette_outer_frame.pack(pady=self.PAD_SMALL, fill='x')
-                
-                self.theme_palette_frame = ttk.Frame(self.screenshot_window) 
-                self.theme_palette_frame.pack(pady=self.PAD_SMALL, fill='x')
+                self.ss_swatch_canvas = SwatchCanvas(self.ss_palette_outer_frame, background=bg_color)
+                self.ss_swatch_canvas.pack()
 
                 self.ss_button_frame = ttk.Frame(self.screenshot_window) 
                 self.ss_button_frame.pack(pady=10)
@@ -1086,6 +1649,10 @@ class RadioApp(tk.Tk):
                 get_theme_btn.pack(side=tk.LEFT, padx=5)
                 Tooltip(get_theme_btn, "Fetch and display the radio's current color theme (37 RGB565 colors).")
 
+                edit_theme_btn = ttk.Button(self.ss_button_frame, text="Edit Theme", command=self.open_theme_editor)
+                edit_theme_btn.pack(side=tk.LEFT, padx=5)
+                Tooltip(edit_theme_btn, "Edit the fetched theme offline, previewed on this screenshot.")
+
                 save_bmp_button = ttk.Button(self.ss_button_frame, text="Save as BMP", command=lambda data=image_bytes: self.save_screenshot_as_bmp(data))
                 save_bmp_button.pack(side=tk.LEFT, padx=5)
                 
@@ -1097,15 +1664,15 @@ class RadioApp(tk.Tk):
                     self.initial_screenshot_geometry = self.screenshot_window.geometry() 
             else: 
                 if self.ss_image_label: self.ss_image_label.config(image=None); self.ss_image_label.image = None
-                for frame_attr in ['ss_palette_outer_frame', 'theme_palette_frame']: 
-                    frame = getattr(self, frame_attr, None)
-                    if frame and frame.winfo_exists():
-                        for child in frame.winfo_children(): child.destroy()
             
             tk_image = ImageTk.PhotoImage(pil_image)
             self.ss_image_label.config(image=tk_image); self.ss_image_label.image = tk_image 
+            self.last_screenshot_image = pil_image
+            if self.theme_editor_window and self.theme_editor_window.winfo_exists():
+                self.theme_preview = ThemePreview(pil_image); self.theme_editor_base_colors = list(self.last_radio_theme_colors)
+                self._update_theme_preview()
 
-            if self.ss_palette_outer_frame and self.ss_palette_outer_frame.winfo_exists():
+            if self.ss_swatch_canvas and self.ss_swatch_canvas.winfo_exists():
                 try:
                     rgb_image = pil_image.convert('RGB')
                     all_colors_data_rgb888 = rgb_image.getcolors(rgb_image.size[0] * rgb_image.size[1])
@@ -1125,25 +1692,22 @@ class RadioApp(tk.Tk):
                         self.last_screenshot_rgb565_palette_order = [item[1] for item in sorted_significant_rgb565] 
 
                         if sorted_significant_rgb565:
-                            palette_inner_frame = ttk.Frame(self.ss_palette_outer_frame) 
-                            palette_inner_frame.pack() 
-                            for i in range(min(len(sorted_significant_rgb565), self.MAX_SWATCHES_TO_DISPLAY)):
-                                agg_count, rgb565_val = sorted_significant_rgb565[i]
+                            palette_swatches = []
+                            for i, (agg_count, rgb565_val) in enumerate(sorted_significant_rgb565[:self.MAX_SWATCHES_TO_DISPLAY]):
                                 r8_disp, g8_disp, b8_disp = self._rgb565_to_rgb888(rgb565_val)
-                                hex_color_display = f"#{r8_disp:02x}{g8_disp:02x}{b8_disp:02x}"
-                                swatch_canvas = tk.Canvas(palette_inner_frame, width=20, height=20, bg=hex_color_display, 
-                                                          highlightthickness=1, highlightbackground='grey')
-                                swatch_canvas.pack(side=tk.LEFT, padx=1, pady=1)
-                                Tooltip(swatch_canvas, f"RGB565: 0x{rgb565_val:04X}\nCount: {agg_count}")
+                                palette_swatches.append((i, 0, f"#{r8_disp:02x}{g8_disp:02x}{b8_disp:02x}", f"RGB565: 0x{rgb565_val:04X}\nCount: {agg_count}"))
+                            self.ss_swatch_canvas.set_band('palette', 0, palette_swatches)
                         else:
-                            ttk.Label(self.ss_palette_outer_frame, text=f"No colors with count > {self.MIN_COLOR_COUNT_FOR_PALETTE}.").pack()
+                            self.ss_swatch_canvas.set_band('palette', 0, title=f"No colors with count > {self.MIN_COLOR_COUNT_FOR_PALETTE}.", bold=False)
                     elif all_colors_data_rgb888 is None: 
-                        ttk.Label(self.ss_palette_outer_frame, text="Image has too many distinct colors for palette.").pack()
+                        self.ss_swatch_canvas.set_band('palette', 0, title="Image has too many distinct colors for palette.", bold=False)
                     else: 
-                        ttk.Label(self.ss_palette_outer_frame, text="No colors found in image.").pack()
+                        self.ss_swatch_canvas.set_band('palette', 0, title="No colors found in image.", bold=False)
                 except Exception as e_color:
                     print(f"App: Error generating screenshot color palette: {e_color}")
-                    ttk.Label(self.ss_palette_outer_frame, text="Could not generate screenshot palette.").pack()
+                    self.ss_swatch_canvas.set_band('palette', 0, title="Could not generate screenshot palette.", bold=False)
+                if self.last_radio_theme_colors: # Re-align the known theme with the new palette in place
+                    self._draw_theme_band([{'index': i, 'rgb565': c} for i, c in enumerate(self.last_radio_theme_colors)])
 
             if hasattr(self, 'ss_save_png_button'): 
                 self.ss_save_png_button.config(command=lambda img=pil_image: self.save_screenshot_as_png(img))
@@ -1166,6 +1730,7 @@ class RadioApp(tk.Tk):
 
 
     def save_screenshot_as_png(self, pil_image_to_save): 
+        from tkinter import filedialog
         if not pil_image_to_save: messagebox.showerror("Save Error", "No image data to save as PNG."); return
         file_path = filedialog.asksaveasfilename(defaultextension=".png", filetypes=[("PNG files", "*.png"), ("All files", "*.*")], title="Save Screenshot As PNG")
         if file_path:
@@ -1173,6 +1738,7 @@ class RadioApp(tk.Tk):
             except Exception as e: messagebox.showerror("Save Error", f"Failed to save screenshot as PNG: {e}")
 
     def save_screenshot_as_bmp(self, raw_bmp_data):
+        from tkinter import filedialog
         if not raw_bmp_data: messagebox.showerror("Save Error", "No raw BMP data to save."); return
         file_path = filedialog.asksaveasfilename(defaultextension=".bmp", filetypes=[("BMP files", "*.bmp"), ("All files", "*.*")], title="Save Screenshot As BMP")
         if file_path:
@@ -1197,20 +1763,82 @@ class RadioApp(tk.Tk):
             messagebox.showwarning("Not Connected", "Connect to the radio to send commands.")
 
 
+    def _build_console(self):
+        """Built on first use; most sessions never open the console."""
+        from tkinter import scrolledtext
+        self.console_frame = ttk.LabelFrame(self.main_layout_frame, text="Serial Console") 
+        search_row = ttk.Frame(self.console_frame)
+        search_row.pack(fill=tk.X, padx=self.PAD_X_CONN, pady=(self.PAD_Y_CONN, 0))
+        ttk.Label(search_row, text="Search history:").pack(side=tk.LEFT)
+        search_entry = ttk.Entry(search_row, textvariable=self.console_search_var)
+        search_entry.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=(self.PAD_SMALL, self.PAD_SMALL))
+        search_entry.bind("<KeyRelease>", self._schedule_console_search)
+        Tooltip(search_entry, f"Search every console line of this session (kept in {ConsoleLog.DEFAULT_DIR}).\nClear to return to the live view.")
+        ttk.Label(search_row, textvariable=self.console_search_status_var).pack(side=tk.LEFT)
+        self.console = scrolledtext.ScrolledText(self.console_frame, height=8, width=70, state=tk.DISABLED, relief="sunken", borderwidth=1, padx=self.PAD_X_CONN, pady=self.PAD_Y_CONN) 
+        self.console.pack(fill="both", expand=True, padx=self.PAD_X_CONN, pady=self.PAD_Y_CONN)
+
     def toggle_console(self): 
         self.console_visible = self.console_var.get()
         if self.console_visible:
+            if self.console_frame is None: self._build_console()
             self.console_frame.grid(row=7, column=0, columnspan=2, padx=self.PAD_X_MAIN, pady=(self.PAD_Y_CONN, self.PAD_Y_MAIN), sticky="nsew") 
             self.console.config(state=tk.NORMAL) 
             self.main_layout_frame.grid_rowconfigure(7, weight=2) 
+            if not self.console_search_var.get(): self._show_console_lines(self.console_history.lines)
         else: 
             self.console_frame.grid_forget()
             self.main_layout_frame.grid_rowconfigure(7, weight=0) 
         
 
-    def auto_detect_port(self): 
-        ports = serial.tools.list_ports.comports(); current_port_val = self.port_var.get()
+    def console_log(self, text):
+        """Logs an app message and queues it for the widget, which _flush_console updates once per queue tick."""
+        self.console_history.add(text); self.console_log_file.add(text)
+
+    def _show_console_lines(self, lines):
+        self.console.delete("1.0", tk.END)
+        if lines: self.console.insert(tk.END, "\n".join(lines) + "\n")
+        self.console_widget_lines = len(lines); self.console.see(tk.END)
+
+    def _flush_console(self):
+        lines = self.console_history.take_pending()
+        if not lines or not self.console_visible or self.console_search_var.get() or not self.console.winfo_exists(): return
+        max_lines = self.console_history.max_lines
+        if len(lines) >= max_lines: self.console.delete("1.0", tk.END); self.console_widget_lines = 0 # The batch alone fills the widget
+        self.console.insert(tk.END, "\n".join(lines) + "\n"); self.console_widget_lines += len(lines)
+        excess = self.console_widget_lines - max_lines
+        if excess > 0: self.console.delete("1.0", f"{excess + 1}.0"); self.console_widget_lines -= excess
+        self.console.see(tk.END)
+
+    def _schedule_console_search(self, event=None):
+        if self.console_search_after_id: self.after_cancel(self.console_search_after_id)
+        self.console_search_after_id = self.after(250, self._run_console_search)
+
+    def _run_console_search(self):
+        self.console_search_after_id = None; self.console_search_generation += 1
+        text = self.console_search_var.get(); generation = self.console_search_generation
+        if not text:
+            self.console_search_status_var.set(""); self._show_console_lines(self.console_history.lines); return
+        self.console_search_status_var.set("Searching...")
+        def worker():
+            started = time.monotonic()
+            try: total, lines = ConsoleLog.search(self.console_log_file.path, text, self.console_history.max_lines)
+            except (OSError, ValueError) as e: total, lines = 0, [f"Search failed: {e}"]
+            elapsed = time.monotonic() - started
+            self.after(0, lambda: self._show_console_search(generation, text, total, lines, elapsed))
+        threading.Thread(target=worker, daemon=True).start()
+
+    def _show_console_search(self, generation, text, total, lines, elapsed):
+        if generation != self.console_search_generation or not self.console.winfo_exists(): return
+        self._show_console_lines(lines)
+        shown = f", newest {len(lines)} shown" if len(lines) < total else ""
+        self.console_search_status_var.set(f"{total} matching lines{shown} ({elapsed * 1000:.0f} ms)")
+
+    def auto_detect_port(self, ports): 
+        current_port_val = self.port_var.get()
         if current_port_val and any(p.device == current_port_val for p in ports): return
+        if any(p.device == self.port_prober.last_port for p in ports): # Last verified radio, at its baud rate
+            self.port_var.set(self.port_prober.last_port); self.baud_var.set(str(self.port_prober.last_baud)); return
         selected_port = None
         for port in ports:
             desc = (port.description or "").upper(); name = (port.name or "").upper()
@@ -1220,8 +1848,32 @@ class RadioApp(tk.Tk):
         elif ports: self.port_var.set(ports[0].device)
         else: self.port_var.set("")
 
-    def refresh_ports(self): 
-        ports_info = serial.tools.list_ports.comports(); port_devices = [p.device for p in ports_info]
+    def refresh_ports(self):
+        """Enumerates ports on a worker thread (slow with many USB devices, especially on Windows), then, unless connected,
+        probes them all for the radio (PortProber); results are applied on the Tk thread."""
+        if self.port_scan_active: return
+        self.port_scan_active = True
+        for btn in ('refresh_btn', 'connect_btn'):
+            if hasattr(self, btn) and not self.connected: getattr(self, btn).config(state=tk.DISABLED)
+        probe = not self.connected; bauds = [self.baud_var.get()] + sorted(self.BAUD_RATES, reverse=True) # After the remembered rate and 115200
+        def worker():
+            import serial.tools.list_ports
+            try: ports = serial.tools.list_ports.comports()
+            except Exception as e: print(f"App: Port enumeration failed: {e}"); ports = []
+            self.after(0, lambda: self._apply_ports(ports))
+            found = self.port_prober.probe([p.device for p in ports], bauds) if probe and ports else None
+            self.after(0, lambda: self._finish_port_scan(found))
+        threading.Thread(target=worker, name="port-scan", daemon=True).start()
+
+    def _finish_port_scan(self, found):
+        self.port_scan_active = False
+        if found and not self.connected: self.port_var.set(found[0]); self.baud_var.set(str(found[1])); print(f"App: Radio found on {found[0]} at {found[1]} baud.")
+        if hasattr(self, 'refresh_btn'): self.refresh_btn.config(state=tk.NORMAL)
+        if hasattr(self, 'connect_btn'): self.connect_btn.config(state=tk.NORMAL if self.port_var.get() or self.connected else tk.DISABLED)
+
+    def _apply_ports(self, ports_info):
+        port_devices = [p.device for p in ports_info]
+        self.port_serial_numbers = {p.device: p.serial_number for p in ports_info if getattr(p, 'serial_number', None)}
         current_selection = self.port_var.get()
         if hasattr(self, 'port_combo'):
             self.port_combo['values'] = port_devices
@@ -1229,33 +1881,32 @@ class RadioApp(tk.Tk):
         if current_selection and current_selection in port_devices: 
             self.port_var.set(current_selection)
         elif port_devices: 
-            self.auto_detect_port()
+            self.auto_detect_port(ports_info)
             if not self.port_var.get(): 
                 self.port_var.set(port_devices[0])
         else: 
             self.port_var.set("")
             messagebox.showinfo("Ports", "No COM ports found.")
-        if hasattr(self, 'connect_btn'): 
-            self.connect_btn.config(state=tk.NORMAL if self.port_var.get() else tk.DISABLED)
 
 
     def clear_status_labels(self): 
         self.freq_var.set("Frequency: --"); self.agc_status_var.set("Gain Control: --"); self.rssi_var.set("RSSI: --"); self.snr_var.set("SNR: --")
         self.batt_var.set("Battery: --"); self.fw_var.set("Firmware: --"); self.vol_var.set("Vol: --"); self.band_var.set("Band: --")
         self.mode_var.set("Mode: --"); self.step_var.set("Step: --"); self.bw_var.set("BW: --"); self.agc_var.set("AGC: --")
-        self.bl_var.set("Bright: --"); self.cal_var.set("Cal: --")
+        self.bl_var.set("Bright: --"); self.cal_var.set("Cal: --"); self.station_var.set("Station: --")
+        self.current_band = None; self.current_mode = None; self.current_step_str = None; self.current_frequency_hz = None
         if hasattr(self, 'snr_level_indicator'): 
             self.snr_level_indicator.delete("all")
             self.snr_level_indicator.create_oval(0,0,10,10, fill="grey", outline="grey")
 
 
     def set_control_buttons_state(self, state): 
-        general_button_state = state if self.connected else tk.DISABLED
+        general_button_state = state if self.connected and not self.reconnecting else tk.DISABLED
 
         if hasattr(self, 'sleep_btn'): self.sleep_btn.config(state=general_button_state)
         
         if hasattr(self, 'screenshot_btn'):
-            if self.fm_scan_active or not self.connected or self.controller.expecting_screenshot_data:
+            if self.fm_scan_active or not self.connected or self.reconnecting or self.controller.expecting_screenshot_data or "Screenshot" in self.controller.queued_ops:
                 self.screenshot_btn.config(state=tk.DISABLED)
             else:
                 self.screenshot_btn.config(state=tk.NORMAL, text=self.SCREENSHOT_EMOJI)
@@ -1269,13 +1920,18 @@ class RadioApp(tk.Tk):
         if not self.controller.expecting_screenshot_data and \
            not self.controller.expecting_memory_slots and \
            not self.controller.expecting_theme_string and \
+           not self.controller.queued_ops and \
            not self.fm_scan_active:
             self.special_op_active_for_blink = False
 
 
     def handle_forced_disconnect(self, error_message): 
         if self.connected: 
+            if self.auto_reconnect and not self.port_var.get().startswith("replay:") and self.controller.start_reconnect():
+                if not self.reconnecting: self._begin_reconnect(error_message)
+                return # Errors from failed reopen attempts belong to the same outage
             print(f"Forced disconnect due to: {error_message}")
+            self.reconnecting = False
             if self.fm_scan_active: 
                 self.fm_scan_stop_requested = True
                 self._fm_scan_complete("Connection Lost", original_states=None) 
@@ -1290,9 +1946,29 @@ class RadioApp(tk.Tk):
             self.update_status_indicator()
 
 
+    def _begin_reconnect(self, error_message):
+        """Keeps the session (and a running FM scan, paused) while the controller reopens the port in the background."""
+        print(f"App: Connection lost ({error_message}); reconnecting.")
+        self.reconnecting = True; self.controller.data_received = False
+        self.set_control_buttons_state(tk.DISABLED); self.update_status_indicator()
+        if self.fm_scan_active: self.fm_scan_progress_var.set("Scan paused: reconnecting...")
+        self.console_log(f"Connection lost: {error_message}\nReconnecting...\n")
+
+    def _finish_reconnect(self, info):
+        self.reconnecting = False; self.connection_stats = info['stats']
+        if info['port'] != self.port_var.get(): self.port_var.set(info['port']) # Same radio (by USB serial number) under a new device name
+        self.console_log(f"Reconnected to {info['port']} after {info['recovery_s']:.1f}s.\n")
+        if self.fm_scan_active: self._update_fm_scan_button_state() # The scan keeps its controls disabled and resumes on its own
+        else: self.set_control_buttons_state(tk.NORMAL)
+        self.update_status_indicator()
+
+    def show_controller_report(self, level, title, message):
+        (messagebox.showerror if level == 'error' else messagebox.showwarning)(title, message)
+
     def toggle_connection(self): 
         if self.connected:
             print("User initiated disconnect.")
+            self.reconnecting = False
             if self.fm_scan_active: 
                 self.fm_scan_stop_requested = True
                 self._fm_scan_complete("Disconnected", original_states=None) 
@@ -1305,13 +1981,20 @@ class RadioApp(tk.Tk):
             selected_port = self.port_var.get(); selected_baud = self.baud_var.get()
             if not selected_baud: messagebox.showwarning("Connection", "Please select a baud rate."); return
             if selected_port:
-                if self.controller.connect(selected_port, selected_baud): self.connected = True; self.set_control_buttons_state(tk.NORMAL)
+                if self.controller.connect(selected_port, selected_baud, self.port_serial_numbers.get(selected_port)): self.connected = True; self.set_control_buttons_state(tk.NORMAL)
                 else: self.connected = False; self.set_control_buttons_state(tk.DISABLED) 
             else: messagebox.showwarning("Connection", "Please select a valid COM port.")
         self.update_status_indicator()
         self._update_fm_scan_button_state()
 
 
+    def start_replay(self, session_path, speed=1.0):
+        if self.connected: self.toggle_connection()
+        self.port_var.set(f"replay:{os.path.basename(session_path)}") # Keeps replayed memory slots out of real ports' caches
+        if self.controller.connect_replay(session_path, speed): self.connected = True; self.set_control_buttons_state(tk.NORMAL)
+        self.update_status_indicator()
+        self._update_fm_scan_button_state()
+
     def toggle_sleep(self): 
         if not self.connected: messagebox.showwarning("Not Connected", "Connect to the radio first."); return
         if self.fm_scan_active: messagebox.showwarning("Scan Active", "Cannot change sleep mode during FM scan."); return
@@ -1341,7 +2024,7 @@ class RadioApp(tk.Tk):
     def update_status_indicator(self): 
         color = "red"; 
         if self.connected: 
-            color = "green" if self.controller.data_received else "yellow"
+            color = "orange" if self.reconnecting else "green" if self.controller.data_received else "yellow"
         
         try: bg_color = self.style.lookup("TFrame", "background")
         except tk.TclError: bg_color = "SystemButtonFace" 
@@ -1384,7 +2067,7 @@ class RadioApp(tk.Tk):
         else:
             self.fm_scan_stop_button.pack_forget()
             self.fm_scan_button.pack(side=tk.LEFT, padx=self.PAD_SMALL)
-            if self.connected and is_fm_mode:
+            if self.connected and not self.reconnecting and is_fm_mode:
                 self.fm_scan_button.config(state=tk.NORMAL)
             else:
                 self.fm_scan_button.config(state=tk.DISABLED)
@@ -1440,6 +2123,7 @@ class RadioApp(tk.Tk):
         self._update_fm_scan_button_state()
 
     def _save_scan_results_to_file(self, text_widget_content):
+        from tkinter import filedialog
         file_path = filedialog.asksaveasfilename(
             defaultextension=".txt",
             filetypes=[("Text files", "*.txt"), ("All files", "*.*")],
@@ -1486,6 +2170,7 @@ class RadioApp(tk.Tk):
         results_window.title("FM Scan Results")
         results_window.geometry("400x300")
         
+        from tkinter import scrolledtext
         text_area = scrolledtext.ScrolledText(results_window, wrap=tk.WORD, height=15, width=50)
         text_area.pack(padx=10, pady=10, fill=tk.BOTH, expand=True)
         text_area.insert(tk.END, results_text_content)
@@ -1496,7 +2181,7 @@ class RadioApp(tk.Tk):
         save_button.pack(pady=5)
         results_window.lift()
         
-        if reason != "Completed" and hasattr(self, 'scan_cycle_start_freq_str') and self.scan_cycle_start_freq_str:
+        if reason != "Completed" and not self.reconnecting and hasattr(self, 'scan_cycle_start_freq_str') and self.scan_cycle_start_freq_str:
             if self.freq_var.get() != self.scan_cycle_start_freq_str:
                 self.after(100, lambda sf=self.scan_cycle_start_freq_str, os=original_states, r=reason: self._initiate_tune_back(sf, os, r))
             else: 
@@ -1516,7 +2201,7 @@ class RadioApp(tk.Tk):
         step_set_success = False
         
         for attempt in range(15): 
-            if self.fm_scan_stop_requested:
+            if not self._wait_for_reconnect():
                 self.after(0, lambda os=original_states: self._fm_scan_complete("Stopped", os))
                 return
 
@@ -1590,15 +2275,14 @@ class RadioApp(tk.Tk):
         self.fm_scan_results.append({'freq': current_freq_str_for_log, 'snr': snr_val})
         self.after(0, lambda f=current_freq_str_for_log: self.fm_scan_progress_var.set(f"Scanning: {f.replace('Frequency: ', '')}"))
         if self.console_visible:
-            self.after(0, lambda f=current_freq_str_for_log, s=snr_val: self.console.insert(tk.END, f"Scan (Initial): {f}, SNR: {s}\n"))
-            self.after(0, lambda: self.console.see(tk.END))
+            self.after(0, lambda f=current_freq_str_for_log, s=snr_val: self.console_log(f"Scan (Initial): {f}, SNR: {s}\n"))
         
         last_recorded_freq_str = current_freq_str_for_log
         has_moved_from_start = False 
         steps_taken = 0
 
         while steps_taken < self.FM_SCAN_MAX_STEPS:
-            if self.fm_scan_stop_requested: break
+            if not self._wait_for_reconnect(): break
             
             freq_before_tune_cmd = self.freq_var.get() 
             self.send_encoder_command(CMD_ENCODER_UP, 18) 
@@ -1650,14 +2334,15 @@ class RadioApp(tk.Tk):
                 last_recorded_freq_str = new_current_freq_str 
                 self.after(0, lambda f=new_current_freq_str: self.fm_scan_progress_var.set(f"Scanning: {f.replace('Frequency: ', '')}"))
                 if self.console_visible:
-                     self.after(0, lambda f=new_current_freq_str, s=snr_val: self.console.insert(tk.END, f"Scan: {f}, SNR: {s}\n"))
-                     self.after(0, lambda: self.console.see(tk.END))
+                     self.after(0, lambda f=new_current_freq_str, s=snr_val: self.console_log(f"Scan: {f}, SNR: {s}\n"))
             
             steps_taken += 1
         
         completion_reason = "Completed"
         if self.fm_scan_stop_requested:
             completion_reason = "Stopped by user"
+        elif not self.connected:
+            completion_reason = "Connection Lost"
         elif steps_taken >= self.FM_SCAN_MAX_STEPS:
             print("App: FM Scan reached maximum steps. Stopping.")
             completion_reason = "Max steps reached"
@@ -1665,6 +2350,11 @@ class RadioApp(tk.Tk):
         self.after(0, lambda reason=completion_reason, os=original_states: self._fm_scan_complete(reason, os))
 
 
+    def _wait_for_reconnect(self):
+        """Holds the scan thread while the port is being reopened; False when the scan should end instead."""
+        while self.reconnecting and self.connected and not self.fm_scan_stop_requested: time.sleep(0.1)
+        return self.connected and not self.fm_scan_stop_requested
+
     def _initiate_tune_back(self, target_freq_str, original_states, scan_completion_reason):
         if not self.connected: 
             self._restore_controls_after_action(original_states) 
@@ -1735,41 +2425,55 @@ class RadioApp(tk.Tk):
 
             while not self.controller.data_queue.empty():
                 queue_item = self.controller.data_queue.get_nowait()
+                if self.profiler: self.profiler.begin_item(queue_item)
                 if isinstance(queue_item, tuple) and len(queue_item) == 2:
                     item_type, item_data = queue_item
                     if item_type == 'screenshot_data':
                         hex_data, transfer_duration = item_data 
+                        self.controller.latency.record('screenshot_transfer', transfer_duration)
                         self.display_screenshot(hex_data, transfer_duration); continue 
                     elif item_type == 'screenshot_error':
                         messagebox.showerror("Screenshot Error", item_data)
-                        if self.console_visible: self.console.insert(tk.END, f"Screenshot error: {item_data}\n")
+                        self.console_log(f"Screenshot error: {item_data}\n")
                         if hasattr(self, 'screenshot_btn'):
                             self.screenshot_btn.config(text=self.SCREENSHOT_EMOJI)
                         self.set_control_buttons_state(tk.NORMAL if self.connected else tk.DISABLED)
                         continue
                     elif item_type == 'serial_error_disconnect': 
                         self.handle_forced_disconnect(item_data); continue
+                    elif item_type == 'reconnected':
+                        if self.reconnecting: self._finish_reconnect(item_data)
+                        continue
                     elif item_type == 'memory_slots_data':
-                        for i in range(32): self.memory_slots_data[i].update({'band': '', 'freq_hz': '', 'mode': ''})
-                        for line in item_data:
-                            match = RadioController.MEMORY_SLOT_PATTERN.match(line.strip()) 
-                            if match:
-                                try:
-                                    slot_num_str, band_val, freq_val, mode_val = [g.strip() for g in match.groups()]
-                                    slot_idx = int(slot_num_str) -1 
-                                    if 0 <= slot_idx < 32: self.memory_slots_data[slot_idx].update({'band': band_val, 'freq_hz': freq_val, 'mode': mode_val})
-                                except (ValueError, IndexError) as e: print(f"App: Error parsing slot line '{line}': {e}")
-                        
-                        if self.waiting_for_memory_data_to_build_viewer:
-                            self._build_and_show_memory_viewer(); self.waiting_for_memory_data_to_build_viewer = False
-                        else: self.update_memory_viewer_display()
-                        if self.console_visible: self.console.insert(tk.END, "Memory slots updated.\n")
+                        self._apply_memory_slot_lines(item_data)
+                        self.update_memory_viewer_display()
+                        self.console_log("Memory slots updated.\n")
+                        self.special_op_active_for_blink = False 
+                        self.set_control_buttons_state(tk.NORMAL if self.connected else tk.DISABLED)
+                        continue
+                    elif item_type == 'memory_sync_result':
+                        written_slots, readback_lines = item_data
+                        failed_slots = MemorySlotSync.verify(written_slots, MemorySlotSync.slots_from_lines(readback_lines).values())
+                        self._apply_memory_slot_lines(readback_lines, {e['slot_num'] for e in written_slots} - set(failed_slots))
+                        self.update_memory_viewer_display()
+                        if failed_slots:
+                            messagebox.showerror("Memory Sync", f"Read-back mismatch on slot(s): {', '.join(f'{n:02d}' for n in failed_slots)}")
+                        else:
+                            messagebox.showinfo("Memory Sync", f"{len(written_slots)} slot(s) written and verified by read-back.")
+                        self.console_log(f"Memory sync: {len(written_slots)} written, {len(failed_slots)} failed verification.\n")
+                        self.special_op_active_for_blink = False 
+                        self.set_control_buttons_state(tk.NORMAL if self.connected else tk.DISABLED)
+                        continue
+                    elif item_type == 'memory_sync_error':
+                        messagebox.showerror("Memory Sync Error", item_data)
+                        self.console_log(f"Memory sync error: {item_data}\n")
                         self.special_op_active_for_blink = False 
                         self.set_control_buttons_state(tk.NORMAL if self.connected else tk.DISABLED)
                         continue
                     elif item_type == 'memory_slots_error':
                         messagebox.showerror("Memory Slot Error", item_data)
-                        if self.console_visible: self.console.insert(tk.END, f"Memory slot error: {item_data}\n")
+                        self.memory_read_started_at = 0; self._update_memory_status()
+                        self.console_log(f"Memory slot error: {item_data}\n")
                         self.special_op_active_for_blink = False 
                         self.set_control_buttons_state(tk.NORMAL if self.connected else tk.DISABLED)
                         continue
@@ -1778,27 +2482,37 @@ class RadioApp(tk.Tk):
                         self.special_op_active_for_blink = False 
                         self.set_control_buttons_state(tk.NORMAL if self.connected else tk.DISABLED)
                         continue
+                    elif item_type == 'theme_set_result':
+                        self._handle_theme_set_result(*item_data)
+                        self.special_op_active_for_blink = False 
+                        self.set_control_buttons_state(tk.NORMAL if self.connected else tk.DISABLED)
+                        continue
+                    elif item_type == 'theme_set_error':
+                        messagebox.showerror("Theme Error", item_data)
+                        self.console_log(f"Theme set error: {item_data}\n")
+                        if self.theme_send_button and self.theme_send_button.winfo_exists(): self.theme_send_button.config(state=tk.NORMAL, text="Send to Radio")
+                        self.special_op_active_for_blink = False 
+                        self.set_control_buttons_state(tk.NORMAL if self.connected else tk.DISABLED)
+                        continue
                     elif item_type == 'theme_data_error':
                         messagebox.showerror("Theme Error", item_data)
-                        if self.console_visible: self.console.insert(tk.END, f"Theme data error: {item_data}\n")
-                        if self.screenshot_window and self.screenshot_window.winfo_exists() and self.theme_palette_frame:
-                             for widget in self.theme_palette_frame.winfo_children(): widget.destroy()
-                             if hasattr(self.theme_palette_frame, 'loading_label'): delattr(self.theme_palette_frame, 'loading_label')
-                             error_label = ttk.Label(self.theme_palette_frame, text=item_data)
-                             error_label.pack(pady=5)
+                        self.console_log(f"Theme data error: {item_data}\n")
+                        self._set_theme_band_message(item_data)
                         self.special_op_active_for_blink = False 
                         self.set_control_buttons_state(tk.NORMAL if self.connected else tk.DISABLED)
                         continue
 
 
-                data_line = str(queue_item) 
-                if self.console_visible and self.console.winfo_exists(): self.console.insert(tk.END, data_line + '\n'); self.console.see(tk.END)
+                dequeued_at = time.monotonic()
+                data_line = str(queue_item); self.console_history.add(data_line) # The reader already logged it
                 if RadioController.DATA_LOG_PATTERN.match(data_line): 
                     params = data_line.split(',')
                     if len(params) >= 15: 
                         try:
-                            app_v=int(params[0]); raw_f=int(params[1]); bfo=int(params[2]); cal=int(params[3]); band=params[4].strip(); mode=params[5].strip() 
-                            step=params[6].strip(); bw=params[7].strip(); agc=int(params[8]); vol=int(params[9]); rssi=int(params[10]); snr=int(params[11]); volt=float(params[13])
+                            parse_started_at = time.monotonic()
+                            status = RadioStatus.from_fields(params)
+                            parse_seconds = time.monotonic() - parse_started_at
+                            app_v, raw_f, bfo, cal, band, mode, step, bw, agc, vol, rssi, snr, volt = status
                             
                             old_mode_val = self.mode_var.get() 
                             self.mode_var.set(f"Mode: {mode}")
@@ -1806,33 +2520,59 @@ class RadioApp(tk.Tk):
                                 self._update_fm_scan_button_state()
 
                             self.step_var.set(f"Step: {step}") 
-
-                            if mode in ['LSB','USB']: self.freq_var.set(f"Frequency: {(raw_f*1000+bfo)/1000.0:.3f} kHz")
-                            elif mode=='FM': self.freq_var.set(f"Frequency: {raw_f/100.0:.2f} MHz")
-                            else: self.freq_var.set(f"Frequency: {raw_f} kHz")
+                            self.current_band = band; self.current_mode = mode; self.current_step_str = step
+                            self.current_frequency_hz = status.frequency_hz
+                            self.freq_var.set(status.frequency_text())
+                            self._update_station_label()
                             agc_s,agc_l=self.format_agc_status_display(agc); self.agc_var.set(agc_s); self.agc_status_var.set(agc_l)
                             self.vol_var.set(f"Vol: {vol} ({self.value_to_percentage(vol,self.MAX_VOLUME)}%)")
                             self.band_var.set(f"Band: {band}"); 
                             self.bw_var.set(f"BW: {bw}")
                             self.cal_var.set(self.format_calibration_display(cal)); self.rssi_var.set(f"RSSI: {rssi} dBuV"); self.snr_var.set(f"SNR: {snr} dB")
                             self.batt_var.set(f"Battery: {volt:.2f}V ({self.voltage_to_percentage(volt)}%)")
-                            self.fw_var.set(f"Firmware: {self.format_firmware_version(app_v)}") 
-                            if not self.controller.data_received: self.controller.data_received=True; self.update_status_indicator()
+                            self.fw_var.set(f"Firmware: {self.format_firmware_version(app_v)}"); self.current_firmware_version = app_v
+                            if not self.controller.data_received:
+                                self.controller.data_received=True; self.update_status_indicator()
+                                if self.connected and not self.port_var.get().startswith("replay:"): self.port_prober.remember(self.port_var.get(), self.baud_var.get())
                             self._update_snr_indicator() 
+                            self._record_line_latency(queue_item, dequeued_at, parse_seconds)
                         except (ValueError,IndexError) as e: 
                             log_msg=f"App: Data parsing error for log line: '{data_line}' - {e}\n"; print(log_msg.strip()) 
-                            if self.console_visible and self.console.winfo_exists(): self.console.insert(tk.END, log_msg)
+                            self.console_log(log_msg)
                         except Exception as e: 
                             log_msg=f"App: Unexpected error processing log line: '{data_line}' - {e}\n"; print(log_msg.strip())
-                            if self.console_visible and self.console.winfo_exists(): self.console.insert(tk.END, log_msg)
+                            self.console_log(log_msg)
                     else: 
                         log_msg=f"App: Line matched DATA_LOG_PATTERN but had {len(params)} fields: '{data_line}'\n"; print(log_msg.strip())
-                        if self.console_visible and self.console.winfo_exists(): self.console.insert(tk.END, log_msg)
+                        self.console_log(log_msg)
 
         except queue.Empty: pass
         finally:
+            if self.profiler: self.profiler.end_item()
+            self._flush_console()
             if self.winfo_exists(): self.after(100, lambda: self.process_serial_queue())
 
 if __name__ == "__main__":
-    app = RadioApp()
-    app.mainloop()
+    parser = argparse.ArgumentParser(description="ATS-Mini Radio Controller")
+    parser.add_argument("--profile", nargs="?", const="miniradio-profile", metavar="PREFIX",
+                        help="Time Tk callbacks and queue handlers, sample all threads, and write PREFIX.collapsed and PREFIX-handlers.txt on exit.")
+    parser.add_argument("--record", metavar="DIR", help="Record every connection's serial traffic to a session file in DIR.")
+    parser.add_argument("--replay", metavar="SESSION", help="Replay a recorded session file instead of connecting to a radio.")
+    parser.add_argument("--speed", default="1", help="Replay speed: 1, 10, ... or 'max'.")
+    parser.add_argument("--telemetry", nargs="?", const=TelemetryLogger.DEFAULT_DIR, metavar="DIR",
+                        help=f"Log every status frame to rotating columnar files in DIR (default {TelemetryLogger.DEFAULT_DIR}).")
+    parser.add_argument("--console-lines", type=int, default=ConsoleHistory.MAX_LINES, metavar="N",
+                        help=f"Lines kept in the serial console widget (default {ConsoleHistory.MAX_LINES}); older lines stay searchable in a session log that grows for the whole session.")
+    parser.add_argument("--engine", choices=["thread", "process"], default="thread",
+                        help="Run serial I/O and parsing in a reader thread (default) or a separate process that GUI load cannot stall.")
+    parser.add_argument("--no-reconnect", action="store_true", help="Disconnect on a serial error instead of reopening the port.")
+    args = parser.parse_args()
+    profiler = Profiler(args.profile) if args.profile else None
+    if profiler: profiler.start()
+    app = RadioApp(profiler, max(1, args.console_lines), ProcessRadioController() if args.engine == "process" else None)
+    app.controller.record_dir = args.record; app.auto_reconnect = not args.no_reconnect
+    app.controller.telemetry_dir = args.telemetry
+    if args.replay: app.after(200, lambda: app.start_replay(args.replay, 0 if args.speed == 'max' else float(args.speed)))
+    try: app.mainloop()
+    finally:
+        if profiler: profiler.stop()
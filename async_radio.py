@@ -0,0 +1,342 @@
+"""asyncio controller for ATS-Mini radios: awaitable screenshot, memory and theme operations, tuning, and an async
+stream of status frames, for scripts that drive several radios or scans from one event loop.
+
+    python async_radio.py PORT [PORT ...] [--watch SECONDS] [--memory] [--screenshot DIR] [--tune FREQ_HZ]
+
+The serial port's file descriptor is watched with loop.add_reader/add_writer (POSIX), so each radio costs no thread.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+from serial import Serial, SerialException
+
+from radio_core import (RadioController, RadioStatus, MemorySlotSync, LogPause, MODES, BANDS, CMD_TOGGLE_LOG, CMD_SCREENSHOT, CMD_SHOW_MEM,
+                        CMD_THEME_EDITOR_TOGGLE, CMD_THEME_GET, CMD_THEME_SET_SUFFIX, CMD_BAND_NEXT, CMD_MODE_NEXT, CMD_STEP_NEXT, CMD_ENCODER_UP, CMD_ENCODER_DOWN)
+
+
+class RadioOperationError(Exception):
+    """A radio operation timed out, was corrupted, or the connection was lost."""
+
+
+class _Operation:
+    """One special operation in progress: collects its response lines and resolves a future."""
+    def __init__(self, kind, future, inactivity_timeout, first_data_timeout):
+        self.kind = kind; self.future = future; self.lines = []; self.hex = []; self.hex_len = 0; self.expected_hex_len = None
+        self.inactivity_timeout = inactivity_timeout; self.first_data_timeout = first_data_timeout; self.timer = None
+
+
+class AsyncRadioController:
+    """asyncio counterpart of RadioController. Special operations run one at a time per radio with the status log paused,
+    exactly as the GUI does (operations waiting for the radio share one pause); they return their result or raise
+    RadioOperationError."""
+    SCREENSHOT_INACTIVITY_TIMEOUT = RadioController.SCREENSHOT_DATA_INACTIVITY_TIMEOUT
+    MEMORY_INACTIVITY_TIMEOUT = RadioController.MEMORY_DATA_INACTIVITY_TIMEOUT
+    THEME_INACTIVITY_TIMEOUT = RadioController.THEME_DATA_INACTIVITY_TIMEOUT
+    FIRST_DATA_TIMEOUT = 10.0
+    TUNE_SETTLE_TIME = 0.35; TUNE_MAX_PASSES = 8; TUNE_MAX_BURST = 60 # Same pacing as the GUI's preset tuning
+
+    def __init__(self, port, baudrate=115200, log=True):
+        self.port = port; self.baudrate = baudrate; self.want_log = log
+        self.ser = None; self.fd = None; self.loop = None; self.log_on = False
+        self.in_buffer = b""; self.out_buffer = b""; self.writer_added = False
+        self.status = None; self.status_received_at = None
+        self.op = None; self.op_lock = None; self.subscribers = set(); self.status_waiters = []; self.error = None
+        self.log_pause = LogPause(); self.ops_waiting = 0
+        self.line_listeners = [] # Called with every line received, before it is parsed (the TCP multiplexer's raw feed)
+
+    # --- Connection ---
+    async def open(self):
+        self.loop = asyncio.get_running_loop(); self.op_lock = asyncio.Lock()
+        try: self.ser = Serial(self.port, int(self.baudrate), timeout=0); self.fd = self.ser.fileno()
+        except (SerialException, ValueError, AttributeError) as e: raise RadioOperationError(f"Failed to open {self.port}: {e}") from e
+        os.set_blocking(self.fd, False)
+        self.loop.add_reader(self.fd, self._on_readable)
+        if self.want_log: self._write_line(CMD_TOGGLE_LOG); self.log_on = True; self.log_pause.commanded(True)
+        return self
+
+    async def close(self):
+        if self.ser is None: return
+        if self.log_on and not self.log_pause.active and not self.error: self.out_buffer += (CMD_TOGGLE_LOG + '\n').encode(); self.log_on = False # Leave the radio as found
+        self._fail(RadioOperationError("Connection closed."))
+        self.loop.remove_reader(self.fd)
+        if self.writer_added: self.loop.remove_writer(self.fd); self.writer_added = False
+        if self.out_buffer:
+            os.set_blocking(self.fd, True)
+            try: os.write(self.fd, self.out_buffer)
+            except OSError: pass
+            self.out_buffer = b""
+        self.ser.close(); self.ser = None
+
+    async def __aenter__(self): return await self.open()
+    async def __aexit__(self, *exc): await self.close()
+
+    def _fail(self, error):
+        self.error = error
+        if self.op and not self.op.future.done(): self.op.future.set_exception(error)
+        for waiter in self.status_waiters:
+            if not waiter.done(): waiter.set_exception(error)
+        self.status_waiters = []
+        for subscriber in self.subscribers: self._offer(subscriber, error)
+
+    # --- Transport ---
+    def _on_readable(self):
+        try: data = os.read(self.fd, 4096)
+        except BlockingIOError: return
+        except OSError as e: data = None; error = e
+        if not data:
+            self.loop.remove_reader(self.fd); self._fail(RadioOperationError(f"Serial read failed: {error if data is None else 'port closed'}")); return
+        received_at = time.monotonic(); self.in_buffer += data
+        while b'\n' in self.in_buffer:
+            line_bytes, self.in_buffer = self.in_buffer.split(b'\n', 1)
+            try: line = line_bytes.decode('ascii').strip()
+            except UnicodeDecodeError:
+                if self.op: self._finish_op(error=f"Unicode corruption in {self.op.kind} data.")
+                continue
+            self._handle_line(line, received_at)
+
+    def _write_line(self, text): self._write((text + '\n').encode())
+
+    def _write(self, data):
+        if self.ser is None: raise RadioOperationError("Not connected.")
+        self.out_buffer += data; self._flush_output()
+
+    def _flush_output(self):
+        try: written = os.write(self.fd, self.out_buffer) if self.out_buffer else 0
+        except BlockingIOError: written = 0
+        except OSError as e: self._fail(RadioOperationError(f"Serial write failed: {e}")); return
+        self.out_buffer = self.out_buffer[written:]
+        if self.out_buffer and not self.writer_added: self.loop.add_writer(self.fd, self._flush_output); self.writer_added = True
+        elif not self.out_buffer and self.writer_added: self.loop.remove_writer(self.fd); self.writer_added = False
+
+    # --- Line handling ---
+    def _handle_line(self, line, received_at):
+        for listener in self.line_listeners: listener(line)
+        if self.op and self._feed_op(line): return
+        if RadioController.DATA_LOG_PATTERN.match(line):
+            params = line.split(',')
+            if len(params) < 15: return
+            try: status = RadioStatus.from_fields(params)
+            except (ValueError, IndexError): return
+            self._publish_status(status, received_at)
+
+    def _publish_status(self, status, received_at):
+        self.status = status; self.status_received_at = received_at
+        for waiter in self.status_waiters:
+            if not waiter.done(): waiter.set_result(status)
+        self.status_waiters = []
+        for subscriber in self.subscribers: self._offer(subscriber, status)
+
+    @staticmethod
+    def _offer(subscriber, item):
+        if subscriber.full(): subscriber.get_nowait() # Latest value wins for slow consumers
+        subscriber.put_nowait(item)
+
+    def _feed_op(self, line):
+        """Gives a line to the operation in progress; returns False when it is not part of the response."""
+        op = self.op
+        if not line: self._arm_op_timer(); return True
+        if op.kind == "Screenshot":
+            if RadioController.DATA_LOG_PATTERN.match(line): return False
+            if line and all(c in "0123456789abcdefABCDEF" for c in line):
+                op.hex.append(line); op.hex_len += len(line)
+                if op.expected_hex_len is None and op.hex_len >= 12: # BMP header: file size at bytes 2-5
+                    op.expected_hex_len = int.from_bytes(bytes.fromhex("".join(op.hex)[:12])[2:6], 'little') * 2 or None
+                if op.expected_hex_len and op.hex_len >= op.expected_hex_len: self._finish_op(result="".join(op.hex)[:op.expected_hex_len]); return True
+            self._arm_op_timer(); return True
+        if op.kind == "Memory":
+            if RadioController.MEMORY_SLOT_PATTERN.match(line):
+                op.lines.append(line); self._arm_op_timer()
+                if len(op.lines) >= MemorySlotSync.NUM_SLOTS: self._finish_op(result=op.lines)
+                return True
+            if line.upper() == "OK" or "Error: Expected newline" in line: self._arm_op_timer(); return True
+            if op.lines: self._finish_op(result=op.lines)
+            return False
+        match = RadioController.THEME_STRING_LINE_PATTERN.match(line)
+        if match: self._finish_op(result=match.group(1)); return True
+        self._arm_op_timer(); return not RadioController.DATA_LOG_PATTERN.match(line)
+
+    def _arm_op_timer(self):
+        op = self.op
+        if op.timer: op.timer.cancel()
+        has_data = op.hex or op.lines or op.kind == "ThemeGet"
+        op.timer = self.loop.call_later(op.inactivity_timeout if has_data else op.first_data_timeout, self._op_timed_out)
+
+    def _op_timed_out(self):
+        op = self.op
+        if op is None or op.future.done(): return
+        if op.hex: self._finish_op(result="".join(op.hex))
+        elif op.lines: self._finish_op(result=op.lines)
+        else: self._finish_op(error={"Screenshot": "No screenshot data received.", "Memory": "No memory slot data received."}.get(op.kind, "No theme string received or timeout."))
+
+    def _finish_op(self, result=None, error=None):
+        op = self.op
+        if op.timer: op.timer.cancel()
+        if not op.future.done():
+            if error: op.future.set_exception(RadioOperationError(error))
+            else: op.future.set_result(result)
+
+    async def _special_op(self, kind, commands, inactivity_timeout, first_data_timeout=FIRST_DATA_TIMEOUT, theme_editor=False):
+        self.ops_waiting += 1
+        try: await self.op_lock.acquire()
+        except asyncio.CancelledError:
+            self.ops_waiting -= 1
+            if not self.ops_waiting and not self.op_lock.locked() and self.ser is not None and self.log_pause.resume(self.status_received_at):
+                self._write_line(CMD_TOGGLE_LOG) # The operation before this one left the log paused for it
+            raise
+        self.ops_waiting -= 1
+        try:
+            if self.error: raise self.error
+            if self.log_pause.pause(self.status_received_at): self._write_line(CMD_TOGGLE_LOG); await asyncio.sleep(0.05)
+            if theme_editor: self._write_line(CMD_THEME_EDITOR_TOGGLE); await asyncio.sleep(0.05)
+            self.op = _Operation(kind, self.loop.create_future(), inactivity_timeout, first_data_timeout)
+            try:
+                for command, pause in commands:
+                    self._write_line(command)
+                    if pause: await asyncio.sleep(pause)
+                self._arm_op_timer()
+                return await self.op.future
+            finally:
+                if self.op.timer: self.op.timer.cancel()
+                self.op = None
+                if self.ser is not None:
+                    if theme_editor: self._write_line(CMD_THEME_EDITOR_TOGGLE); await asyncio.sleep(0.05)
+                    if not self.ops_waiting and self.log_pause.resume(self.status_received_at): await asyncio.sleep(0.1); self._write_line(CMD_TOGGLE_LOG)
+        finally: self.op_lock.release()
+
+    # --- Operations ---
+    async def send(self, command):
+        """Sends a plain one-character command (volume, band, step, ...)."""
+        self._write_line(command)
+
+    async def screenshot(self):
+        """Returns the screen as BMP bytes. Completes as soon as the size in the BMP header has arrived."""
+        return bytes.fromhex(await self._special_op("Screenshot", [(CMD_SCREENSHOT, 0)], self.SCREENSHOT_INACTIVITY_TIMEOUT))
+
+    async def memory_slots(self):
+        """Returns the 32 memory slots as dicts with slot_num, band, freq_hz and mode."""
+        slots = MemorySlotSync.slots_from_lines(await self._special_op("Memory", [(CMD_SHOW_MEM, 0)], self.MEMORY_INACTIVITY_TIMEOUT))
+        return [slots.get(n, {'slot_num': n, 'band': '', 'freq_hz': '', 'mode': ''}) for n in range(1, MemorySlotSync.NUM_SLOTS + 1)]
+
+    async def write_memory_slots(self, slot_entries):
+        """Writes the given slots in one burst, reads all slots back and returns the slot numbers that failed verification."""
+        entries = list(slot_entries)
+        burst = "\n".join(MemorySlotSync.format_set_command(e) for e in entries)
+        lines = await self._special_op("Memory", [(burst, 0.1), (CMD_SHOW_MEM, 0)], self.MEMORY_INACTIVITY_TIMEOUT)
+        return MemorySlotSync.verify(entries, list(MemorySlotSync.slots_from_lines(lines).values()))
+
+    async def theme(self, set_theme=None):
+        """Returns the radio's theme string ('x' + 4 hex digits per color); with set_theme, writes it first and returns the read-back."""
+        commands = ([(CMD_THEME_SET_SUFFIX + set_theme, 0.1)] if set_theme else []) + [(CMD_THEME_GET, 0)]
+        return await self._special_op("ThemeGet", commands, self.THEME_INACTIVITY_TIMEOUT, theme_editor=True)
+
+    async def next_status(self, timeout=5.0):
+        """Waits for the next status frame (the status log must be on)."""
+        if self.error: raise self.error
+        waiter = self.loop.create_future(); self.status_waiters.append(waiter)
+        try: return await asyncio.wait_for(waiter, timeout)
+        except asyncio.TimeoutError: raise RadioOperationError("No status frame received; is the status log on?") from None
+
+    async def status_frames(self, buffer=1):
+        """Async iterator of status frames; a consumer slower than the radio sees the newest frames."""
+        subscriber = asyncio.Queue(maxsize=buffer); self.subscribers.add(subscriber)
+        try:
+            while True:
+                item = await subscriber.get()
+                if isinstance(item, Exception): raise item
+                yield item
+        finally: self.subscribers.discard(subscriber)
+
+    async def _cycle(self, field, target, command, max_presses):
+        status = await self.next_status()
+        for _ in range(max_presses):
+            if getattr(status, field) == target: return status
+            self._write_line(command); await asyncio.sleep(self.TUNE_SETTLE_TIME); status = await self.next_status()
+        raise RadioOperationError(f"Could not select {field} {target}.")
+
+    async def tune(self, freq_hz, band=None, mode=None):
+        """Selects band and mode if given, then steps the encoder to freq_hz; returns the final status frame."""
+        async with self.op_lock: # Special operations pause the status log that tuning steers by
+            return await self._tune(freq_hz, band, mode)
+
+    async def _tune(self, freq_hz, band, mode):
+        if band: await self._cycle('band', band, CMD_BAND_NEXT, len(BANDS))
+        if mode: await self._cycle('mode', mode, CMD_MODE_NEXT, len(MODES))
+        status = await self.next_status()
+        for _ in range(self.TUNE_MAX_PASSES):
+            step_hz = RadioStatus.step_to_hz(status.step)
+            if not step_hz: raise RadioOperationError(f"Unknown tuning step '{status.step}'.")
+            steps_needed = round((freq_hz - status.frequency_hz) / step_hz)
+            if steps_needed == 0: return status
+            for _ in range(min(abs(steps_needed), self.TUNE_MAX_BURST)):
+                self._write_line(CMD_ENCODER_UP if steps_needed > 0 else CMD_ENCODER_DOWN); await asyncio.sleep(0.03)
+            await asyncio.sleep(self.TUNE_SETTLE_TIME); status = await self.next_status()
+        return status
+
+    async def scan(self, step="100k", dwell=0.5, max_steps=500):
+        """Steps the encoder up through the band at the given tuning step, as the GUI's FM scan does, until the frequency
+        wraps back to where it started; returns the status frame seen at each frequency."""
+        async with self.op_lock:
+            start = await self._cycle('step', step, CMD_STEP_NEXT, 10)
+            frames = [start]
+            for _ in range(max_steps):
+                self._write_line(CMD_ENCODER_UP); await asyncio.sleep(dwell); status = await self.next_status()
+                if status.raw_f == start.raw_f: break
+                if status.raw_f != frames[-1].raw_f: frames.append(status)
+            return frames
+
+
+# --- Command line ---
+async def run_radio(port, args):
+    async with AsyncRadioController(port, args.baud) as radio:
+        tasks = []
+        if args.memory:
+            async def dump_memory():
+                for slot in await radio.memory_slots():
+                    if slot['freq_hz'] and slot['freq_hz'] != '0': print(f"{port}: slot {slot['slot_num']:2d} {slot['band']} {slot['freq_hz']} {slot['mode']}")
+            tasks.append(dump_memory())
+        if args.screenshot:
+            async def save_screenshot():
+                started = time.monotonic(); data = await radio.screenshot()
+                path = os.path.join(args.screenshot, f"screenshot-{os.path.basename(port)}.bmp")
+                with open(path, 'wb') as f: f.write(data)
+                print(f"{port}: screenshot {len(data)} bytes in {time.monotonic() - started:.2f}s -> {path}")
+            tasks.append(save_screenshot())
+        if args.tune:
+            async def tune():
+                status = await radio.tune(args.tune); print(f"{port}: tuned, {status.frequency_text()}")
+            tasks.append(tune())
+        if args.watch:
+            async def watch():
+                deadline = time.monotonic() + args.watch
+                async for status in radio.status_frames():
+                    print(f"{port}: {status.frequency_text()} RSSI {status.rssi} SNR {status.snr} {status.volt:.2f}V")
+                    if time.monotonic() > deadline: break
+            tasks.append(watch())
+        for result in await asyncio.gather(*tasks, return_exceptions=True):
+            if isinstance(result, Exception): print(f"{port}: {result}")
+
+
+async def main_async(args):
+    if args.screenshot: os.makedirs(args.screenshot, exist_ok=True)
+    results = await asyncio.gather(*(run_radio(port, args) for port in args.ports), return_exceptions=True)
+    failures = [r for r in results if isinstance(r, Exception)]
+    for failure in failures: print(failure)
+    return 1 if failures else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Drive one or more ATS-Mini radios concurrently from one asyncio event loop.")
+    parser.add_argument("ports", nargs="+", help="Serial ports (e.g. /dev/ttyACM0 /dev/ttyACM1).")
+    parser.add_argument("--baud", type=int, default=115200)
+    parser.add_argument("--watch", type=float, default=0, metavar="SECONDS", help="Print status frames for this long.")
+    parser.add_argument("--memory", action="store_true", help="Print the memory slots.")
+    parser.add_argument("--screenshot", metavar="DIR", help="Save a screenshot of each radio to DIR.")
+    parser.add_argument("--tune", type=int, metavar="FREQ_HZ", help="Tune each radio to this frequency in its current band.")
+    return asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,467 @@
+"""End-to-end performance benchmarks for MiniRadio4, run against the pty emulator (radio_emulator.py).
+
+    python benchmarks.py [--quick] [--output results.json] [--compare baseline.json]
+
+Results are written as JSON; --compare prints the change per metric against an earlier run and exits
+with status 1 when a metric regressed by more than --threshold percent. Benchmarks that need a Tk
+display (queue-to-label latency, FM scan, start-up) are recorded as skipped when none is available.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import queue
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+import radio_emulator
+from MiniRadio4 import RadioApp
+from radio_core import RadioController, RadioStatus, CMD_SCREENSHOT, CMD_SHOW_MEM, CMD_VOLUME_UP
+from async_radio import AsyncRadioController, RadioOperationError
+from radio_server import RadioServer, RadioClient, encode
+from radio_http import TelemetryHttpServer
+
+RESULTS_FORMAT = "miniradio-benchmark"
+CONNECT_BAUD = 115200
+
+
+# --- Helpers ---
+def percentile(values, pct):
+    if not values: return None
+    ordered = sorted(values); k = (len(ordered) - 1) * pct / 100.0; lo = int(k); hi = min(lo + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+def wait_for(data_queue, item_type, timeout):
+    """Returns (arrival time, data) of the next ('item_type', data) queue item, or (None, None) on timeout."""
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        try: item = data_queue.get(timeout=0.05)
+        except queue.Empty: continue
+        if isinstance(item, tuple) and item[0] == item_type: return time.perf_counter(), item[1]
+    return None, None
+
+
+class EmulatedRadio:
+    """Context manager pairing a RadioEmulator with a connected RadioController."""
+
+    def __init__(self, **emulator_args):
+        self.emulator = radio_emulator.RadioEmulator(**emulator_args); self.controller = RadioController()
+
+    def __enter__(self):
+        port = self.emulator.start()
+        if not self.controller.connect(port, CONNECT_BAUD): raise RuntimeError(f"Could not connect to emulator at {port}")
+        time.sleep(0.2) # Let the log toggle land
+        return self
+
+    def __exit__(self, *exc):
+        self.controller.disconnect(); self.emulator.stop()
+
+    def drain(self):
+        while True:
+            try: self.controller.data_queue.get_nowait()
+            except queue.Empty: return
+
+
+def display_available():
+    try:
+        import tkinter
+        root = tkinter.Tk(); root.destroy(); return True
+    except Exception: return False
+
+
+# --- Benchmarks ---
+def bench_read_serial_throughput(config):
+    """Unpaced status lines through read_serial into data_queue (frames merged by the latest-value-wins slot count as received)."""
+    n = config['lines']
+    with EmulatedRadio(baud=0, status_interval=3600) as radio:
+        radio.drain(); line = radio.emulator.status_line(); delivered = 0; merged_before = radio.controller.data_queue.merged
+        start = time.perf_counter()
+        for _ in range(n): radio.emulator.send_line(line, corruptible=False)
+        deadline = start + 60; received = 0
+        while received < n and time.perf_counter() < deadline:
+            try: item = radio.controller.data_queue.get(timeout=0.5)
+            except queue.Empty: continue
+            delivered += isinstance(item, str); received = delivered + radio.controller.data_queue.merged - merged_before
+        elapsed = time.perf_counter() - start
+    return {'lines': received, 'delivered': delivered, 'elapsed_s': round(elapsed, 4), 'lines_per_s': round(received / elapsed, 1),
+            'bytes_per_s': round(received * (len(line) + 2) / elapsed, 1)}
+
+
+def bench_status_parse(config):
+    """Pattern match, split, RadioStatus.from_fields and label text for one status frame."""
+    lines = [radio_emulator.RadioEmulator(seed=i).status_line() for i in range(100)]
+    n = config['parse_iterations']; pattern = RadioController.DATA_LOG_PATTERN
+    start = time.perf_counter()
+    for i in range(n):
+        line = lines[i % 100]
+        if pattern.match(line): RadioStatus.from_fields(line.split(',')).frequency_text()
+    elapsed = time.perf_counter() - start
+    return {'frames': n, 'per_frame_us': round(elapsed / n * 1e6, 3), 'frames_per_s': round(n / elapsed, 1)}
+
+
+def bench_queue_to_label_latency(config):
+    """Time from data_queue.put to the frequency label update in process_serial_queue."""
+    if not config['display']: return {'skipped': "no Tk display"}
+    app = RadioApp(); app.withdraw()
+    put_times = {}; latencies = []
+    def on_freq_write(*_):
+        sent = put_times.pop(app.freq_var.get(), None)
+        if sent is not None: latencies.append(time.perf_counter() - sent)
+    app.freq_var.trace_add('write', on_freq_write)
+    try:
+        for i in range(config['latency_frames']):
+            raw_f = 8800 + i % 2000
+            line = f"233,{raw_f},0,0,VHF,FM,100k,Auto,0,35,20,10,0,4.05,{i}"
+            put_times[RadioStatus.from_fields(line.split(',')).frequency_text()] = time.perf_counter()
+            app.controller.data_queue.put(line)
+            frame_deadline = time.perf_counter() + config['latency_interval']
+            while time.perf_counter() < frame_deadline: app.update(); time.sleep(0.001)
+    finally: app.destroy()
+    return {'frames': len(latencies), 'p50_ms': round(percentile(latencies, 50) * 1000, 2), 'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+            'mean_ms': round(statistics.mean(latencies) * 1000, 2)} if latencies else {'skipped': "no label updates observed"}
+
+
+def bench_screenshot(config):
+    """Screenshot time to first pixel, to last pixel and to delivery (incl. the inactivity timeout) per baud rate."""
+    width, height = config['screen']; results = {}
+    for baud in config['bauds']:
+        with EmulatedRadio(baud=baud, screen_size=(width, height), status_interval=3600) as radio:
+            controller = radio.controller; radio.drain()
+            first_pixel = last_pixel = None; last_len = 0; result = {}
+            done = threading.Event()
+            def watch():
+                nonlocal first_pixel, last_pixel, last_len
+                while not done.is_set():
+                    current_len = len(controller.screenshot_hex_buffer)
+                    if current_len != last_len:
+                        now = time.perf_counter(); first_pixel = first_pixel or now; last_pixel = now; last_len = current_len
+                    time.sleep(0.001)
+            threading.Thread(target=watch, daemon=True).start()
+            start = time.perf_counter(); controller.send_command(CMD_SCREENSHOT)
+            expected_s = (width * height * 2 + 66) * 2 * 1.01 / (baud / 10.0)
+            delivered, data = wait_for(controller.data_queue, 'screenshot_data', expected_s * 2 + controller.SCREENSHOT_DATA_INACTIVITY_TIMEOUT + 10)
+            done.set()
+            if delivered is None or first_pixel is None: result['error'] = "no screenshot received"
+            else:
+                hex_len = len(data[0])
+                result = {'bytes': hex_len // 2, 'first_pixel_s': round(first_pixel - start, 4), 'transfer_s': round(last_pixel - start, 4),
+                          'delivered_s': round(delivered - start, 4), 'bytes_per_s': round(hex_len / max(last_pixel - first_pixel, 1e-9), 1)}
+            results[str(baud)] = result
+    return results
+
+
+def bench_memory_dump(config):
+    """Latency from '$' to the parsed memory_slots_data item, per baud rate (median of repeats)."""
+    results = {}
+    for baud in config['bauds']:
+        with EmulatedRadio(baud=baud, status_interval=3600) as radio:
+            radio.drain(); samples = []
+            for _ in range(config['memory_repeats']):
+                start = time.perf_counter(); radio.controller.send_command(CMD_SHOW_MEM)
+                arrived, _ = wait_for(radio.controller.data_queue, 'memory_slots_data', 10)
+                if arrived is not None: samples.append(arrived - start)
+                time.sleep(0.2)
+            results[str(baud)] = {'median_s': round(statistics.median(samples), 4), 'max_s': round(max(samples), 4)} if samples else {'error': "no memory data received"}
+    return results
+
+
+def bench_fm_scan(config):
+    """FM scan wall time per channel through the real RadioApp scan loop."""
+    if not config['display']: return {'skipped': "no Tk display"}
+    emulator = radio_emulator.RadioEmulator(baud=CONNECT_BAUD, status_interval=0.1); port = emulator.start()
+    app = RadioApp(); app.withdraw(); app.FM_SCAN_MAX_STEPS = config['scan_steps']
+    def pump(seconds, until=None):
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline and not (until and until()): app.update(); time.sleep(0.005)
+    try:
+        app.port_var.set(port); app.baud_var.set(str(CONNECT_BAUD)); app.toggle_connection()
+        pump(5, lambda: "FM" in app.mode_var.get())
+        if "FM" not in app.mode_var.get(): return {'error': "no FM status from emulator"}
+        start = time.perf_counter(); app.start_fm_scan()
+        pump(config['scan_steps'] * 5 + 30, lambda: not app.fm_scan_active)
+        elapsed = time.perf_counter() - start
+        return {'channels': config['scan_steps'], 'elapsed_s': round(elapsed, 3), 'per_channel_s': round(elapsed / config['scan_steps'], 4)}
+    finally:
+        if app.connected: app.controller.disconnect()
+        app.destroy(); emulator.stop()
+
+
+def bench_session_replay(config):
+    """A recorded session (MiniRadio4.py --record) replayed at full speed through the unchanged read_serial."""
+    if not config['session']: return {'skipped': "no --session file given"}
+    controller = RadioController()
+    if not controller.connect_replay(config['session'], speed=0): return {'error': f"could not open {config['session']}"}
+    lines = 0; items = 0; start = time.perf_counter()
+    try:
+        while not (controller.ser.finished.is_set() and controller.data_queue.empty()):
+            try: item = controller.data_queue.get(timeout=0.2)
+            except queue.Empty: continue
+            if isinstance(item, str): lines += 1
+            else: items += 1
+        elapsed = time.perf_counter() - start; replayed = controller.ser.bytes_replayed; lines += controller.data_queue.merged
+    finally: controller.disconnect()
+    return {'lines': lines, 'special_items': items, 'bytes': replayed, 'elapsed_s': round(elapsed, 4),
+            'lines_per_s': round(lines / elapsed, 1), 'bytes_per_s': round(replayed / elapsed, 1)}
+
+
+STARTUP_SCRIPT = r"""
+import json, resource, sys, time
+launched = float(sys.argv[1]); port = sys.argv[2]; marks = {}
+import MiniRadio4
+marks['import_s'] = time.time() - launched
+MiniRadio4.messagebox.showinfo = lambda *args, **kwargs: None # "No COM ports found" would block the run
+app = MiniRadio4.RadioApp()
+def mapped(event):
+    if event.widget is app and 'first_paint_s' not in marks: marks['first_paint_s'] = time.time() - launched
+app.bind('<Map>', mapped, add='+')
+def pump(seconds, until):
+    deadline = time.time() + seconds
+    while time.time() < deadline and not until(): app.update(); time.sleep(0.002)
+pump(10, lambda: 'first_paint_s' in marks and not app.port_scan_active)
+marks['ports_listed_s'] = time.time() - launched
+app.port_var.set(port); app.toggle_connection()
+pump(10, lambda: app.controller.data_received)
+if app.controller.data_received: marks['connected_s'] = time.time() - launched
+marks['rss_kb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+if app.connected: app.controller.disconnect()
+app.destroy(); print(json.dumps(marks))
+"""
+
+
+def bench_startup(config):
+    """Fresh-process start-up: import, first paint of the main window, port list filled, and first status frame from the emulator."""
+    if not config['display']: return {'skipped': "no Tk display"}
+    runs = []
+    for _ in range(config['startup_runs']):
+        emulator = radio_emulator.RadioEmulator(baud=CONNECT_BAUD, status_interval=0.1); port = emulator.start() # Fresh radio: log off
+        try: child = subprocess.run([sys.executable, "-c", STARTUP_SCRIPT, repr(time.time()), port], capture_output=True, text=True, timeout=60,
+                                    cwd=os.path.dirname(os.path.abspath(__file__)))
+        finally: emulator.stop()
+        lines = child.stdout.strip().splitlines()
+        if child.returncode or not lines: return {'error': (child.stderr.strip().splitlines() or ["start-up run failed"])[-1]}
+        runs.append(json.loads(lines[-1]))
+    results = {'runs': len(runs)}
+    for metric in ('import_s', 'first_paint_s', 'ports_listed_s', 'connected_s', 'rss_kb'):
+        samples = [run[metric] for run in runs if metric in run]
+        if samples: results[metric] = round(statistics.median(samples), 4)
+    return results
+
+
+def bench_silent_radio(config):
+    """Special operations on a port whose radio never answers: each must give up with an error at its deadline, even
+    though no byte ever wakes the reader, and the queue behind it must drain with the status log switched back on."""
+    master, slave = os.openpty(); controller = RadioController() # Keeping master open: the pty stays up and silent
+    controller.THEME_DATA_INACTIVITY_TIMEOUT = controller.FIRST_DATA_TIMEOUT = 0.5
+    try:
+        if not controller.connect(os.ttyname(slave), CONNECT_BAUD): raise RuntimeError("Could not open the pty")
+        started = time.perf_counter(); controller.request_theme_data()
+        controller.send_command(CMD_SCREENSHOT); controller.send_command(CMD_SHOW_MEM) # Queued behind it; their commands get no answer either
+        errors = {}
+        while len(errors) < 3:
+            try: item = controller.data_queue.get(timeout=5.0)
+            except queue.Empty: break
+            if isinstance(item, tuple) and item[0] in ('theme_data_error', 'screenshot_error', 'memory_slots_error'): errors[item[0]] = time.perf_counter() - started
+        time.sleep(0.3); os.set_blocking(master, False) # Let the resuming 't' land
+        try: commands = os.read(master, 4096).decode('ascii', 'replace').split()
+        except BlockingIOError: commands = []
+        return {'theme_timeout_s': round(errors['theme_data_error'], 3) if 'theme_data_error' in errors else None,
+                'queue_drained_s': round(max(errors.values()), 3) if len(errors) == 3 else None,
+                'checks': {'theme_times_out': 'theme_data_error' in errors, 'lost_commands_time_out': len(errors) == 3,
+                           'queue_drained': controller.active_op is None and not controller.queued_ops,
+                           'log_resumed': not controller.log_pause.active and commands.count('t') == 3}} # Connect, pause, resume
+    finally: controller.disconnect(); os.close(master); os.close(slave)
+
+
+def bench_multiplexer_loopback(config):
+    """Clients sharing one emulated radio through a RadioServer on loopback, next to a client that never reads: status
+    frames each reader missed, command round trips through the arbitrated writer, and the lock turning others away."""
+    return asyncio.run(_multiplexer_loopback(config['mux_clients'], config['mux_seconds']))
+
+
+async def _multiplexer_loopback(n_clients, seconds):
+    emulator = radio_emulator.RadioEmulator(baud=0, status_interval=0.02); port = emulator.start()
+    try:
+        async with AsyncRadioController(port, CONNECT_BAUD) as radio:
+            server = RadioServer(radio); host, tcp_port = await server.start(port=0); url = f"tcp://{host}:{tcp_port}"
+            stalled = socket.socket(); stalled.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096); stalled.setblocking(False)
+            await asyncio.get_running_loop().sock_connect(stalled, (host, tcp_port)); await asyncio.sleep(0.05)
+            stalled_outbox = server.clients[1].outbox # Small buffers at both ends, so backpressure shows within seconds
+            server.clients[1].writer.get_extra_info('socket').setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 4096)
+            stalled.send(encode({'id': 1, 'op': 'subscribe', 'lines': True}) + encode({'id': 2, 'op': 'screenshot'})) # Then never reads
+            clients = [await RadioClient(url).open() for _ in range(n_clients)]
+            received = [0] * n_clients; produced = [0]
+
+            async def count(frames, index=None):
+                async for _ in frames:
+                    if index is None: produced[0] += 1
+                    else: received[index] += 1
+            await radio.next_status(); await asyncio.sleep(0.1)
+            counters = [asyncio.ensure_future(count(radio.status_frames(buffer=1000)))]
+            counters += [asyncio.ensure_future(count(client.status_frames(buffer=1000), i)) for i, client in enumerate(clients)]
+            round_trips = []; commands_before = emulator.stats['commands']
+
+            async def send_commands(client):
+                for _ in range(5):
+                    start = time.perf_counter(); await client.send(CMD_VOLUME_UP); round_trips.append(time.perf_counter() - start)
+            await asyncio.gather(*(send_commands(client) for client in clients))
+            await asyncio.sleep(0.2); commands_applied = emulator.stats['commands'] - commands_before
+            await asyncio.sleep(seconds)
+            counters[0].cancel(); await asyncio.sleep(0.2) # Frames still on their way to the clients count as delivered
+            for task in counters: task.cancel()
+            await asyncio.gather(*counters, return_exceptions=True)
+
+            await clients[0].lock()
+            try: await clients[-1].send(CMD_VOLUME_UP); lock_rejects = False
+            except RadioOperationError: lock_rejects = True
+            await clients[0].unlock()
+            for client in clients: await client.close()
+            stalled.close(); await server.close()
+    finally: emulator.stop()
+    frames_missed = max(0, produced[0] - min(received)); commands_lost = 5 * n_clients - commands_applied
+    return {'clients': n_clients, 'frames': produced[0], 'frames_missed_max': frames_missed, 'commands': 5 * n_clients, 'commands_lost': commands_lost,
+            'send_round_trip_p50_ms': round(percentile(round_trips, 50) * 1000, 3), 'send_round_trip_p99_ms': round(percentile(round_trips, 99) * 1000, 3),
+            'checks': {'no_frames_missed': frames_missed == 0, 'no_commands_lost': commands_lost == 0, 'lock_rejects_others': lock_rejects,
+                       'stalled_client_backpressured': stalled_outbox.counters['status_merged'] > 0}}
+
+
+def bench_http_telemetry(config):
+    """Browsers watching one emulated radio through a TelemetryHttpServer: event rate per viewer against the throttle,
+    delta event size against the whole status, and serial traffic caused by viewers and repeated screenshot requests."""
+    return asyncio.run(_http_telemetry(config['http_viewers'], config['mux_seconds'], config['screen']))
+
+
+async def _http_telemetry(n_viewers, seconds, screen_size):
+    emulator = radio_emulator.RadioEmulator(baud=0, status_interval=0.02, screen_size=tuple(screen_size)); port = emulator.start()
+    try:
+        async with AsyncRadioController(port, CONNECT_BAUD) as radio:
+            await radio.next_status()
+            server = TelemetryHttpServer(radio, interval=0.25); host, http_port = await server.start(port=0)
+            commands_before = emulator.stats['commands']; events = [0] * n_viewers; event_sizes = []
+
+            async def get(path, *headers):
+                reader, writer = await asyncio.open_connection(host, http_port)
+                writer.write(("\r\n".join([f"GET {path} HTTP/1.1", f"Host: {host}"] + list(headers)) + "\r\n\r\n").encode())
+                return reader, writer
+
+            async def watch(index):
+                reader, writer = await get("/events")
+                try:
+                    async for line in reader:
+                        if line.startswith(b"data: "): events[index] += 1; event_sizes.append(len(line))
+                finally: writer.close()
+
+            async def fetch_screenshot(etag=None):
+                reader, writer = await get("/screenshot.bmp", *([f"If-None-Match: {etag}"] if etag else []))
+                response = await reader.read(); writer.close()
+                head = response.split(b"\r\n\r\n", 1)[0].decode('latin-1').split("\r\n")
+                return int(head[0].split()[1]), next(line.split(": ", 1)[1] for line in head if line.lower().startswith("etag:"))
+
+            viewers = [asyncio.ensure_future(watch(i)) for i in range(n_viewers)]
+            started = time.perf_counter(); results = await asyncio.gather(*(fetch_screenshot() for _ in range(n_viewers)))
+            codes = [(await fetch_screenshot(results[0][1]))[0] for _ in range(n_viewers)]
+            await asyncio.sleep(max(0.0, seconds - (time.perf_counter() - started)))
+            for task in viewers: task.cancel()
+            await asyncio.gather(*viewers, return_exceptions=True)
+            elapsed = time.perf_counter() - started; serial_commands = emulator.stats['commands'] - commands_before
+            full_status_bytes = len(json.dumps(server.status, separators=(',', ':'))); frames = server.stats['frames']
+            await server.close()
+    finally: emulator.stop()
+    return {'viewers': n_viewers, 'frames': frames, 'viewer_update_hz': round(sum(events) / n_viewers / elapsed, 2),
+            'event_bytes_mean': round(statistics.mean(event_sizes), 1), 'full_status_bytes': full_status_bytes,
+            'serial_commands': serial_commands, 'screenshots_taken': server.stats['screenshots_taken'],
+            'checks': {'screenshots_shared': all(code == 200 for code, _ in results) and len({etag for _, etag in results}) == 1 and server.stats['screenshots_taken'] == 1,
+                       'screenshots_not_modified': all(code == 304 for code in codes)}}
+
+
+BENCHMARKS = [('read_serial_throughput', bench_read_serial_throughput), ('status_parse', bench_status_parse),
+              ('queue_to_label_latency', bench_queue_to_label_latency), ('screenshot', bench_screenshot),
+              ('memory_dump', bench_memory_dump), ('fm_scan', bench_fm_scan), ('session_replay', bench_session_replay),
+              ('startup', bench_startup), ('silent_radio', bench_silent_radio), ('multiplexer_loopback', bench_multiplexer_loopback),
+              ('http_telemetry', bench_http_telemetry)]
+
+
+# --- Results ---
+def environment():
+    try: commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError: commit = ""
+    return {'python': platform.python_version(), 'platform': platform.platform(), 'machine': platform.machine(), 'git_commit': commit}
+
+
+def flatten(results, prefix=""):
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict): flat.update(flatten(value, name + "."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool): flat[name] = value
+    return flat
+
+
+def higher_is_better(metric): return metric.endswith("_per_s")
+
+
+def compare(baseline, current, threshold_pct):
+    """Prints per-metric changes; returns the metrics that got worse by more than threshold_pct."""
+    old = flatten(baseline['results']); new = flatten(current['results']); regressions = []
+    print(f"{'metric':<52} {'baseline':>12} {'current':>12} {'change':>9}")
+    for metric in sorted(set(old) & set(new)):
+        if metric.endswith(('.lines', '.frames', '.bytes', '.channels', '.runs', '.clients', '.commands', '.viewers')): continue # Workload sizes, not measurements
+        a, b = old[metric], new[metric]
+        change = (b - a) / a * 100 if a else 0.0
+        worse = change < -threshold_pct if higher_is_better(metric) else change > threshold_pct
+        if worse: regressions.append(metric)
+        print(f"{metric:<52} {a:>12g} {b:>12g} {change:>+8.1f}%{'  REGRESSION' if worse else ''}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark MiniRadio4 hot paths against the ATS-Mini emulator.")
+    parser.add_argument("--quick", action="store_true", help="Small screenshots and fewer iterations (about a minute).")
+    parser.add_argument("--only", nargs="+", choices=[name for name, _ in BENCHMARKS], help="Run only these benchmarks.")
+    parser.add_argument("--bauds", nargs="+", type=int, default=RadioApp.BAUD_RATES, help="Baud rates for screenshot/memory benchmarks.")
+    parser.add_argument("--screen", default=None, help="Screenshot size WIDTHxHEIGHT (default 320x170, 32x16 with --quick).")
+    parser.add_argument("--session", help="Recorded session file for the session_replay benchmark.")
+    parser.add_argument("--output", default=None, help="Results file (default benchmark-results-<time>.json).")
+    parser.add_argument("--compare", help="Earlier results file to compare against.")
+    parser.add_argument("--threshold", type=float, default=10.0, help="Regression threshold in percent for --compare.")
+    args = parser.parse_args()
+
+    screen = args.screen or ("32x16" if args.quick else "320x170")
+    config = {'quick': args.quick, 'bauds': args.bauds, 'screen': [int(v) for v in screen.lower().split('x')],
+              'lines': 5000 if args.quick else 50000, 'parse_iterations': 20000 if args.quick else 200000,
+              'latency_frames': 50 if args.quick else 300, 'latency_interval': 0.037, 'memory_repeats': 2 if args.quick else 5,
+              'scan_steps': 10 if args.quick else 40, 'startup_runs': 3 if args.quick else 7,
+              'mux_clients': 4 if args.quick else 16, 'mux_seconds': 2 if args.quick else 5,
+              'http_viewers': 8 if args.quick else 64, 'session': args.session, 'display': display_available()}
+    run = {'format': RESULTS_FORMAT, 'version': 1, 'timestamp': time.strftime("%Y-%m-%dT%H:%M:%S"), 'environment': environment(),
+           'config': {k: v for k, v in config.items()}, 'results': {}}
+
+    for name, bench in BENCHMARKS:
+        if args.only and name not in args.only: continue
+        print(f"Benchmark: {name}...", flush=True)
+        start = time.perf_counter()
+        try: run['results'][name] = bench(config)
+        except Exception as e: run['results'][name] = {'error': f"{type(e).__name__}: {e}"}
+        print(f"  {json.dumps(run['results'][name])} ({time.perf_counter() - start:.1f}s)", flush=True)
+
+    output = args.output or time.strftime("benchmark-results-%Y%m%d-%H%M%S.json")
+    with open(output, 'w', encoding='utf-8') as f: json.dump(run, f, indent=2)
+    print(f"Results written to {output}")
+
+    failed = [f"{name}.{check}" for name, result in run['results'].items() for check, ok in result.get('checks', {}).items() if not ok]
+    failed += [f"{name} ({result['error']})" for name, result in run['results'].items() if 'error' in result] # Checks it never got to
+    if failed: print(f"Failed check(s): {', '.join(failed)}.")
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f: baseline = json.load(f)
+        regressions = compare(baseline, run, args.threshold)
+        if regressions: print(f"{len(regressions)} regression(s) over {args.threshold:g}%."); sys.exit(1)
+    if failed: sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+"""Headless command line for ATS-Mini radios: one-shot status, screenshot, memory and scan commands, and a daemon that
+logs telemetry and takes scheduled scans and screenshots. Imports neither tkinter nor PIL (PIL only for --output *.png).
+
+    python miniradio.py status PORT
+    python miniradio.py screenshot PORT -o screen.bmp
+    python miniradio.py memory PORT [--export profile.json]
+    python miniradio.py scan PORT [--snr 12] [-o results.txt]
+    python miniradio.py daemon PORT --telemetry DIR [--scan-every MIN] [--screenshot-every MIN] [--duration SECONDS]
+    python miniradio.py serve PORT [--listen 127.0.0.1:7373]
+    python miniradio.py http PORT [--listen 0.0.0.0:8073] [--interval 0.5] [--screenshot-max-age 60]
+
+PORT may be 'auto': every serial port is probed for the radio, starting with the last one found. It may also be
+tcp://HOST:PORT, a radio shared by 'serve' (radio_server.py), so several of these commands can use one radio at once.
+"""
+import argparse
+import asyncio
+import os
+import signal
+import sys
+import time
+
+from radio_core import MemorySlotSync, TelemetryLogger, PortProber
+from async_radio import AsyncRadioController, RadioOperationError
+from radio_server import RadioServer, RadioClient, parse_address
+from radio_http import TelemetryHttpServer, DEFAULT_PORT as HTTP_PORT
+
+DEFAULT_SNR_THRESHOLD = 12 # Same floor as the GUI's FM scan
+
+
+# --- Operations ---
+def save_screenshot(data, path):
+    """Writes the BMP as received, or converts it when the path ends in .png (the only use of PIL here)."""
+    if path.lower().endswith(".png"):
+        import io
+        from PIL import Image
+        Image.open(io.BytesIO(data)).save(path)
+    else:
+        with open(path, 'wb') as f: f.write(data)
+
+
+def format_scan_results(frames, snr_threshold, duration):
+    """The text the GUI shows (and saves) at the end of an FM scan."""
+    text = f"--- FM Scan Completed ({len(frames)} freqs in {duration:.2f}s) ---\n"
+    text += f"--- Results (SNR >= {snr_threshold}, sorted by SNR) ---\n"
+    stations = sorted((f for f in frames if f.snr >= snr_threshold), key=lambda f: f.snr, reverse=True)
+    for station in stations: text += f"  {station.frequency_text()}, SNR: {station.snr}\n"
+    if not stations: text += "  No stations found meeting the SNR threshold.\n"
+    return text + "--- End of FM Scan Results ---\n"
+
+
+async def run_scan(radio, args, path=None):
+    started = time.monotonic()
+    frames = await radio.scan(step=args.step, dwell=args.dwell)
+    text = format_scan_results(frames, args.snr, time.monotonic() - started)
+    if path:
+        with open(path, 'w', encoding='utf-8') as f: f.write(text)
+        print(f"{radio.port}: scan of {len(frames)} freqs -> {path}")
+    else: print(text, end="")
+
+
+async def run_screenshot(radio, path):
+    started = time.monotonic(); data = await radio.screenshot(); save_screenshot(data, path)
+    print(f"{radio.port}: screenshot {len(data)} bytes in {time.monotonic() - started:.2f}s -> {path}")
+
+
+# --- Commands ---
+async def cmd_status(radio, args):
+    status = await radio.next_status()
+    print(f"{status.frequency_text()}  {status.band} {status.mode}  Step: {status.step}  BW: {status.bw}  Vol: {status.vol}  "
+          f"RSSI: {status.rssi} dBuV  SNR: {status.snr} dB  Battery: {status.volt:.2f}V  Firmware: {status.app_v}")
+
+
+async def cmd_screenshot(radio, args): await run_screenshot(radio, args.output)
+
+
+async def cmd_memory(radio, args):
+    slots = await radio.memory_slots()
+    for slot in slots:
+        if slot['freq_hz'] and slot['freq_hz'] != '0': print(f"{slot['slot_num']:2d} {slot['band']} {slot['freq_hz']} {slot['mode']}")
+    if args.export: MemorySlotSync.export_profile(args.export, slots); print(f"{radio.port}: memory profile -> {args.export}")
+
+
+async def cmd_scan(radio, args): await run_scan(radio, args, args.output)
+
+
+async def cmd_daemon(radio, args):
+    stop = asyncio.Event(); loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM): loop.add_signal_handler(sig, stop.set)
+    logger = TelemetryLogger(args.telemetry) if args.telemetry else None
+    tasks = []
+
+    async def log_telemetry():
+        async for status in radio.status_frames(buffer=64): logger.append(time.monotonic(), status)
+
+    async def every(minutes, job, directory, pattern):
+        os.makedirs(directory, exist_ok=True)
+        while True:
+            try: await job(os.path.join(directory, time.strftime(pattern)))
+            except RadioOperationError as e: print(f"{radio.port}: {e}")
+            await asyncio.sleep(minutes * 60)
+
+    if logger: tasks.append(asyncio.ensure_future(log_telemetry()))
+    if args.scan_every: tasks.append(asyncio.ensure_future(every(args.scan_every, lambda path: run_scan(radio, args, path), args.scan_dir, "scan-%Y%m%d-%H%M%S.txt")))
+    if args.screenshot_every:
+        tasks.append(asyncio.ensure_future(every(args.screenshot_every, lambda path: run_screenshot(radio, path), args.screenshot_dir, "screenshot-%Y%m%d-%H%M%S.bmp")))
+    print(f"{radio.port}: daemon running" + (f" for {args.duration:.0f}s" if args.duration else "") + ".")
+    waiters = [asyncio.ensure_future(stop.wait())] + tasks # A task that ends early means the radio went away
+    try: await asyncio.wait(waiters, timeout=args.duration or None, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in waiters: task.cancel()
+        await asyncio.gather(*waiters, return_exceptions=True)
+        if logger: logger.close(); print(f"{radio.port}: {logger.frames_logged} status frames logged to {args.telemetry}")
+    if radio.error: raise radio.error
+
+
+async def cmd_serve(radio, args):
+    stop = asyncio.Event(); loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM): loop.add_signal_handler(sig, stop.set)
+    server = RadioServer(radio); host, port = await server.start(*parse_address(args.listen))
+    print(f"{radio.port}: serving on tcp://{host}:{port}")
+    waiters = [asyncio.ensure_future(stop.wait())] + server.tasks # A server task that ends means the radio went away
+    try: await asyncio.wait(waiters, return_when=asyncio.FIRST_COMPLETED)
+    finally: waiters[0].cancel(); await server.close()
+    if radio.error: raise radio.error
+
+
+async def cmd_http(radio, args):
+    stop = asyncio.Event(); loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM): loop.add_signal_handler(sig, stop.set)
+    server = TelemetryHttpServer(radio, args.interval, args.screenshot_max_age)
+    host, port = await server.start(*parse_address(args.listen, HTTP_PORT))
+    print(f"{radio.port}: dashboard on http://{host}:{port}/")
+    waiters = [asyncio.ensure_future(stop.wait())] + server.tasks # The status task ends when the radio goes away
+    try: await asyncio.wait(waiters, return_when=asyncio.FIRST_COMPLETED)
+    finally: waiters[0].cancel(); await server.close()
+    stats = server.stats
+    print(f"{radio.port}: {stats['changes']} of {stats['frames']} status frames changed, {stats['events']} updates sent ({stats['event_bytes']} bytes); "
+          f"{stats['screenshots_taken']} screenshots taken, {stats['screenshots_served']} served, {stats['screenshots_not_modified']} not modified.")
+    if radio.error: raise radio.error
+
+
+# --- Command line ---
+async def main_async(args):
+    if args.port == "auto":
+        found = await asyncio.get_running_loop().run_in_executor(None, lambda: PortProber().probe(bauds=[args.baud]))
+        if not found: print("No radio found."); return 1
+        args.port, args.baud = found
+    try:
+        radio_class = RadioClient if args.port.startswith("tcp://") else AsyncRadioController
+        async with radio_class(args.port, args.baud) as radio: await args.command(radio, args)
+    except RadioOperationError as e: print(f"{args.port}: {e}"); return 1
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless control of an ATS-Mini radio (no GUI).")
+    commands = parser.add_subparsers(required=True, metavar="COMMAND")
+
+    def command(name, handler, help_text):
+        sub = commands.add_parser(name, help=help_text); sub.set_defaults(command=handler)
+        sub.add_argument("port", help="Serial port (e.g. /dev/ttyACM0 or COM3), 'auto' to find the radio, or tcp://HOST:PORT of a shared radio.")
+        sub.add_argument("--baud", type=int, default=115200)
+        return sub
+
+    def scan_options(sub):
+        sub.add_argument("--snr", type=int, default=DEFAULT_SNR_THRESHOLD, help="Report stations at or above this SNR (dB).")
+        sub.add_argument("--step", default="100k", help="Tuning step to scan with (default: 100k).")
+        sub.add_argument("--dwell", type=float, default=0.5, metavar="SECONDS", help="Time on each frequency.")
+
+    command("status", cmd_status, "Print one status frame.")
+    command("screenshot", cmd_screenshot, "Save a screenshot.").add_argument("-o", "--output", required=True, help="BMP file (or .png, needs Pillow).")
+    command("memory", cmd_memory, "Print the memory slots.").add_argument("--export", metavar="FILE", help="Also save them as a memory profile.")
+    sub = command("scan", cmd_scan, "Scan the current band and print or save the results.")
+    sub.add_argument("-o", "--output", help="Save the results to this file."); scan_options(sub)
+    sub = command("daemon", cmd_daemon, "Log telemetry and take scheduled scans and screenshots.")
+    sub.add_argument("--telemetry", metavar="DIR", help="Log status frames to telemetry files in DIR.")
+    sub.add_argument("--scan-every", type=float, metavar="MINUTES", help="Run a scan this often.")
+    sub.add_argument("--scan-dir", default="scans", metavar="DIR")
+    sub.add_argument("--screenshot-every", type=float, metavar="MINUTES", help="Save a screenshot this often.")
+    sub.add_argument("--screenshot-dir", default="screenshots", metavar="DIR")
+    sub.add_argument("--duration", type=float, default=0, metavar="SECONDS", help="Exit after this long (default: until interrupted).")
+    scan_options(sub)
+    sub = command("serve", cmd_serve, "Share the radio with other programs over TCP on this machine.")
+    sub.add_argument("--listen", default="127.0.0.1:7373", metavar="HOST:PORT", help="Address to listen on (default: 127.0.0.1:7373).")
+    sub = command("http", cmd_http, "Serve a read-only dashboard, status JSON, status events and the screenshot over HTTP.")
+    sub.add_argument("--listen", default="127.0.0.1:8073", metavar="HOST:PORT", help="Address to listen on (default: 127.0.0.1:8073; 0.0.0.0:8073 for other machines).")
+    sub.add_argument("--interval", type=float, default=TelemetryHttpServer.DEFAULT_INTERVAL, metavar="SECONDS", help="Least time between one viewer's updates.")
+    sub.add_argument("--screenshot-max-age", type=float, default=60, metavar="SECONDS", help="Take a new screenshot at most this often.")
+    return asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,1359 @@
+"""Tk-free core of MiniRadio4: the serial protocol constants, status frame parsing, RadioController and its
+reader, the bounded data queue, session recording/replay, telemetry and console logging and the out-of-process engine.
+
+Imported by the GUI (MiniRadio4.py), the headless CLI (miniradio.py) and the tools; it never imports tkinter or PIL.
+"""
+import threading
+import queue
+import time
+import re
+import math
+import csv
+import json
+import os
+import mmap
+import struct
+import sys
+import select
+from array import array
+from collections import namedtuple, deque
+from serial import Serial, SerialException
+
+# --- Serial Command Constants ---
+CMD_VOLUME_UP = 'V'; CMD_VOLUME_DOWN = 'v'; CMD_BAND_NEXT = 'B'; CMD_BAND_PREV = 'b'
+CMD_MODE_NEXT = 'M'; CMD_MODE_PREV = 'm'; CMD_STEP_NEXT = 'S'; CMD_STEP_PREV = 's'
+CMD_BW_NEXT = 'W'; CMD_BW_PREV = 'w'; CMD_AGC_ATT_UP = 'A'; CMD_AGC_ATT_DOWN = 'a'
+CMD_BL_UP = 'L'; CMD_BL_DOWN = 'l'; CMD_CAL_UP = 'I'; CMD_CAL_DOWN = 'i'
+CMD_SLEEP_ON = 'O'; CMD_SLEEP_OFF = 'o'; CMD_TOGGLE_LOG = 't'; CMD_SCREENSHOT = 'C'
+CMD_SHOW_MEM = '$'; CMD_SET_MEM_PREFIX = '#'
+CMD_ENCODER_UP = 'R'; CMD_ENCODER_DOWN = 'r'; CMD_ENCODER_BTN = 'e'
+CMD_THEME_EDITOR_TOGGLE = 'T'; CMD_THEME_GET = '@'; CMD_THEME_SET_SUFFIX = '!'
+MODES = ["AM", "FM", "LSB", "USB", "CW"]; BANDS = ["VHF", "ALL", "LW", "MW", "SW", "160M", "80M", "60M", "40M", "30M", "20M", "17M", "15M", "12M", "10M", "6M", "CB"]
+
+
+# --- Memory Slot Sync ---
+class MemorySlotSync:
+    """Diffs a desired memory layout against the slots last read, formats '#' writes and verifies the '$' read-back."""
+    NUM_SLOTS = 32
+    PROFILE_FORMAT = "miniradio-memory-profile"
+
+    @staticmethod
+    def normalize(entry):
+        freq_str = str(entry.get('freq_hz', '') or '').strip()
+        freq_hz = int(freq_str) if freq_str.isdigit() else 0
+        if freq_hz == 0: return ('', 0, '') # Empty slot
+        return (str(entry.get('band', '')).strip(), freq_hz, str(entry.get('mode', '')).strip())
+
+    @classmethod
+    def slots_from_lines(cls, lines):
+        slots = {}
+        for line in lines:
+            match = RadioController.MEMORY_SLOT_PATTERN.match(line.strip())
+            if match:
+                slot_num_str, band_val, freq_val, mode_val = [g.strip() for g in match.groups()]
+                slot_num = int(slot_num_str)
+                if 1 <= slot_num <= cls.NUM_SLOTS: slots[slot_num] = {'slot_num': slot_num, 'band': band_val, 'freq_hz': freq_val, 'mode': mode_val}
+        return slots
+
+    @classmethod
+    def diff(cls, current_slots, desired_slots):
+        current_by_num = {e['slot_num']: e for e in current_slots}
+        return [e for e in desired_slots if cls.normalize(e) != cls.normalize(current_by_num.get(e['slot_num'], {}))]
+
+    @classmethod
+    def format_set_command(cls, entry):
+        band, freq_hz, mode = cls.normalize(entry)
+        return f"{CMD_SET_MEM_PREFIX}{entry['slot_num']:02d},{band},{freq_hz},{mode}"
+
+    @classmethod
+    def verify(cls, expected_slots, readback_slots):
+        readback_by_num = {e['slot_num']: e for e in readback_slots}
+        return [e['slot_num'] for e in expected_slots if cls.normalize(e) != cls.normalize(readback_by_num.get(e['slot_num'], {}))]
+
+    @classmethod
+    def export_profile(cls, file_path, slots):
+        rows = [{'slot': e['slot_num'], 'band': cls.normalize(e)[0], 'freq_hz': cls.normalize(e)[1], 'mode': cls.normalize(e)[2]} for e in slots]
+        if file_path.lower().endswith('.csv'):
+            with open(file_path, 'w', newline='', encoding='utf-8') as f:
+                writer = csv.DictWriter(f, fieldnames=['slot', 'band', 'freq_hz', 'mode']); writer.writeheader(); writer.writerows(rows)
+        else:
+            with open(file_path, 'w', encoding='utf-8') as f:
+                json.dump({'format': cls.PROFILE_FORMAT, 'version': 1, 'slots': rows}, f, indent=2)
+
+    @classmethod
+    def import_profile(cls, file_path):
+        # Slots missing from the profile are left untouched; slots with freq_hz 0 are cleared
+        if file_path.lower().endswith('.csv'):
+            with open(file_path, newline='', encoding='utf-8') as f: rows = list(csv.DictReader(f))
+        else:
+            with open(file_path, encoding='utf-8') as f: data = json.load(f)
+            rows = data.get('slots', []) if isinstance(data, dict) else data
+        slots = {}
+        for row in rows:
+            slot_num = int(row.get('slot', row.get('slot_num', 0)))
+            if not 1 <= slot_num <= cls.NUM_SLOTS: raise ValueError(f"Slot number out of range: {slot_num}")
+            slots[slot_num] = {'slot_num': slot_num, 'band': str(row.get('band', '') or ''), 'freq_hz': str(row.get('freq_hz', '') or '0'), 'mode': str(row.get('mode', '') or '')}
+        return [slots[n] for n in sorted(slots)]
+
+
+# --- Latency Tracing ---
+class TimedLine(str):
+    """A received text line that carries its monotonic receive and enqueue times through data_queue."""
+    received_at = None; queued_at = None
+
+
+class LatencyHistogram:
+    """Rolling log-bucket histogram over the last WINDOW durations; O(1) to record, cheap p50/p99 for the panel."""
+    WINDOW = 2000; BUCKETS_PER_DECADE = 20; MIN_SECONDS = 1e-6; NUM_BUCKETS = 8 * 20 # 1 us .. 100 s, ~12% resolution
+
+    def __init__(self, window=WINDOW):
+        self.counts = [0] * (self.NUM_BUCKETS + 1); self.recent = deque(maxlen=window)
+        self.total = 0; self.max_seconds = 0.0
+
+    def add(self, seconds):
+        bucket = 0 if seconds <= self.MIN_SECONDS else min(self.NUM_BUCKETS, int(math.log10(seconds / self.MIN_SECONDS) * self.BUCKETS_PER_DECADE) + 1)
+        if len(self.recent) == self.recent.maxlen: self.counts[self.recent[0]] -= 1
+        self.recent.append(bucket); self.counts[bucket] += 1
+        self.total += 1; self.max_seconds = max(self.max_seconds, seconds)
+
+    def percentile(self, pct):
+        n = len(self.recent)
+        if not n: return None
+        target = max(1, math.ceil(n * pct / 100.0)); seen = 0
+        for bucket, count in enumerate(self.counts):
+            seen += count
+            if seen >= target: return min(self.MIN_SECONDS * 10 ** (bucket / self.BUCKETS_PER_DECADE), self.max_seconds) # Bucket upper bound
+        return self.max_seconds
+
+
+class LatencyTracer:
+    """Per-stage histograms from serial byte to widget update, plus the radio's status-frame rate and jitter."""
+    STAGES = ['reader', 'queue_wait', 'parse', 'tk_apply', 'total', 'screenshot_transfer']
+    MAX_FRAME_GAP = 5.0 # Longer gaps are log pauses for special operations, not jitter
+
+    def __init__(self): self.reset()
+
+    def reset(self):
+        self.histograms = {}; self.frame_intervals = deque(maxlen=LatencyHistogram.WINDOW); self.last_frame_at = None
+
+    def record(self, stage, seconds):
+        histogram = self.histograms.get(stage)
+        if histogram is None: histogram = self.histograms[stage] = LatencyHistogram()
+        histogram.add(seconds)
+
+    def record_frame(self, received_at):
+        if self.last_frame_at is not None and received_at - self.last_frame_at < self.MAX_FRAME_GAP: self.frame_intervals.append(received_at - self.last_frame_at)
+        self.last_frame_at = received_at
+
+    def frame_stats(self):
+        intervals = sorted(self.frame_intervals)
+        if len(intervals) < 2: return None
+        mean = sum(intervals) / len(intervals)
+        return {'rate_hz': 1.0 / mean if mean else 0.0, 'interval_p50': intervals[len(intervals) // 2], 'interval_p99': intervals[min(len(intervals) - 1, int(len(intervals) * 0.99))],
+                'jitter': math.sqrt(sum((i - mean) ** 2 for i in intervals) / len(intervals))}
+
+    def format_report(self):
+        lines = [f"{'Stage':<20}{'Samples':>9}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}"]
+        for stage in self.STAGES + sorted(set(self.histograms) - set(self.STAGES)):
+            h = self.histograms.get(stage)
+            if h is None: continue
+            lines.append(f"{stage:<20}{h.total:>9}{h.percentile(50) * 1000:>10.3f}{h.percentile(99) * 1000:>10.3f}{h.max_seconds * 1000:>10.3f}")
+        stats = self.frame_stats()
+        if stats: lines.append(f"\nStatus frames: {stats['rate_hz']:.2f}/s, interval p50 {stats['interval_p50'] * 1000:.1f} ms, "
+                               f"p99 {stats['interval_p99'] * 1000:.1f} ms, jitter {stats['jitter'] * 1000:.1f} ms")
+        else: lines.append("\nStatus frames: not enough data")
+        return "\n".join(lines)
+
+
+# --- Data Queue ---
+class RadioDataQueue:
+    """Bounded stand-in for queue.Queue between the reader thread and the GUI, with one policy per item class.
+
+    Operation results ((type, data) tuples: screenshot, memory, theme, errors) are always delivered, in order.
+    Status frames are latest-value-wins: a frame still waiting when the next arrives is replaced and counted as merged.
+    Other console text is drop-oldest beyond CONSOLE_MAX lines. get() returns results first, then the newest status
+    frame, then console text, so a stalled GUI catches up in one tick instead of replaying every frame.
+    """
+    RESULT = 'result'; STATUS = 'status'; CONSOLE = 'console'
+    CONSOLE_MAX = 500
+
+    def __init__(self, console_max=CONSOLE_MAX):
+        self.results = deque(); self.status = None; self.console = deque(); self.console_max = console_max
+        self.cond = threading.Condition()
+        self.counters = {'results': 0, 'results_max_depth': 0, 'status': 0, 'status_merged': 0, 'console': 0, 'console_dropped': 0}
+
+    def put(self, item, kind=None):
+        if kind is None: kind = self.RESULT if isinstance(item, tuple) else self.STATUS
+        with self.cond:
+            if kind == self.RESULT:
+                self.results.append(item)
+                if len(self.results) > self.counters['results_max_depth']: self.counters['results_max_depth'] = len(self.results)
+            elif kind == self.STATUS:
+                if self.status is not None: self.counters['status_merged'] += 1
+                self.status = item
+            else:
+                if len(self.console) >= self.console_max: self.console.popleft(); self.counters['console_dropped'] += 1
+                self.console.append(item)
+            self.cond.notify()
+
+    def _pop(self):
+        if self.results: self.counters['results'] += 1; return self.results.popleft()
+        if self.status is not None: item = self.status; self.status = None; self.counters['status'] += 1; return item
+        self.counters['console'] += 1; return self.console.popleft()
+
+    def get(self, block=True, timeout=None):
+        with self.cond:
+            if not self.qsize():
+                if not block or not self.cond.wait_for(self.qsize, timeout): raise queue.Empty
+            return self._pop()
+
+    def get_nowait(self): return self.get(block=False)
+    def qsize(self): return len(self.results) + (self.status is not None) + len(self.console)
+    def empty(self): return not self.qsize()
+
+    @property
+    def merged(self): return self.counters['status_merged']
+
+    def format_counters(self):
+        c = self.counters
+        return (f"Queue: {c['status']} status frames delivered, {c['status_merged']} merged; {c['results']} results "
+                f"(max depth {c['results_max_depth']}); {c['console']} console lines, {c['console_dropped']} dropped")
+
+
+# --- Session Recording & Replay ---
+class SessionRecorder:
+    """Appends every chunk read from or written to the radio to a compact binary file.
+
+    Layout: 8-byte magic, float64 wall-clock start, then records of (uint8 direction, uint64 ns since start,
+    uint32 length) followed by the raw bytes.
+    """
+    MAGIC = b"MRSESS01"; HEADER = struct.Struct('<8sd'); RECORD = struct.Struct('<BQI')
+    READ = 0; WRITE = 1
+    FLUSH_INTERVAL = 1.0
+
+    def __init__(self, path):
+        self.path = path; self.lock = threading.Lock()
+        self.file = open(path, 'wb', buffering=1 << 16); self.file.write(self.HEADER.pack(self.MAGIC, time.time()))
+        self.started_ns = time.monotonic_ns(); self.last_flush = time.monotonic()
+
+    def record(self, direction, data):
+        with self.lock:
+            if self.file.closed: return
+            self.file.write(self.RECORD.pack(direction, time.monotonic_ns() - self.started_ns, len(data))); self.file.write(data)
+            if time.monotonic() - self.last_flush > self.FLUSH_INTERVAL: self.file.flush(); self.last_flush = time.monotonic()
+
+    def close(self):
+        with self.lock:
+            if not self.file.closed: self.file.close(); print(f"Ctrl: Session recorded to {self.path}")
+
+
+class RecordingSerial:
+    """Wraps a Serial port and records its traffic; everything else is delegated to the port."""
+
+    def __init__(self, ser, recorder): self.ser = ser; self.recorder = recorder
+
+    def readline(self):
+        data = self.ser.readline()
+        if data: self.recorder.record(SessionRecorder.READ, data)
+        return data
+
+    def write(self, data):
+        self.recorder.record(SessionRecorder.WRITE, bytes(data)) # Before the write, so it always precedes the response in the file
+        return self.ser.write(data)
+
+    def read(self, size=1):
+        data = self.ser.read(size)
+        if data: self.recorder.record(SessionRecorder.READ, data)
+        return data
+
+    def close(self): self.ser.close(); self.recorder.close()
+
+    def __getattr__(self, name): return getattr(self.ser, name)
+
+
+class SessionReplaySerial:
+    """Serial stand-in that memory-maps a recorded session and returns its reads to read_serial with the original
+    timing divided by speed (0 = as fast as possible). Recorded writes go to on_write at their point in the stream;
+    live writes are discarded."""
+
+    def __init__(self, path, speed=1.0, timeout=0.1, on_write=None):
+        self.file = open(path, 'rb')
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.recorded_at = SessionRecorder.HEADER.unpack_from(self.map, 0) if len(self.map) >= SessionRecorder.HEADER.size else (b"", 0)
+        if magic != SessionRecorder.MAGIC: self.close(); raise ValueError(f"{path} is not a MiniRadio session recording.")
+        self.offset = SessionRecorder.HEADER.size; self.speed = speed; self.timeout = timeout; self.on_write = on_write
+        self.is_open = True; self.finished = threading.Event(); self.started_at = None; self.bytes_replayed = 0
+
+    def readline(self):
+        record = SessionRecorder.RECORD; data_map = self.map
+        while self.is_open and self.offset + record.size <= len(data_map):
+            direction, t_ns, length = record.unpack_from(data_map, self.offset)
+            payload_start = self.offset + record.size
+            if self.speed:
+                if self.started_at is None: self.started_at = time.monotonic() - t_ns / 1e9 / self.speed
+                delay = self.started_at + t_ns / 1e9 / self.speed - time.monotonic()
+                if delay > self.timeout: time.sleep(self.timeout); return b"" # A quiet line times out, as the real port does
+                if delay > 0: time.sleep(delay)
+            self.offset = payload_start + length
+            if direction != SessionRecorder.READ:
+                if self.on_write: self.on_write(data_map[payload_start:self.offset])
+                continue
+            self.bytes_replayed += length
+            return data_map[payload_start:self.offset]
+        self.finished.set(); time.sleep(self.timeout)
+        return b""
+
+    def write(self, data): return len(data)
+
+    def close(self):
+        self.is_open = False; self.finished.set()
+        try: self.map.close()
+        except (BufferError, ValueError): pass
+        self.file.close()
+
+
+# --- Status Frame ---
+class RadioStatus(namedtuple('RadioStatus', 'app_v raw_f bfo cal band mode step bw agc vol rssi snr volt')):
+    """One 15-field status log frame (fields 12 and 14 are not used by the app)."""
+    __slots__ = ()
+
+    @classmethod
+    def from_fields(cls, params):
+        return cls(int(params[0]), int(params[1]), int(params[2]), int(params[3]), params[4].strip(), params[5].strip(), params[6].strip(),
+                   params[7].strip(), int(params[8]), int(params[9]), int(params[10]), int(params[11]), float(params[13]))
+
+    @property
+    def frequency_hz(self):
+        if self.mode in ['LSB','USB']: return self.raw_f * 1000 + self.bfo
+        return self.raw_f * 10000 if self.mode == 'FM' else self.raw_f * 1000
+
+    @staticmethod
+    def step_to_hz(step_str):
+        step_match = re.match(r'\s*([\d.]+)\s*([kKmM]?)', step_str or "")
+        if not step_match: return 0
+        return int(float(step_match.group(1)) * {'k': 1000, 'm': 1000000}.get(step_match.group(2).lower(), 1))
+
+    def frequency_text(self):
+        if self.mode in ['LSB','USB']: return f"Frequency: {(self.raw_f*1000+self.bfo)/1000.0:.3f} kHz"
+        if self.mode == 'FM': return f"Frequency: {self.raw_f/100.0:.2f} MHz"
+        return f"Frequency: {self.raw_f} kHz"
+
+
+# --- Telemetry Logger ---
+class TelemetryLogger:
+    """Appends parsed status frames to columnar binary files for long-run propagation and battery analysis.
+
+    File: 8-byte magic, uint32 header length, JSON header (column names and little-endian dtypes), then chunks of
+    b"CHNK", uint32 rows, uint32 table length, JSON string tables (band/mode codes), and each column's values
+    stored contiguously. Frames are buffered in typed arrays; a writer thread flushes full or stale chunks and
+    rotates files by size or age.
+    """
+    MAGIC = b"MRTELEM1"; CHUNK_MAGIC = b"CHNK"; SUFFIX = ".mrt"
+    DEFAULT_DIR = os.path.join(os.path.expanduser("~"), ".miniradio", "telemetry")
+    COLUMNS = [('time', 'd', '<f8'), ('freq_hz', 'I', '<u4'), ('bfo', 'h', '<i2'), ('cal', 'h', '<i2'), ('band', 'B', '|u1'), ('mode', 'B', '|u1'),
+               ('agc', 'B', '|u1'), ('volume', 'B', '|u1'), ('rssi', 'h', '<i2'), ('snr', 'h', '<i2'), ('voltage_mv', 'H', '<u2')]
+    CHUNK_ROWS = 4096; FLUSH_INTERVAL = 30.0
+    MAX_FILE_BYTES = 64 * 1024 * 1024; MAX_FILE_AGE = 24 * 3600.0
+
+    def __init__(self, directory=DEFAULT_DIR, max_file_bytes=MAX_FILE_BYTES, max_file_age=MAX_FILE_AGE):
+        self.directory = directory; self.max_file_bytes = max_file_bytes; self.max_file_age = max_file_age
+        self.wall_offset = time.time() - time.monotonic()
+        self._new_chunk()
+        self.file = None; self.file_opened_at = 0; self.file_bytes = 0; self.frames_logged = 0
+        self.write_queue = queue.Queue()
+        self.writer = threading.Thread(target=self._write_loop, name="telemetry-writer", daemon=True); self.writer.start()
+
+    def _new_chunk(self):
+        self.columns = [array(typecode) for _, typecode, _ in self.COLUMNS]
+        self.bands = {}; self.modes = {}; self.chunk_started_at = time.monotonic()
+
+    def append(self, received_at, status):
+        """Called once per parsed RadioStatus; a handful of array appends on the caller's thread."""
+        bands = self.bands; modes = self.modes
+        band_code = bands.get(status.band)
+        if band_code is None: band_code = bands[status.band] = min(len(bands), 255)
+        mode_code = modes.get(status.mode)
+        if mode_code is None: mode_code = modes[status.mode] = min(len(modes), 255)
+        c = self.columns
+        c[0].append((received_at if received_at is not None else time.monotonic()) + self.wall_offset)
+        c[1].append(status.frequency_hz); c[2].append(max(-32768, min(32767, status.bfo))); c[3].append(max(-32768, min(32767, status.cal)))
+        c[4].append(band_code); c[5].append(mode_code); c[6].append(max(0, min(255, status.agc))); c[7].append(max(0, min(255, status.vol)))
+        c[8].append(status.rssi); c[9].append(status.snr); c[10].append(max(0, min(65535, int(status.volt * 1000))))
+        if len(c[0]) >= self.CHUNK_ROWS or time.monotonic() - self.chunk_started_at > self.FLUSH_INTERVAL: self.flush()
+
+    def flush(self):
+        if len(self.columns[0]):
+            self.write_queue.put((self.columns, sorted(self.bands, key=self.bands.get), sorted(self.modes, key=self.modes.get)))
+            self.wall_offset = time.time() - time.monotonic() # Follows wall-clock adjustments over multi-day runs
+        self._new_chunk()
+
+    def close(self):
+        self.flush(); self.write_queue.put(None); self.writer.join(timeout=5)
+
+    def _open_file(self):
+        os.makedirs(self.directory, exist_ok=True)
+        base = os.path.join(self.directory, time.strftime("telemetry-%Y%m%d-%H%M%S")); path = base + self.SUFFIX; n = 1
+        while os.path.exists(path): path = f"{base}-{n}{self.SUFFIX}"; n += 1
+        header = json.dumps({'columns': [[name, dtype] for name, _, dtype in self.COLUMNS], 'created': time.time()}).encode()
+        self.file = open(path, 'wb'); self.file.write(self.MAGIC + struct.pack('<I', len(header)) + header)
+        self.file_opened_at = time.monotonic(); self.file_bytes = self.file.tell()
+        print(f"App: Telemetry logging to {path}")
+
+    def _write_loop(self):
+        while True:
+            item = self.write_queue.get()
+            if item is None: break
+            columns, band_names, mode_names = item
+            try:
+                if self.file and (self.file_bytes >= self.max_file_bytes or time.monotonic() - self.file_opened_at >= self.max_file_age):
+                    self.file.close(); self.file = None
+                if self.file is None: self._open_file()
+                tables = json.dumps({'band': band_names, 'mode': mode_names}).encode()
+                parts = [self.CHUNK_MAGIC, struct.pack('<II', len(columns[0]), len(tables)), tables]
+                for column in columns:
+                    if sys.byteorder == 'big' and column.itemsize > 1: column.byteswap()
+                    parts.append(column.tobytes())
+                data = b"".join(parts); self.file.write(data); self.file.flush()
+                self.file_bytes += len(data); self.frames_logged += len(columns[0])
+            except OSError as e: print(f"App: Telemetry write failed: {e}")
+        if self.file: self.file.close(); self.file = None
+
+    @classmethod
+    def iter_chunks(cls, data):
+        """Yields (tables, {column: memoryview slice}) per chunk of a telemetry file's bytes (e.g. an mmap)."""
+        if bytes(data[:8]) != cls.MAGIC: raise ValueError("Not a MiniRadio telemetry file.")
+        header_len = struct.unpack_from('<I', data, 8)[0]
+        columns = json.loads(bytes(data[12:12 + header_len]))['columns']
+        itemsizes = [int(dtype[2:]) for _, dtype in columns]
+        view = memoryview(data); offset = 12 + header_len
+        while offset + 12 <= len(data) and bytes(data[offset:offset + 4]) == cls.CHUNK_MAGIC:
+            rows, tables_len = struct.unpack_from('<II', data, offset + 4); offset += 12
+            tables = json.loads(bytes(data[offset:offset + tables_len])); offset += tables_len
+            chunk = {}
+            for (name, dtype), itemsize in zip(columns, itemsizes):
+                chunk[name] = (dtype, view[offset:offset + rows * itemsize]); offset += rows * itemsize
+            if offset > len(data): break # Truncated final chunk
+            yield tables, rows, chunk
+
+
+# --- Console Log ---
+class ConsoleLog:
+    """Append-only session log of console lines, searched through mmap without loading it. The reader writes every line
+    it queues, status frames the data queue merges included, so the log is complete however long the GUI stalls; the
+    GUI appends its own messages to the same file. Each add is one unbuffered append, so writers interleave whole lines."""
+    DEFAULT_DIR = os.path.join(os.path.expanduser("~"), ".miniradio", "console")
+    KEEP_SESSIONS = 10
+
+    def __init__(self, path):
+        self.path = path; self.lock = threading.Lock(); self.file = None
+
+    @classmethod
+    def new_session_path(cls, directory=DEFAULT_DIR):
+        """Path for a new session's log in directory; removes old logs beyond the KEEP_SESSIONS newest."""
+        try: old_logs = sorted(name for name in os.listdir(directory) if name.startswith("console-") and name.endswith(".log"))
+        except OSError: old_logs = []
+        for name in old_logs[:max(0, len(old_logs) - cls.KEEP_SESSIONS + 1)]:
+            try: os.remove(os.path.join(directory, name))
+            except OSError: pass
+        return os.path.join(directory, time.strftime("console-%Y%m%d-%H%M%S.log"))
+
+    def add(self, text):
+        data = (text if text.endswith('\n') else text + '\n').encode('utf-8', 'replace')
+        with self.lock:
+            if self.file is False: return
+            try:
+                if self.file is None:
+                    os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True); self.file = open(self.path, 'ab', buffering=0)
+                self.file.write(data)
+            except OSError as e: print(f"App: Console log disabled: {e}"); self.file = False
+
+    def close(self):
+        with self.lock:
+            if self.file: self.file.close()
+            self.file = None
+
+    @staticmethod
+    def search(path, text, limit):
+        """Returns (matching line count, the newest `limit` matching lines) of the log at path. Safe from any thread."""
+        try: size = os.path.getsize(path)
+        except OSError: return 0, []
+        if not text or not size: return 0, []
+        pattern = re.compile(re.escape(text.encode('utf-8')), re.IGNORECASE)
+        matches = deque(maxlen=limit); total = 0; line_end = -1
+        with open(path, 'rb') as f, mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ) as data:
+            for m in pattern.finditer(data):
+                if m.start() <= line_end: continue # Another match on a line already counted
+                line_start = data.rfind(b'\n', 0, m.start()) + 1; line_end = data.find(b'\n', m.end())
+                if line_end < 0: line_end = size
+                total += 1; matches.append(data[line_start:line_end].decode('utf-8', 'replace'))
+        return total, list(matches)
+
+
+# --- Status Log Pause ---
+class LogPause:
+    """The radio's status log state as seen on the wire, for pausing it around special operations. The log counts as on
+    while status frames arrive (or just after it was switched on, before the first frame is due). It is paused with 't'
+    only when on, and resumed only if frames really stopped, so a toggle the radio missed is not undone by a second one."""
+    FRAME_GAP = 1.5 # Three status intervals without a frame: the log is off
+    SETTLE = 0.3 # Frames already on the wire when the pausing 't' was sent
+
+    def __init__(self): self.paused_at = None; self.turned_on_at = None
+
+    @property
+    def active(self): return self.paused_at is not None
+
+    def commanded(self, on): self.turned_on_at = time.monotonic() if on else None
+
+    def log_is_on(self, last_frame_at):
+        now = time.monotonic()
+        return any(t is not None and now - t < self.FRAME_GAP for t in (last_frame_at, self.turned_on_at))
+
+    def pause(self, last_frame_at):
+        """True when 't' should be sent to pause the log (it is on and not already paused)."""
+        if self.active or not self.log_is_on(last_frame_at): return False
+        self.paused_at = time.monotonic(); return True
+
+    def resume(self, last_frame_at):
+        """True when 't' should be sent to resume the log: it was paused here and no frame has come since."""
+        paused_at = self.paused_at; self.paused_at = None
+        if paused_at is None or (last_frame_at is not None and last_frame_at > paused_at + self.SETTLE): return False
+        self.commanded(True); return True
+
+
+class RadioController:
+    SCREENSHOT_DATA_INACTIVITY_TIMEOUT = 10.0 
+    MEMORY_DATA_INACTIVITY_TIMEOUT = 1.2 
+    THEME_DATA_INACTIVITY_TIMEOUT = 3.0 
+    MEMORY_SLOT_PATTERN = re.compile(r"^#?\s*(\d{1,2})\s*,\s*([^,]*?)\s*,\s*(\d+)\s*,\s*([^,]*?)\s*$")
+    DATA_LOG_PATTERN = re.compile(r"^\s*\d+\s*(?:,\s*[^,]*\s*){14}$")
+    THEME_STRING_LINE_PATTERN = re.compile(r"^Color theme [^:]*:\s*((?:x[0-9a-fA-F]{4})+)$")
+    RECONNECT_FIRST_DELAY = 0.5; RECONNECT_MAX_DELAY = 30.0 # Doubling backoff between reopen attempts
+    RESYNC_TIMEOUT = 2.0 # Wait for a status frame after reopening before deciding the log state
+    FIRST_DATA_TIMEOUT = 10.0 # A special operation that gets no response at all gives up after this
+
+
+    def __init__(self):
+        self.ser = None; self.running = False; self.reader_thread = None; self.wakeup_pipe = None
+        self.data_queue = RadioDataQueue(); self.data_received = False
+        self.telemetry_dir = None; self.console_log_path = None # When set, the reader logs every frame / line it queues, merged ones included
+        self.telemetry = None; self.console_log = None
+        self.sleep_mode = False
+        self.expecting_screenshot_data = False; self.screenshot_hex_buffer = ""; self.last_screenshot_hex_byte_time = 0 
+        self.screenshot_request_time = 0 
+        self.expecting_memory_slots = False; self.memory_slots_buffer = []; self.last_memory_slot_time = 0
+        self.line_assembly_buffer_bytes = b"" 
+        self.pending_memory_write = None
+        self.latency = LatencyTracer()
+        self.record_dir = None # When set, each connection is recorded to a session file in this directory
+        self.port = None; self.baudrate = None; self.usb_serial_number = None
+        self.reconnect_thread = None; self.reconnect_cancel = None
+        self.op_lock = threading.Lock(); self.op_queue = deque(); self.active_op = None; self.queued_ops = (); self.log_pause = LogPause()
+        self.connection_stats = {'outages': 0, 'recovered': 0, 'attempts': 0, 'downtime_s': 0.0, 'last_recovery_s': None, 'max_recovery_s': 0.0}
+
+        self.expecting_theme_string = False
+        self.theme_string_buffer = ""
+        self.last_theme_data_time = 0
+        self.theme_get_sequence_active = False
+        self.pending_theme_set_str = None
+
+
+    def report(self, level, title, message):
+        """Connection problems ('error' or 'warning'); the GUI replaces this with a message box, the engine process forwards them."""
+        print(f"Ctrl: {title}: {message}")
+
+    def _open_port(self, port, baudrate):
+        ser = Serial(port, int(baudrate), timeout=0.1) 
+        if self.record_dir:
+            os.makedirs(self.record_dir, exist_ok=True)
+            ser = RecordingSerial(ser, SessionRecorder(os.path.join(self.record_dir, time.strftime("session-%Y%m%d-%H%M%S.mrs"))))
+        return ser
+
+    def _open_logs(self):
+        if self.telemetry_dir and not self.telemetry: self.telemetry = TelemetryLogger(self.telemetry_dir)
+        if self.console_log_path and not self.console_log: self.console_log = ConsoleLog(self.console_log_path)
+
+    def close_logs(self):
+        """Writes out and closes the telemetry and console logs; call after disconnect()."""
+        if self.telemetry: self.telemetry.close(); self.telemetry = None
+        if self.console_log: self.console_log.close(); self.console_log = None
+
+    def connect(self, port, baudrate=115200, usb_serial_number=None):
+        """usb_serial_number, from the caller's port list, lets a reconnect find the radio under a new device name."""
+        try:
+            self.ser = self._open_port(port, baudrate)
+            self.port = port; self.baudrate = int(baudrate); self.usb_serial_number = usb_serial_number
+            self._start_session()
+            return True
+        except ValueError: self.report('error', "Baud Rate Error", f"Invalid baud rate: {baudrate}."); return False
+        except SerialException as e: self.report('error', "Connection Error", f"Failed to connect to {port} at {baudrate} baud: {str(e)}"); return False
+        except Exception as e: self.report('error', "Error", f"An unexpected error during connection: {str(e)}"); return False
+
+    def connect_replay(self, session_path, speed=1.0):
+        """Feeds a recorded session through read_serial in place of a port (speed 1, 10, ... or 0 for as fast as possible)."""
+        try:
+            self.ser = SessionReplaySerial(session_path, speed, on_write=self._apply_replayed_write)
+            self._start_session()
+            return True
+        except (OSError, ValueError) as e: self.report('error', "Replay Error", f"Failed to open session {session_path}: {e}"); return False
+
+    def _apply_replayed_write(self, data):
+        """Sets up the reader state a recorded command created, so the replayed response is parsed as it was live."""
+        for cmd in data.decode('ascii', 'replace').split('\n'):
+            cmd = cmd.strip(); now = time.time()
+            if cmd == CMD_SCREENSHOT:
+                self.expecting_screenshot_data = True; self.screenshot_hex_buffer = ""; self.last_screenshot_hex_byte_time = now; self.screenshot_request_time = now
+            elif cmd == CMD_SHOW_MEM:
+                self.expecting_memory_slots = True; self.memory_slots_buffer = []; self.last_memory_slot_time = now
+            elif cmd.startswith(CMD_SET_MEM_PREFIX):
+                self.pending_memory_write = (self.pending_memory_write or []) + list(MemorySlotSync.slots_from_lines([cmd]).values())
+            elif cmd.startswith(CMD_THEME_SET_SUFFIX): self.pending_theme_set_str = cmd[len(CMD_THEME_SET_SUFFIX):]
+            elif cmd == CMD_THEME_GET:
+                self.expecting_theme_string = True; self.theme_string_buffer = ""; self.last_theme_data_time = now; self.theme_get_sequence_active = True
+
+    def _start_session(self, toggle_log=True):
+        self._open_logs()
+        self.running = True; self.data_received = False
+        self.expecting_screenshot_data = False; self.screenshot_hex_buffer = ""; self.last_screenshot_hex_byte_time = 0
+        self.screenshot_request_time = 0
+        self.expecting_memory_slots = False; self.memory_slots_buffer = []; self.last_memory_slot_time = 0
+        self.line_assembly_buffer_bytes = b""; self.pending_memory_write = None
+        self.latency.last_frame_at = None; self._clear_ops()
+        
+        self.expecting_theme_string = False; self.theme_string_buffer = ""; 
+        self.last_theme_data_time = 0; self.theme_get_sequence_active = False; self.pending_theme_set_str = None
+
+        self.reader_thread = threading.Thread(target=self.read_serial, args=(self._make_reader_poller(),), name="serial-reader", daemon=True)
+        self.reader_thread.start()
+        if toggle_log: self.send_command(CMD_TOGGLE_LOG, is_user_toggle=True) 
+
+    def _make_reader_poller(self):
+        """A poll object over the port's fd and a shutdown pipe, or None where the port can't be polled (Windows, replay)."""
+        self._close_wakeup_pipe()
+        if not hasattr(select, 'poll'): return None
+        try: port_fd = self.ser.fileno()
+        except (AttributeError, OSError, ValueError): return None
+        self.wakeup_pipe = os.pipe(); os.set_blocking(self.wakeup_pipe[1], False); poller = select.poll()
+        poller.register(port_fd, select.POLLIN | select.POLLPRI); poller.register(self.wakeup_pipe[0], select.POLLIN)
+        return poller
+
+    def _wake_reader(self):
+        """Makes a reader blocked in poll() look again: at running after a disconnect, at the deadline of a new operation."""
+        pipe = self.wakeup_pipe
+        if pipe:
+            try: os.write(pipe[1], b"x")
+            except OSError: pass # Pipe full (a wakeup is already pending) or closed by a disconnect
+
+    def _close_wakeup_pipe(self):
+        if self.wakeup_pipe:
+            for fd in self.wakeup_pipe: os.close(fd)
+            self.wakeup_pipe = None
+
+    def disconnect(self):
+        if self.reconnect_thread and self.reconnect_thread is not threading.current_thread(): self.stop_reconnect()
+        self.running = False; self._wake_reader()
+        if self.reader_thread and self.reader_thread is not threading.current_thread(): self.reader_thread.join(timeout=1.0)
+        self.reader_thread = None; self._close_wakeup_pipe()
+        if self.ser and self.ser.is_open: self.ser.close(); print("Serial port closed by disconnect().")
+        self.data_received = False; self.expecting_screenshot_data = False; self.expecting_memory_slots = False
+        self.screenshot_hex_buffer = ""; self.memory_slots_buffer = []
+        self.last_screenshot_hex_byte_time = 0; self.last_memory_slot_time = 0
+        self.line_assembly_buffer_bytes = b""; self.pending_memory_write = None; self._clear_ops()
+        
+        self.expecting_theme_string = False; self.theme_string_buffer = ""; 
+        self.last_theme_data_time = 0; self.theme_get_sequence_active = False; self.pending_theme_set_str = None
+
+    # --- Reconnect ---
+    @staticmethod
+    def _usb_serial_number(port):
+        import serial.tools.list_ports
+        try: return next((p.serial_number for p in serial.tools.list_ports.comports() if p.device == port), None)
+        except Exception: return None
+
+    def _find_port(self):
+        """The port's current device path: a USB radio can come back under another name (ttyACM0 -> ttyACM1, COM3 -> COM5)."""
+        if self.usb_serial_number:
+            import serial.tools.list_ports
+            try:
+                for p in serial.tools.list_ports.comports():
+                    if p.serial_number == self.usb_serial_number: return p.device
+            except Exception: pass
+        return self.port
+
+    def start_reconnect(self):
+        """After a serial error: closes the port and reopens it in the background with doubling backoff until status frames
+        flow again, with the log put back as it was. Posts ('reconnected', info) to the data queue; stop_reconnect() cancels."""
+        if self.port is None: return False
+        if self.reconnect_thread and self.reconnect_thread.is_alive(): return True
+        want_log = self.log_pause.active or self.log_pause.log_is_on(self.latency.last_frame_at) # Paused for an operation counts as on
+        self.disconnect()
+        self.connection_stats['outages'] += 1
+        self.reconnect_cancel = threading.Event()
+        self.reconnect_thread = threading.Thread(target=self._reconnect_loop, args=(self.reconnect_cancel, want_log, time.monotonic()), name="serial-reconnect", daemon=True)
+        self.reconnect_thread.start()
+        return True
+
+    def stop_reconnect(self):
+        thread = self.reconnect_thread
+        if self.reconnect_cancel: self.reconnect_cancel.set()
+        if thread and thread is not threading.current_thread(): thread.join(timeout=2 * self.RESYNC_TIMEOUT + 1)
+        self.reconnect_thread = None
+
+    def _reconnect_loop(self, cancel, want_log, outage_started):
+        delay = self.RECONNECT_FIRST_DELAY; stats = self.connection_stats
+        if self.usb_serial_number is None: self.usb_serial_number = self._usb_serial_number(self.port) # Off the Tk thread; still listed after a glitch
+        while not cancel.wait(delay):
+            stats['attempts'] += 1; port = self._find_port(); delay = min(delay * 2, self.RECONNECT_MAX_DELAY)
+            try: ser = self._open_port(port, self.baudrate)
+            except (SerialException, OSError, ValueError) as e: print(f"Ctrl: Reconnect to {port} failed ({e}); next try in {delay:.1f}s."); continue
+            self.ser = ser; reopened_at = time.monotonic()
+            self._start_session(toggle_log=False)
+            if self._resync_log(want_log, reopened_at, cancel):
+                recovery = time.monotonic() - outage_started
+                stats['recovered'] += 1; stats['downtime_s'] += recovery; stats['last_recovery_s'] = recovery
+                stats['max_recovery_s'] = max(stats['max_recovery_s'], recovery)
+                if port != self.port: print(f"Ctrl: Radio reappeared as {port} (was {self.port}).")
+                self.port = port; print(f"Ctrl: Reconnected to {port} after {recovery:.2f}s (attempt {stats['attempts']} in total).")
+                self.data_queue.put(('reconnected', {'port': port, 'recovery_s': recovery, 'stats': dict(stats)}))
+                return
+            self._stop_session()
+            print(f"Ctrl: {port} opened but the radio did not answer; next try in {delay:.1f}s.")
+        stats['downtime_s'] += time.monotonic() - outage_started
+
+    def _stop_session(self):
+        """Stops the reader and closes the port, leaving the rest of the state to whoever called."""
+        self.running = False; self._wake_reader()
+        if self.reader_thread and self.reader_thread is not threading.current_thread(): self.reader_thread.join(timeout=1.0)
+        self.reader_thread = None; self._close_wakeup_pipe()
+        try:
+            if self.ser and self.ser.is_open: self.ser.close()
+        except (SerialException, OSError): pass
+
+    def _resync_log(self, want_log, reopened_at, cancel):
+        """Puts the status log back to want_log. A radio that reset comes back with the log off, one that only lost the USB
+        link still has it on; frames arriving (or not) tells which. False when the radio never answers."""
+        def frame_since(t, timeout):
+            deadline = time.monotonic() + timeout
+            while time.monotonic() < deadline and self.running and not cancel.is_set():
+                if (self.latency.last_frame_at or 0) > t: return True
+                time.sleep(0.05)
+            return False
+        log_on = frame_since(reopened_at, self.RESYNC_TIMEOUT)
+        if not self.running or cancel.is_set(): return False
+        if log_on != want_log:
+            toggled_at = time.monotonic(); self.send_command(CMD_TOGGLE_LOG); self.log_pause.commanded(want_log)
+            if want_log and not frame_since(toggled_at, self.RESYNC_TIMEOUT): return False
+        return self.running and not cancel.is_set()
+
+    @staticmethod
+    def format_connection_stats(stats):
+        last = f"{stats['last_recovery_s']:.2f}s" if stats['last_recovery_s'] is not None else "-"
+        return (f"Connection: {stats['outages']} outages, {stats['recovered']} recovered ({stats['attempts']} reopen attempts), "
+                f"last recovery {last}, longest {stats['max_recovery_s']:.2f}s, {stats['downtime_s']:.1f}s down in total")
+
+    def _send_raw_command(self, cmd_char):
+        if self.ser and self.ser.is_open:
+            try:
+                self.ser.write(cmd_char.encode() + b'\n')
+            except Exception as e:
+                print(f"Controller: Error sending raw command '{cmd_char}': {e}")
+
+    def send_command(self, cmd, is_user_toggle=False):
+        if not (self.ser and self.ser.is_open):
+            if cmd in [CMD_SCREENSHOT, CMD_SHOW_MEM]: 
+                self.report('warning', "Not Connected", "Connect to radio first.")
+            return
+        try:
+            if cmd == CMD_SCREENSHOT: self._schedule_op("Screenshot", self._start_screenshot, dedupe=True); return
+            if cmd == CMD_SHOW_MEM: self._schedule_op("Memory", self._start_memory_read, dedupe=True); return
+            self.ser.write(cmd.encode() + b'\n') 
+
+            if cmd == CMD_TOGGLE_LOG and is_user_toggle: 
+                log_on = not self.log_pause.log_is_on(self.latency.last_frame_at); self.log_pause.commanded(log_on)
+                print(f"Ctrl: Log toggled by user. Assumed radio log state: {'ON' if log_on else 'OFF'}")
+
+        except Exception as e: 
+            print(f"Ctrl: Error sending '{cmd}': {e}"); self.data_queue.put(('serial_error_disconnect', f"Send error: {e}"))
+
+    def write_memory_slots(self, slot_entries):
+        if not (self.ser and self.ser.is_open):
+            self.data_queue.put(('memory_sync_error', "Not connected to radio."))
+            return
+        self._schedule_op("Memory", lambda: self._start_memory_write(list(slot_entries)))
+
+    def request_theme_data(self, set_theme_str=None):
+        if not (self.ser and self.ser.is_open):
+            self.data_queue.put(('theme_set_error' if set_theme_str else 'theme_data_error', "Not connected to radio."))
+            return
+        self._schedule_op("ThemeGet", lambda: self._start_theme_request(set_theme_str), dedupe=set_theme_str is None)
+
+    def request_theme_set(self, theme_x_hex_str): self.request_theme_data(set_theme_str=theme_x_hex_str)
+
+    # --- Special Operation Scheduler ---
+    def _schedule_op(self, kind, start, dedupe=False):
+        """Queues a special operation (screenshot, memory, theme). Operations queued while one is running follow it back
+        to back under the same log pause, so the log is toggled once per batch instead of twice per operation."""
+        with self.op_lock:
+            key = (kind, dedupe) # Plain reads (screenshot, memory dump, theme fetch) are not queued twice
+            if dedupe and (self.active_op == key or any(queued == key for queued, _ in self.op_queue)): print(f"Ctrl: {kind} already pending."); return
+            self.op_queue.append((key, start)); self.queued_ops = tuple(k for (k, _), _ in self.op_queue)
+            if self.active_op is None: self._run_queued_ops()
+
+    def _op_finished(self):
+        with self.op_lock:
+            self.active_op = None
+            if self.running: self._run_queued_ops()
+
+    def _run_queued_ops(self):
+        """Starts the next queued operation (pausing the log first if needed); resumes the log once the queue is empty.
+        Called with op_lock held."""
+        while self.op_queue:
+            self.active_op, start = self.op_queue.popleft(); self.queued_ops = tuple(k for (k, _), _ in self.op_queue)
+            if self.log_pause.pause(self.latency.last_frame_at): self._send_raw_command(CMD_TOGGLE_LOG); time.sleep(0.05)
+            try:
+                start()
+                if self.expecting_screenshot_data or self.expecting_memory_slots or self.expecting_theme_string: self._wake_reader(); return # New deadline
+            except Exception as e:
+                print(f"Ctrl: Error starting {self.active_op[0]}: {e}"); self.data_queue.put(('serial_error_disconnect', f"Send error: {e}"))
+                self.pending_memory_write = None; self.expecting_screenshot_data = self.expecting_memory_slots = self.expecting_theme_string = False
+                self.op_queue.clear(); self.queued_ops = ()
+            self.active_op = None
+        if self.log_pause.resume(self.latency.last_frame_at): time.sleep(0.1); self._send_raw_command(CMD_TOGGLE_LOG)
+
+    def _clear_ops(self):
+        with self.op_lock: self.op_queue.clear(); self.queued_ops = (); self.active_op = None; self.log_pause = LogPause()
+
+    def _start_screenshot(self):
+        self.expecting_screenshot_data = True 
+        self.screenshot_hex_buffer = ""; self.last_screenshot_hex_byte_time = time.time() 
+        self.screenshot_request_time = time.time() 
+        self.ser.write(CMD_SCREENSHOT.encode() + b'\n')
+
+    def _start_memory_read(self):
+        self.expecting_memory_slots = True
+        self.memory_slots_buffer = []; self.last_memory_slot_time = time.time()
+        self.ser.write(CMD_SHOW_MEM.encode() + b'\n')
+
+    def _start_memory_write(self, slot_entries):
+        self.pending_memory_write = slot_entries
+        burst = ''.join(MemorySlotSync.format_set_command(e) + '\n' for e in self.pending_memory_write)
+        self.ser.write(burst.encode()) # All changed slots in one write
+        time.sleep(0.1)
+        self._start_memory_read() # Read back with '$' for verification
+
+    def _start_theme_request(self, set_theme_str):
+        self._send_raw_command(CMD_THEME_EDITOR_TOGGLE) 
+        time.sleep(0.05) 
+
+        self.expecting_theme_string = True
+        self.theme_string_buffer = ""
+        self.last_theme_data_time = time.time()
+        self.theme_get_sequence_active = True 
+
+        if set_theme_str: # Write once, then read back with '@' for verification
+            self.pending_theme_set_str = set_theme_str
+            self._send_raw_command(CMD_THEME_SET_SUFFIX + set_theme_str)
+            time.sleep(0.1)
+
+        self._send_raw_command(CMD_THEME_GET) 
+
+
+    def _queue_line(self, line_str, received_at, is_status_frame=True):
+        line = TimedLine(line_str); line.received_at = received_at; line.queued_at = time.monotonic()
+        self.latency.record('reader', line.queued_at - received_at)
+        if is_status_frame: self.latency.record_frame(received_at)
+        if self.console_log: self.console_log.add(line_str) # Before the merge below, on this thread, so a stalled GUI loses nothing
+        if is_status_frame and self.telemetry:
+            try: self.telemetry.append(received_at, RadioStatus.from_fields(line_str.split(',')))
+            except (ValueError, IndexError): pass # Reported when the GUI parses it
+        self.data_queue.put(line, RadioDataQueue.STATUS if is_status_frame else RadioDataQueue.CONSOLE)
+
+    def _screenshot_hex_length(self):
+        """Hex digits in the whole BMP, from the file size in its header (bytes 2-5), or None before the header is in."""
+        if len(self.screenshot_hex_buffer) < 12: return None
+        try: return int.from_bytes(bytes.fromhex(self.screenshot_hex_buffer[:12])[2:6], 'little') * 2 or None
+        except ValueError: return None
+
+    def _is_hex_string(self, s): return bool(s) and all(c in "0123456789abcdefABCDEF" for c in s)
+    def _is_memory_slot_line(self, line): return bool(self.MEMORY_SLOT_PATTERN.match(line.strip()))
+
+    def _finalize_special_op(self, operation_type):
+        if operation_type == "Screenshot":
+            self.expecting_screenshot_data = False; self.last_screenshot_hex_byte_time = 0
+            if self.screenshot_hex_buffer: 
+                transfer_duration = time.time() - self.screenshot_request_time
+                self.data_queue.put(('screenshot_data', (self.screenshot_hex_buffer, transfer_duration) ))
+            else: 
+                self.data_queue.put(('screenshot_error', "No screenshot data received."))
+            self.screenshot_hex_buffer = ""
+        elif operation_type == "Memory":
+            self.expecting_memory_slots = False; self.last_memory_slot_time = 0
+            if self.pending_memory_write is not None:
+                written_slots = self.pending_memory_write; self.pending_memory_write = None
+                if self.memory_slots_buffer: self.data_queue.put(('memory_sync_result', (written_slots, list(self.memory_slots_buffer))))
+                else: self.data_queue.put(('memory_sync_error', "No memory slot read-back received after writing."))
+            elif self.memory_slots_buffer:  
+                self.data_queue.put(('memory_slots_data', list(self.memory_slots_buffer)))
+            else: 
+                 self.data_queue.put(('memory_slots_error', "No memory slot data received."))
+            self.memory_slots_buffer = []
+        elif operation_type == "ThemeGet":
+            self.expecting_theme_string = False
+            self.last_theme_data_time = 0
+            
+            self._send_raw_command(CMD_THEME_EDITOR_TOGGLE) 
+            time.sleep(0.05) 
+            self.theme_get_sequence_active = False
+
+            if self.pending_theme_set_str is not None:
+                expected_theme_str = self.pending_theme_set_str; self.pending_theme_set_str = None
+                if self.theme_string_buffer:
+                    self.data_queue.put(('theme_set_result', (expected_theme_str, self.theme_string_buffer)))
+                else:
+                    self.data_queue.put(('theme_set_error', "No theme read-back received after setting theme."))
+            elif self.theme_string_buffer:
+                self.data_queue.put(('theme_data', self.theme_string_buffer))
+            else:
+                self.data_queue.put(('theme_data_error', "No theme string received or timeout." ))
+            self.theme_string_buffer = ""
+        self._op_finished()
+        
+
+    def _special_op_deadline(self):
+        """(operation, wall-clock time its inactivity timeout expires) for the operation in progress, or None."""
+        if self.expecting_screenshot_data:
+            if self.screenshot_hex_buffer and self.last_screenshot_hex_byte_time > 0: return "Screenshot", self.last_screenshot_hex_byte_time + self.SCREENSHOT_DATA_INACTIVITY_TIMEOUT
+            if self.screenshot_request_time > 0: return "Screenshot", self.screenshot_request_time + self.FIRST_DATA_TIMEOUT # Command lost: don't hold up queued operations
+        elif self.expecting_memory_slots:
+            if self.memory_slots_buffer and self.last_memory_slot_time > 0: return "Memory", self.last_memory_slot_time + self.MEMORY_DATA_INACTIVITY_TIMEOUT
+            if self.last_memory_slot_time > 0: return "Memory", self.last_memory_slot_time + self.FIRST_DATA_TIMEOUT
+        elif self.expecting_theme_string and self.last_theme_data_time > 0: return "ThemeGet", self.last_theme_data_time + self.THEME_DATA_INACTIVITY_TIMEOUT
+        return None
+
+    def _wait_and_read(self, poller):
+        """Blocks until port data, the pending operation's deadline or a disconnect; returns whatever bytes are waiting."""
+        pending = None if self.line_assembly_buffer_bytes else self._special_op_deadline()
+        timeout_ms = None if pending is None else max(0, (pending[1] - time.time()) * 1000) + 10
+        events = poller.poll(timeout_ms); wakeup_fd = self.wakeup_pipe[0]
+        if not events: return b""
+        if any(fd == wakeup_fd for fd, _ in events): os.read(wakeup_fd, 512); return b"" # Drained, so the next poll blocks again
+        return self.ser.read(self.ser.in_waiting or 1)
+
+    def read_serial(self, poller=None):
+        received_at = time.monotonic()
+        while self.running and self.ser and self.ser.is_open:
+            try:
+                new_bytes = self._wait_and_read(poller) if poller else self.ser.readline() 
+                if new_bytes:
+                    received_at = time.monotonic() # Both return as soon as the bytes arrive
+                    self.line_assembly_buffer_bytes += new_bytes
+                elif not self.line_assembly_buffer_bytes: 
+                    pending = self._special_op_deadline()
+                    if pending and time.time() > pending[1]: self._finalize_special_op(pending[0])
+                    if not poller: time.sleep(0.01)
+                    continue
+
+                while b'\n' in self.line_assembly_buffer_bytes:
+                    complete_line_bytes, self.line_assembly_buffer_bytes = self.line_assembly_buffer_bytes.split(b'\n', 1)
+                    line_str = ""
+                    try:
+                        line_str = complete_line_bytes.decode('ascii').strip()
+                    except UnicodeDecodeError:
+                        op_type_on_error = None
+                        if self.expecting_screenshot_data: op_type_on_error = "Screenshot"
+                        elif self.expecting_memory_slots: op_type_on_error = "Memory"
+                        elif self.expecting_theme_string: op_type_on_error = "ThemeGet"
+                        
+                        if op_type_on_error:
+                            print(f"Ctrl: UnicodeError during {op_type_on_error}.")
+                            err_key = 'screenshot_error' if op_type_on_error == "Screenshot" else \
+                                      'memory_slots_error' if op_type_on_error == "Memory" else 'theme_data_error'
+                            current_buffer = self.screenshot_hex_buffer if op_type_on_error == "Screenshot" else \
+                                             self.memory_slots_buffer if op_type_on_error == "Memory" else \
+                                             self.theme_string_buffer
+                            msg = f"UnicodeDecodeError at start of {op_type_on_error} data."
+                            if current_buffer: msg = f"Unicode corruption after receiving some data for {op_type_on_error}."
+                            self.data_queue.put((err_key, msg))
+
+                            if op_type_on_error == "Screenshot": self.screenshot_hex_buffer = ""
+                            elif op_type_on_error == "Memory": self.memory_slots_buffer = []
+                            elif op_type_on_error == "ThemeGet": self.theme_string_buffer = "" 
+                            self._finalize_special_op(op_type_on_error) 
+                        else: 
+                            try: line_str = complete_line_bytes.decode('utf-8').strip()
+                            except UnicodeDecodeError: print(f"Ctrl: Persistent UnicodeDecodeError: {complete_line_bytes[:60]}..."); line_str = None
+                        
+                        if line_str and not (self.expecting_screenshot_data or self.expecting_memory_slots or self.expecting_theme_string): 
+                            self._queue_line(line_str, received_at, is_status_frame=False)
+                        continue 
+
+                    if not line_str: 
+                        if self.expecting_screenshot_data and self.screenshot_hex_buffer: self.last_screenshot_hex_byte_time = time.time() 
+                        elif self.expecting_memory_slots and self.memory_slots_buffer: self.last_memory_slot_time = time.time()
+                        elif self.expecting_theme_string: self.last_theme_data_time = time.time() 
+                        continue
+
+                    if self.expecting_screenshot_data:
+                        is_hex = self._is_hex_string(line_str)
+                        if is_hex: 
+                            self.screenshot_hex_buffer += line_str
+                            expected_len = self._screenshot_hex_length()
+                            if expected_len and len(self.screenshot_hex_buffer) >= expected_len: # Whole BMP in: no need to wait out the timeout
+                                self.screenshot_hex_buffer = self.screenshot_hex_buffer[:expected_len]; self._finalize_special_op("Screenshot"); continue
+                        self.last_screenshot_hex_byte_time = time.time() 
+                        
+                        if not is_hex: 
+                            is_simple_ignorable = line_str.strip().upper() == "OK" or \
+                                                  "ERROR: EXPECTED NEWLINE" in line_str.upper() or \
+                                                  line_str.strip().upper() == CMD_SCREENSHOT.upper()
+                            is_data_log = self.DATA_LOG_PATTERN.match(line_str)
+
+                            if is_simple_ignorable:
+                                pass 
+                            elif is_data_log:
+                                self._queue_line(line_str, received_at)
+                        continue 
+                    
+                    elif self.expecting_memory_slots:
+                        is_slot = self._is_memory_slot_line(line_str)
+                        is_log = self.DATA_LOG_PATTERN.match(line_str)
+                        is_simple_resp = line_str.strip().upper() == "OK" or "Error: Expected newline" in line_str
+
+                        if is_slot: 
+                            self.memory_slots_buffer.append(line_str); self.last_memory_slot_time = time.time()
+                            if len(self.memory_slots_buffer) >= 32: self._finalize_special_op("Memory"); continue
+                        elif self.memory_slots_buffer: 
+                            if is_log or (line_str and not is_simple_resp): 
+                                self._finalize_special_op("Memory")
+                                if is_log: self._queue_line(line_str, received_at) 
+                                continue
+                            elif is_simple_resp: self.last_memory_slot_time = time.time() 
+                        elif not self.memory_slots_buffer and line_str: 
+                            if is_log: self._queue_line(line_str, received_at)
+                    
+                    elif self.expecting_theme_string:
+                        match = self.THEME_STRING_LINE_PATTERN.match(line_str)
+                        if match:
+                            self.theme_string_buffer = match.group(1) 
+                            print(f"Ctrl: Matched theme string: {self.theme_string_buffer[:60]}...") 
+                            self._finalize_special_op("ThemeGet") 
+                        elif line_str: 
+                            self.last_theme_data_time = time.time() 
+                    
+                    elif line_str: 
+                        if self.DATA_LOG_PATTERN.match(line_str): self._queue_line(line_str, received_at)
+
+            except SerialException as e: print(f"Ctrl: Serial read error: {e}"); self.data_queue.put(('serial_error_disconnect', f"Serial read error: {e}")); self.running = False; break 
+            except Exception as e: 
+                print(f"Ctrl: Unexpected error in read loop: {e}")
+                op_type = "Screenshot" if self.expecting_screenshot_data else \
+                          "Memory" if self.expecting_memory_slots else \
+                          "ThemeGet" if self.expecting_theme_string else None
+                if op_type: self._finalize_special_op(op_type)
+                self.data_queue.put(('serial_error_disconnect', f"Read loop error: {e}")); self.running = False; break
+
+# --- Port Prober ---
+class PortProber:
+    """Finds the ATS-Mini among the serial ports. Every candidate port is opened at once; each turns the status log on
+    with 't', waits for a line matching DATA_LOG_PATTERN and turns it off again, so the radio is left as connect()
+    expects. The last verified port and baud rate are tried first, then 115200, the radio's own rate."""
+    DEFAULT_PATH = os.path.join(os.path.expanduser("~"), ".miniradio", "last_port.json")
+    DEFAULT_BAUDS = [115200]
+    BUDGET = 3.0 # Seconds in which attempts may start; each one that started runs to the end
+    LISTEN_TIME = 0.3 # Frames arriving before the query mean the log was left on
+    QUERY_TIME = 0.8 # Wait after each 't'; the radio logs a status frame about every 0.5 s
+    ATTEMPT_TIME = LISTEN_TIME + 2 * QUERY_TIME # Per port and baud rate, when nothing answers
+    QUIET_TIME = 0.7 # No frame for this long after the final 't' means the log is off
+
+    def __init__(self, path=DEFAULT_PATH):
+        self.path = path; self.last_port = None; self.last_baud = None
+        try:
+            with open(self.path, encoding='utf-8') as f: entry = json.load(f)
+            self.last_port = entry.get('port'); self.last_baud = int(entry['baud']) if entry.get('baud') else None
+        except (OSError, ValueError, TypeError, AttributeError): pass
+
+    def remember(self, port, baud):
+        if (port, int(baud)) == (self.last_port, self.last_baud): return
+        self.last_port = port; self.last_baud = int(baud)
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f: json.dump({'port': port, 'baud': self.last_baud, 'verified_at': time.time()}, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e: print(f"Ctrl: Could not save last port: {e}")
+
+    def probe(self, ports=None, bauds=None, budget=BUDGET):
+        """Returns (port, baud) of the first port that answers like an ATS-Mini, or None after budget seconds."""
+        if ports is None:
+            import serial.tools.list_ports
+            ports = [p.device for p in serial.tools.list_ports.comports()]
+        bauds = [int(b) for b in ([self.last_baud] if self.last_baud else []) + self.DEFAULT_BAUDS + list(bauds or [])]
+        bauds = list(dict.fromkeys(bauds)); ports = sorted(dict.fromkeys(ports), key=lambda p: p != self.last_port)
+        if not ports: return None
+        deadline = time.monotonic() + budget; found = threading.Event(); lock = threading.Lock(); result = []
+        def attempt(port):
+            for baud in bauds:
+                if found.is_set() or time.monotonic() >= deadline: return
+                if self._answers(port, baud, found):
+                    with lock:
+                        if not result: result.append((port, baud)); found.set()
+                    return
+        threads = [threading.Thread(target=attempt, args=(port,), name=f"probe-{port}", daemon=True) for port in ports]
+        started = time.monotonic()
+        for thread in threads: thread.start()
+        found.wait(budget)
+        for thread in threads: thread.join(timeout=max(0.0, deadline - time.monotonic()) + self.ATTEMPT_TIME + 0.5) # Each closes its port
+        if not result: print(f"Ctrl: No radio answered on {len(ports)} port(s) in {time.monotonic() - started:.1f}s."); return None
+        port, baud = result[0]; print(f"Ctrl: Radio found on {port} at {baud} baud in {time.monotonic() - started:.2f}s.")
+        self.remember(port, baud)
+        return port, baud
+
+    def _answers(self, port, baud, cancelled):
+        try: ser = Serial(port, baud, timeout=0.05, write_timeout=0.5)
+        except (SerialException, ValueError, OSError): return False # Busy, gone or not a serial device
+        try:
+            ser.reset_input_buffer()
+            if not self._saw_status(ser, time.monotonic() + self.LISTEN_TIME, cancelled):
+                ser.write(b"t\n")
+                if not self._saw_status(ser, time.monotonic() + self.QUERY_TIME, cancelled):
+                    ser.write(b"t\n") # Undo the query; a radio whose log was already on resumes logging
+                    if not self._saw_status(ser, time.monotonic() + self.QUERY_TIME, cancelled): return False
+            return self._leave_log_off(ser)
+        except (SerialException, OSError): return False
+        finally: ser.close()
+
+    def _leave_log_off(self, ser):
+        for _ in range(3):
+            ser.write(b"t\n"); time.sleep(0.1); ser.reset_input_buffer()
+            if not self._saw_status(ser, time.monotonic() + self.QUIET_TIME, threading.Event()): return True
+        return False
+
+    @staticmethod
+    def _saw_status(ser, until, cancelled):
+        pending = b""
+        while time.monotonic() < until and not cancelled.is_set():
+            pending += ser.readline()
+            if not pending.endswith(b"\n"): continue
+            if RadioController.DATA_LOG_PATTERN.match(pending.decode('ascii', 'replace').strip()): return True
+            pending = b""
+        return False
+
+
+# --- Out-of-Process Serial Engine ---
+class SharedStatusBlock:
+    """Latest status frame in a shared_memory block, guarded by a seqlock: the writer makes the sequence odd, writes
+    the frame, then makes it even; a reader retries until it sees the same even sequence before and after copying."""
+    HEADER = struct.Struct('<QddI') # sequence, received_at, queued_at, line length
+    LINE_MAX = 512
+    SIZE = HEADER.size + LINE_MAX
+    READ_TRIES = 1000 # A publish takes microseconds; a sequence odd for longer means the writer died mid-publish
+
+    def __init__(self, name=None):
+        from multiprocessing import shared_memory # Only the process engine needs it; kept out of start-up
+        self.shm = shared_memory.SharedMemory(name=name, create=name is None, size=self.SIZE)
+        self.name = self.shm.name; self.owner = name is None; self.sequence = 0 # The spawned engine shares the GUI's resource tracker
+
+    def publish(self, line):
+        buf = self.shm.buf; data = str(line).encode('ascii', 'replace')[:self.LINE_MAX]; header = self.HEADER
+        self.sequence += 1; struct.pack_into('<Q', buf, 0, self.sequence)
+        buf[header.size:header.size + len(data)] = data
+        struct.pack_into('<ddI', buf, 8, getattr(line, 'received_at', None) or time.monotonic(), getattr(line, 'queued_at', None) or time.monotonic(), len(data))
+        self.sequence += 1; struct.pack_into('<Q', buf, 0, self.sequence)
+
+    def read(self, last_sequence):
+        """Returns (sequence, TimedLine) if a newer frame than last_sequence is published, else None (also after READ_TRIES
+        torn reads, so a writer killed mid-publish cannot hang the caller)."""
+        buf = self.shm.buf; header = self.HEADER
+        for _ in range(self.READ_TRIES):
+            sequence = struct.unpack_from('<Q', buf, 0)[0]
+            if sequence == last_sequence: return None
+            if sequence & 1: continue
+            _, received_at, queued_at, length = header.unpack_from(buf, 0)
+            data = bytes(buf[header.size:header.size + min(length, self.LINE_MAX)])
+            if struct.unpack_from('<Q', buf, 0)[0] != sequence: continue
+            line = TimedLine(data.decode('ascii', 'replace')); line.received_at = received_at; line.queued_at = queued_at
+            return sequence, line
+        return None
+
+    @property
+    def publishing(self): return bool(struct.unpack_from('<Q', self.shm.buf, 0)[0] & 1)
+
+    def close(self):
+        self.shm.close()
+        if self.owner:
+            try: self.shm.unlink()
+            except FileNotFoundError: pass
+
+
+class SharedStatusQueue(RadioDataQueue):
+    """GUI-side data_queue for the engine process: results and console text arrive through the pipe pump, the status
+    slot is filled from the SharedStatusBlock whenever it is polled. Skipped sequences count as merged frames."""
+
+    def __init__(self, latency):
+        super().__init__(); self.latency = latency; self.block = None; self.last_sequence = 0; self.process = None
+
+    def attach(self, block, process=None): self.block = block; self.process = process; self.last_sequence = 0
+
+    def qsize(self):
+        block = self.block
+        if block is not None:
+            frame = block.read(self.last_sequence)
+            if frame is None and block.publishing and self.process is not None and not self.process.is_alive(): self.block = None # Killed mid-publish; the pump reports it
+            elif frame:
+                sequence, line = frame
+                self.counters['status_merged'] += (sequence - self.last_sequence) // 2 - 1 + (self.status is not None) # Every frame adds 2
+                self.last_sequence = sequence; self.status = line
+                self.latency.record('reader', line.queued_at - line.received_at); self.latency.record_frame(line.received_at)
+        return super().qsize()
+
+    def get(self, block=True, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.cond:
+            while not self.qsize():
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if not block or (remaining is not None and remaining <= 0): raise queue.Empty
+                self.cond.wait(0.01 if remaining is None else min(0.01, remaining)) # Status frames arrive without a notify
+            return self._pop()
+
+
+class _EngineOutbox:
+    """data_queue of the controller inside the engine process: status frames go to shared memory, everything else
+    through the pipe together with the controller's operation flags. No status frame crosses the pipe; the engine's
+    reader logs every one to telemetry and the console log itself."""
+
+    def __init__(self, conn, block, controller):
+        self.conn = conn; self.block = block; self.controller = controller; self.lock = threading.Lock()
+
+    def put(self, item, kind=None):
+        if kind is None: kind = RadioDataQueue.RESULT if isinstance(item, tuple) else RadioDataQueue.STATUS
+        if kind == RadioDataQueue.STATUS: self.block.publish(item)
+        else: self.send(('item', kind, item, ProcessRadioController.flags_of(self.controller)))
+
+    def send(self, message):
+        with self.lock:
+            try: self.conn.send(message)
+            except (OSError, ValueError): pass # GUI side gone; the engine loop exits on its own
+
+
+def run_serial_engine(conn, block_name, record_dir, telemetry_dir=None, console_log_path=None):
+    """Entry point of the engine process: a RadioController driven by calls from the pipe. It writes the telemetry and
+    console logs itself, so no status frame has to cross the pipe for them."""
+    block = SharedStatusBlock(block_name); controller = RadioController(); controller.record_dir = record_dir
+    controller.telemetry_dir = telemetry_dir; controller.console_log_path = console_log_path
+    outbox = controller.data_queue = _EngineOutbox(conn, block, controller); reports = []
+    def report(level, title, message): print(f"Ctrl: {title}: {message}"); reports.append((level, title, message)) # Shown by the GUI
+    controller.report = report
+    try:
+        while True:
+            try: message = conn.recv()
+            except (EOFError, OSError): break
+            if message is None: break
+            method, args, want_reply = message; reports.clear()
+            try: result = getattr(controller, method)(*args)
+            except Exception as e: print(f"Ctrl: Engine call {method} failed: {e}"); result = None
+            outbox.send(('reply' if want_reply else 'state', (result, list(reports)), ProcessRadioController.flags_of(controller)))
+    finally:
+        if controller.running or (controller.ser and controller.ser.is_open): controller.disconnect()
+        controller.close_logs(); block.close()
+
+
+class ProcessRadioController:
+    """Stand-in for RadioController (--engine process) that runs serial I/O, framing and parsing in a child process,
+    so reads never wait for the GUI's GIL. The newest status frame is read from a SharedStatusBlock; results and
+    console text arrive through a pipe into the same data_queue interface the app already drains."""
+    FLAGS = ('expecting_screenshot_data', 'expecting_memory_slots', 'expecting_theme_string', 'theme_get_sequence_active', 'queued_ops')
+    CALL_TIMEOUT = 15.0
+
+    def __init__(self):
+        self.latency = LatencyTracer(); self.data_queue = SharedStatusQueue(self.latency)
+        self.data_received = False; self.sleep_mode = False; self.record_dir = None
+        self.telemetry_dir = None; self.console_log_path = None
+        self.process = None; self.conn = None; self.block = None; self.send_lock = threading.Lock(); self.replies = queue.Queue()
+        for flag in self.FLAGS: setattr(self, flag, False)
+        self.queued_ops = ()
+
+    report = RadioController.report
+
+    @classmethod
+    def flags_of(cls, controller): return tuple(getattr(controller, flag) for flag in cls.FLAGS)
+
+    def _apply_flags(self, flags):
+        for flag, value in zip(self.FLAGS, flags): setattr(self, flag, value)
+
+    def _start_engine(self):
+        import multiprocessing
+        context = multiprocessing.get_context('spawn') # Never fork a process that has Tk and threads running
+        self.block = SharedStatusBlock()
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=run_serial_engine, args=(child_conn, self.block.name, self.record_dir, self.telemetry_dir, self.console_log_path), name="serial-engine", daemon=True)
+        self.process.start(); child_conn.close(); self.data_queue.attach(self.block, self.process)
+        threading.Thread(target=self._pump, args=(self.conn,), name="serial-engine-pump", daemon=True).start()
+        print(f"App: Serial engine process {self.process.pid} started.")
+
+    def _stop_engine(self):
+        conn, process = self.conn, self.process; self.conn = None; self.process = None
+        if conn:
+            try: conn.send(None)
+            except (OSError, ValueError): pass
+        if process:
+            process.join(timeout=3)
+            if process.is_alive(): process.terminate(); process.join(timeout=1)
+        if conn: conn.close()
+        if self.block: self.data_queue.attach(None); self.block.close(); self.block = None
+        for flag in self.FLAGS: setattr(self, flag, False)
+        self.queued_ops = ()
+
+    def _pump(self, conn):
+        while True:
+            try: message = conn.recv()
+            except (EOFError, OSError): break
+            if message[0] == 'item':
+                _, kind, item, flags = message; self._apply_flags(flags); self.data_queue.put(item, kind)
+            else:
+                self._apply_flags(message[2])
+                if message[0] == 'reply': self.replies.put(message[1])
+        self.replies.put((None, [])) # Releases a caller still waiting for a reply
+        if self.conn is conn: self.data_queue.put(('serial_error_disconnect', "Serial engine process exited."))
+
+    def _call(self, method, *args, wait=False):
+        if not self.conn: return None
+        try:
+            with self.send_lock: self.conn.send((method, args, wait))
+        except (OSError, ValueError) as e: print(f"App: Serial engine unreachable: {e}"); return None
+        if not wait: return None
+        try: result, reports = self.replies.get(timeout=self.CALL_TIMEOUT)
+        except queue.Empty: return None
+        for report in reports: self.report(*report)
+        return result
+
+    def _connect_with(self, method, *args):
+        self._stop_engine()
+        while not self.replies.empty(): self.replies.get_nowait()
+        self._start_engine()
+        if self._call(method, *args, wait=True): return True
+        self._stop_engine(); return False
+
+    def connect(self, port, baudrate=115200, usb_serial_number=None): return self._connect_with('connect', port, baudrate, usb_serial_number)
+    def connect_replay(self, session_path, speed=1.0): return self._connect_with('connect_replay', session_path, speed)
+
+    def disconnect(self):
+        self._call('disconnect', wait=True); self._stop_engine(); self.data_received = False
+
+    def close_logs(self): pass # The engine closes its logs when it stops
+
+    def start_reconnect(self): return bool(self.conn) and bool(self._call('start_reconnect', wait=True)) # Not when the engine itself died
+    def stop_reconnect(self): self._call('stop_reconnect', wait=True)
+
+    def send_command(self, cmd, is_user_toggle=False):
+        if not self.conn:
+            if cmd in [CMD_SCREENSHOT, CMD_SHOW_MEM]: self.report('warning', "Not Connected", "Connect to radio first.")
+            return
+        if cmd == CMD_SCREENSHOT: self.expecting_screenshot_data = True # Until the engine's own flags arrive
+        elif cmd == CMD_SHOW_MEM: self.expecting_memory_slots = True
+        self._call('send_command', cmd, is_user_toggle)
+
+    def write_memory_slots(self, slot_entries): self.expecting_memory_slots = True; self._call('write_memory_slots', list(slot_entries))
+
+    def request_theme_data(self, set_theme_str=None):
+        self.expecting_theme_string = self.theme_get_sequence_active = True; self._call('request_theme_data', set_theme_str)
+
+    def request_theme_set(self, theme_x_hex_str): self.request_theme_data(set_theme_str=theme_x_hex_str)
@@ -0,0 +1,327 @@
+"""ATS-Mini serial protocol emulator on a Linux pseudo-terminal.
+
+Speaks the subset of the firmware protocol that MiniRadio4 uses: the 15-field status log ('t'),
+hex BMP screenshots ('C'), memory dumps and writes ('$', '#'), the theme editor ('T', '@', '!')
+and the tuner commands (encoder, band, mode, step, bandwidth, volume, AGC, calibration) driving a
+simulated tuner over a synthetic band of stations.
+
+    python radio_emulator.py --baud 115200 --latency 0.02 --noise 0.01
+
+prints the pty path to give RadioController.connect (or the app's port box, via --link).
+"""
+import argparse
+import bisect
+import os
+import random
+import select
+import struct
+import threading
+import time
+import tty
+
+APP_VERSION = 233
+NUM_MEMORY_SLOTS = 32
+STATUS_INTERVAL = 0.5
+
+# (name, min_hz, max_hz, default_hz, default_mode) in the radio's band order
+BANDS = [
+    ("VHF", 64000000, 108000000, 103900000, "FM"), ("ALL", 150000, 30000000, 15000000, "AM"),
+    ("LW", 150000, 520000, 279000, "AM"), ("MW", 520000, 1710000, 1000000, "AM"), ("SW", 1700000, 30000000, 9500000, "AM"),
+    ("160M", 1800000, 2000000, 1900000, "LSB"), ("80M", 3500000, 4000000, 3700000, "LSB"), ("60M", 5330000, 5410000, 5357000, "USB"),
+    ("40M", 7000000, 7300000, 7074000, "LSB"), ("30M", 10100000, 10150000, 10136000, "USB"), ("20M", 14000000, 14350000, 14074000, "USB"),
+    ("17M", 18068000, 18168000, 18100000, "USB"), ("15M", 21000000, 21450000, 21074000, "USB"), ("12M", 24890000, 24990000, 24940000, "USB"),
+    ("10M", 28000000, 29700000, 28400000, "USB"), ("6M", 50000000, 54000000, 50313000, "USB"), ("CB", 25000000, 28000000, 27135000, "AM"),
+]
+AM_MODES = ["AM", "LSB", "USB", "CW"]
+STEPS = {
+    "FM": [("10k", 10000), ("50k", 50000), ("100k", 100000), ("200k", 200000), ("1m", 1000000)],
+    "AM": [("1k", 1000), ("5k", 5000), ("9k", 9000), ("10k", 10000), ("50k", 50000), ("100k", 100000), ("1m", 1000000)],
+    "SSB": [("10Hz", 10), ("25Hz", 25), ("50Hz", 50), ("0.1k", 100), ("0.5k", 500), ("1k", 1000), ("5k", 5000), ("9k", 9000), ("10k", 10000)],
+}
+DEFAULT_STEP = {"FM": "100k", "AM": "5k", "SSB": "1k"}
+BANDWIDTHS = {"FM": ["Auto", "110k", "84k", "60k", "40k"], "AM": ["1.0k", "1.8k", "2.0k", "2.5k", "3.0k", "4.0k", "6.0k"],
+              "SSB": ["0.5k", "1.0k", "1.2k", "2.2k", "3.0k", "4.0k"]}
+MAX_VOLUME = 63; MAX_AGC = {"FM": 27, "AM": 37, "SSB": 1}
+
+DEFAULT_THEME = [0x0000, 0xFFFF, 0xD69A, 0x07E0, 0xF800, 0xFFE0, 0x001F, 0x7BEF, 0x39E7, 0xFD20, 0x07FF, 0xF81F, 0x8410,
+                 0xC618, 0x2104, 0x4208, 0xBDF7, 0x03EF, 0x7800, 0x000F, 0x780F, 0x7BE0, 0xAFE5, 0xFB56, 0x5AEB, 0x18C3,
+                 0xE71C, 0x0410, 0x8000, 0x0400, 0x0010, 0xA145, 0xDEFB, 0x2945, 0x6B4D, 0x94B2, 0x3186]
+THEME_NAME = "Default"
+
+# Synthetic stations per broadcast segment: (min_hz, max_hz, raster_hz, count, lock width_hz)
+STATION_SEGMENTS = [
+    (87500000, 108000000, 100000, 28, 150000), (530000, 1700000, 9000, 24, 6000), (5900000, 6200000, 5000, 10, 6000),
+    (7200000, 7450000, 5000, 10, 6000), (9400000, 9900000, 5000, 16, 6000), (11600000, 12100000, 5000, 12, 6000),
+    (15100000, 15800000, 5000, 10, 6000), (14000000, 14350000, 1000, 6, 2500),
+]
+
+
+class SyntheticBand:
+    """Fixed random stations with a peak SNR; SNR falls off linearly with tuning error."""
+
+    def __init__(self, seed=0):
+        rng = random.Random(seed); stations = {}
+        for lo, hi, raster, count, width in STATION_SEGMENTS:
+            for _ in range(count):
+                freq = lo + rng.randrange((hi - lo) // raster + 1) * raster
+                stations[freq] = (freq, rng.randint(6, 40), width)
+        self.stations = sorted(stations.values())
+        self.freqs = [s[0] for s in self.stations]
+
+    def snr_at(self, freq_hz):
+        i = bisect.bisect_left(self.freqs, freq_hz - 150000); best = 0
+        while i < len(self.stations) and self.freqs[i] <= freq_hz + 150000:
+            freq, peak, width = self.stations[i]; i += 1
+            best = max(best, int(peak * max(0.0, 1.0 - abs(freq - freq_hz) / width)))
+        return best
+
+
+class RadioEmulator:
+    """Simulated ATS-Mini behind a pty. start() returns the slave path; the serial side never sees the difference."""
+
+    def __init__(self, baud=115200, latency=0.0, noise=0.0, status_interval=STATUS_INTERVAL, screen_size=(320, 170), seed=0, verbose=False):
+        self.baud = baud; self.latency = latency; self.noise = noise; self.status_interval = status_interval
+        self.screen_width, self.screen_height = screen_size; self.verbose = verbose
+        self.rng = random.Random(seed); self.synthetic_band = SyntheticBand(seed)
+        self.master_fd = None; self.slave_fd = None; self.port = None; self.running = False
+        self.output_lock = threading.Condition(); self.output_chunks = []
+        self.stats = {'lines_sent': 0, 'bytes_sent': 0, 'commands': 0, 'lines_corrupted': 0}
+
+        self.log_on = False; self.sleep_on = False; self.theme_editor_on = False
+        self.volume = 35; self.seq = 0; self.voltage = 4.05
+        self.theme = list(DEFAULT_THEME)
+        self.memory = {}
+        self.band_idx = 0
+        self.band_state = [{'freq': b[3], 'mode': b[4], 'step': None, 'bw_idx': 0, 'agc': 0, 'cal': 0} for b in BANDS]
+
+    # --- Lifecycle ---
+    def start(self):
+        self.master_fd, self.slave_fd = os.openpty()
+        tty.setraw(self.slave_fd) # Raw until the client configures the port; the slave stays open so reconnects never see EIO
+        self.port = os.ttyname(self.slave_fd); self.running = True
+        for target in (self._read_loop, self._write_loop, self._status_loop): threading.Thread(target=target, daemon=True).start()
+        return self.port
+
+    def stop(self):
+        self.running = False
+        with self.output_lock: self.output_lock.notify_all()
+        time.sleep(0.15)
+        for fd in (self.master_fd, self.slave_fd):
+            try: os.close(fd)
+            except (OSError, TypeError): pass
+        self.master_fd = self.slave_fd = None
+
+    # --- Tuner state ---
+    @property
+    def band(self): return BANDS[self.band_idx]
+    @property
+    def state(self): return self.band_state[self.band_idx]
+    @property
+    def mode(self): return self.state['mode']
+    @property
+    def mode_family(self): return "FM" if self.mode == "FM" else ("AM" if self.mode == "AM" else "SSB")
+
+    def _steps(self): return STEPS[self.mode_family]
+
+    def _step(self):
+        steps = self._steps(); name = self.state['step']
+        return next((s for s in steps if s[0] == name), next(s for s in steps if s[0] == DEFAULT_STEP[self.mode_family]))
+
+    def _tune(self, direction):
+        _, lo, hi, _, _ = self.band; step_hz = self._step()[1]
+        freq = self.state['freq'] + direction * step_hz
+        if freq > hi: freq = lo
+        elif freq < lo: freq = hi
+        self.state['freq'] = freq
+
+    def _cycle_mode(self, direction):
+        if self.mode == "FM": return # VHF is FM only
+        self.state['mode'] = AM_MODES[(AM_MODES.index(self.mode) + direction) % len(AM_MODES)]
+        self.state['step'] = None; self.state['bw_idx'] = 0; self.state['agc'] = min(self.state['agc'], MAX_AGC[self.mode_family])
+
+    def _cycle_step(self, direction):
+        steps = self._steps(); idx = steps.index(self._step())
+        self.state['step'] = steps[(idx + direction) % len(steps)][0]
+
+    def status_line(self):
+        freq = self.state['freq']; family = self.mode_family
+        if family == "FM": raw_f, bfo = freq // 10000, 0
+        elif family == "SSB": raw_f = freq // 1000; bfo = freq - raw_f * 1000
+        else: raw_f, bfo = freq // 1000, 0
+        snr = self.synthetic_band.snr_at(freq)
+        if snr: snr = max(0, snr + self.rng.randint(-1, 1))
+        rssi = snr + self.rng.randint(8, 12) if snr else self.rng.randint(2, 8)
+        self.seq = (self.seq + 1) % 65536
+        volts = self.voltage + self.rng.uniform(-0.01, 0.01)
+        return (f"{APP_VERSION},{raw_f},{bfo},{self.state['cal']},{self.band[0]},{self.mode},{self._step()[0]},"
+                f"{BANDWIDTHS[family][self.state['bw_idx']]},{self.state['agc']},{self.volume},{rssi},{snr},0,{volts:.2f},{self.seq}")
+
+    # --- Command handling ---
+    def handle_command(self, cmd, arg=""):
+        self.stats['commands'] += 1
+        if self.latency: time.sleep(self.latency)
+        family = self.mode_family
+        if cmd == 't': self.log_on = not self.log_on
+        elif cmd == 'R': self._tune(+1)
+        elif cmd == 'r': self._tune(-1)
+        elif cmd == 'B': self.band_idx = (self.band_idx + 1) % len(BANDS)
+        elif cmd == 'b': self.band_idx = (self.band_idx - 1) % len(BANDS)
+        elif cmd == 'M': self._cycle_mode(+1)
+        elif cmd == 'm': self._cycle_mode(-1)
+        elif cmd == 'S': self._cycle_step(+1)
+        elif cmd == 's': self._cycle_step(-1)
+        elif cmd in 'Ww': self.state['bw_idx'] = (self.state['bw_idx'] + (1 if cmd == 'W' else -1)) % len(BANDWIDTHS[family])
+        elif cmd in 'Vv': self.volume = max(0, min(MAX_VOLUME, self.volume + (1 if cmd == 'V' else -1)))
+        elif cmd in 'Aa': self.state['agc'] = max(0, min(MAX_AGC[family], self.state['agc'] + (1 if cmd == 'A' else -1)))
+        elif cmd in 'Ii':
+            if family == "SSB": self.state['cal'] = max(-2000, min(2000, self.state['cal'] + (10 if cmd == 'I' else -10)))
+        elif cmd == 'O': self.sleep_on = True
+        elif cmd == 'o': self.sleep_on = False
+        elif cmd == 'C': self._send_screenshot()
+        elif cmd == '$':
+            for slot_num in range(1, NUM_MEMORY_SLOTS + 1):
+                band, freq, mode = self.memory.get(slot_num, ('', 0, ''))
+                self.send_line(f"#{slot_num:02d},{band},{freq},{mode}")
+        elif cmd == '#': self._set_memory(arg)
+        elif cmd == 'T': self.theme_editor_on = not self.theme_editor_on
+        elif cmd == '@':
+            if self.theme_editor_on: self.send_line(f"Color theme {THEME_NAME}: " + "".join(f"x{c:04X}" for c in self.theme))
+        elif cmd == '!':
+            if self.theme_editor_on: self._set_theme(arg)
+        # 'e' (encoder button), 'L'/'l' (backlight) and unknown characters have no visible effect on the log
+
+    def _set_memory(self, arg):
+        parts = [p.strip() for p in arg.split(',')]
+        try: slot_num = int(parts[0]); freq = int(parts[2]); band = parts[1]; mode = parts[3]
+        except (ValueError, IndexError): self.send_line("Error: Invalid memory slot"); return
+        if not 1 <= slot_num <= NUM_MEMORY_SLOTS: self.send_line("Error: Invalid memory slot"); return
+        if freq == 0: self.memory.pop(slot_num, None)
+        else: self.memory[slot_num] = (band, freq, mode)
+
+    def _set_theme(self, arg):
+        colors = arg.split('x')[1:]
+        try: values = [int(c, 16) for c in colors if len(c) == 4]
+        except ValueError: values = []
+        if len(values) != len(DEFAULT_THEME) or len(colors) != len(DEFAULT_THEME): self.send_line("Error: Invalid theme"); return
+        self.theme = values
+
+    # --- Screenshot ---
+    def screenshot_bmp(self):
+        """A 16-bit BI_BITFIELDS (RGB565) BMP drawn with the current theme, like the firmware's capture."""
+        w, h = self.screen_width, self.screen_height; theme = self.theme
+        pixels = [[theme[0]] * w for _ in range(h)]
+        def fill(x0, y0, x1, y1, color):
+            for y in range(max(0, y0), min(h, y1)): pixels[y][max(0, x0):min(w, x1)] = [color] * (min(w, x1) - max(0, x0))
+        fill(0, 0, w, h // 8, theme[1 % len(theme)]) # Status bar
+        _, lo, hi, _, _ = self.band
+        fill(w // 10, h // 4, w // 10 + int((w * 8 // 10) * (self.state['freq'] - lo) / max(1, hi - lo)), h // 2, theme[2]) # Tuning position
+        fill(w // 10, h // 2 + 4, w // 10 + int((w * 8 // 10) * min(self.synthetic_band.snr_at(self.state['freq']), 40) / 40), h * 5 // 8, theme[3]) # SNR bar
+        strip = max(1, w // len(theme))
+        for i, color in enumerate(theme): fill(i * strip, h - h // 8, (i + 1) * strip, h, color) # One block per theme slot
+        row_bytes = w * 2; padding = b"\x00" * ((4 - row_bytes % 4) % 4); offset = 14 + 40 + 12
+        rows = [struct.pack(f"<{w}H", *pixels[y]) + padding for y in range(h - 1, -1, -1)] # Bottom-up
+        image = b"".join(rows)
+        header = struct.pack("<2sIHHI", b"BM", offset + len(image), 0, 0, offset)
+        info = struct.pack("<IiiHHIIiiII", 40, w, h, 1, 16, 3, len(image), 2835, 2835, 0, 0)
+        return header + info + struct.pack("<III", 0xF800, 0x07E0, 0x001F) + image
+
+    def _send_screenshot(self):
+        data = self.screenshot_bmp().hex().upper(); line_len = self.screen_width * 4 # One image row per line
+        for i in range(0, len(data), line_len): self.send_line(data[i:i + line_len], corruptible=False)
+
+    # --- Output ---
+    def send_line(self, text, corruptible=True):
+        data = text.encode('ascii') + b"\r\n"
+        if corruptible and self.noise and self.rng.random() < self.noise: data = self._corrupt(data)
+        with self.output_lock:
+            self.output_chunks.append(data); self.output_lock.notify()
+
+    def _corrupt(self, data):
+        self.stats['lines_corrupted'] += 1
+        body = bytearray(data[:-2]); kind = self.rng.randrange(3)
+        if not body: return data
+        pos = self.rng.randrange(len(body))
+        if kind == 0: body[pos] = self.rng.choice(b"!?~;:ZQ0123456789") # Flipped character
+        elif kind == 1: del body[pos] # Dropped character
+        else: body.insert(pos, 0xFF) # Framing garbage that is not valid ASCII/UTF-8
+        return bytes(body) + b"\r\n"
+
+    def _write_loop(self):
+        bytes_per_sec = self.baud / 10.0 if self.baud else 0 # 8N1 framing
+        chunk_size = max(1, int(bytes_per_sec / 100)) if bytes_per_sec else 65536 # ~10 ms of line time per write
+        next_time = time.monotonic()
+        while self.running:
+            with self.output_lock:
+                while self.running and not self.output_chunks: self.output_lock.wait(0.1)
+                if not self.running: break
+                data = b"".join(self.output_chunks); self.output_chunks = []
+                self.stats['lines_sent'] += data.count(b"\n")
+            for i in range(0, len(data), chunk_size):
+                chunk = data[i:i + chunk_size]
+                if bytes_per_sec:
+                    now = time.monotonic(); next_time = max(next_time, now)
+                    if next_time > now: time.sleep(next_time - now)
+                    next_time += len(chunk) / bytes_per_sec
+                try: os.write(self.master_fd, chunk); self.stats['bytes_sent'] += len(chunk)
+                except (OSError, TypeError): return
+
+    def _read_loop(self):
+        pending = b""
+        while self.running:
+            try:
+                ready, _, _ = select.select([self.master_fd], [], [], 0.1)
+                if not ready: continue
+                pending += os.read(self.master_fd, 4096)
+            except (OSError, TypeError, ValueError): return
+            while pending:
+                cmd = chr(pending[0])
+                if cmd in '#!': # Commands with an argument run to the end of the line
+                    if b"\n" not in pending: break
+                    line, pending = pending.split(b"\n", 1)
+                    arg = line[1:].decode('ascii', 'replace').strip()
+                    if self.verbose: print(f"Emulator: {cmd}{arg[:40]}")
+                    self.handle_command(cmd, arg)
+                    continue
+                pending = pending[1:]
+                if cmd in '\r\n ': continue
+                if self.verbose: print(f"Emulator: {cmd}")
+                self.handle_command(cmd)
+
+    def _status_loop(self):
+        next_time = time.monotonic()
+        while self.running:
+            next_time += self.status_interval
+            time.sleep(max(0.0, next_time - time.monotonic()))
+            if self.log_on and self.running: self.send_line(self.status_line())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Emulate an ATS-Mini radio on a pseudo-terminal.")
+    parser.add_argument("--baud", type=int, default=115200, help="Pace output at this line rate (0 = unpaced).")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds before each command takes effect.")
+    parser.add_argument("--noise", type=float, default=0.0, help="Probability that a text line is corrupted.")
+    parser.add_argument("--status-interval", type=float, default=STATUS_INTERVAL, help="Seconds between status log lines.")
+    parser.add_argument("--screen", default="320x170", help="Screenshot size, WIDTHxHEIGHT.")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the synthetic stations and noise.")
+    parser.add_argument("--link", help="Also expose the pty at this path (symlink), e.g. /tmp/ttyATS0.")
+    parser.add_argument("--verbose", action="store_true", help="Print every command received.")
+    args = parser.parse_args()
+
+    width, height = (int(v) for v in args.screen.lower().split('x'))
+    emulator = RadioEmulator(args.baud, args.latency, args.noise, args.status_interval, (width, height), args.seed, args.verbose)
+    port = emulator.start()
+    if args.link:
+        if os.path.islink(args.link): os.remove(args.link)
+        os.symlink(port, args.link)
+    print(f"Emulator: ATS-Mini listening on {args.link or port} ({args.baud} baud, latency {args.latency}s, noise {args.noise})", flush=True)
+    try:
+        while True: time.sleep(1)
+    except KeyboardInterrupt: pass
+    finally:
+        emulator.stop()
+        if args.link and os.path.islink(args.link): os.remove(args.link)
+        print(f"Emulator: stopped. {emulator.stats}")
+
+
+if __name__ == "__main__":
+    main()
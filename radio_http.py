@@ -0,0 +1,182 @@
+"""Read-only HTTP telemetry for one ATS-Mini, for browser dashboards in other rooms: the latest status as JSON, status
+updates as Server-Sent Events and the last screenshot, all served from what the server already holds.
+
+    python miniradio.py http PORT [--listen 0.0.0.0:8073] [--interval 0.5] [--screenshot-max-age 60]
+
+    GET /                 dashboard page (frequency, SNR, RSSI, battery and the screenshot)
+    GET /status           the latest status as JSON: the RadioStatus fields plus freq_hz and frequency
+    GET /events           text/event-stream; the first event is the whole status, later ones only the fields that changed.
+                          ?interval=SECONDS throttles this viewer (at least MIN_INTERVAL); a slow viewer gets merged changes.
+    GET /screenshot.bmp   the last screenshot, taken again at most every screenshot_max_age seconds; ETag / If-None-Match
+
+PORT may be tcp://HOST:PORT of a radio shared by 'serve', so the dashboard can run next to other clients.
+"""
+import asyncio
+import hashlib
+import json
+import time
+import urllib.parse
+
+from async_radio import RadioOperationError
+
+DEFAULT_HOST = "127.0.0.1"; DEFAULT_PORT = 8073
+STATUS_TEXT = {200: "OK", 304: "Not Modified", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 503: "Service Unavailable"}
+
+DASHBOARD = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><meta name="viewport" content="width=device-width"><title>ATS-Mini</title>
+<style>body{font-family:sans-serif;background:#222;color:#eee;margin:1em}td{padding:.2em 1em .2em 0}#frequency{font-size:2em}
+#link{color:#f80}#link.live{color:#4c4}img{image-rendering:pixelated;width:640px;max-width:100%;margin-top:1em}</style></head>
+<body><div id="frequency">-</div><div><span id="band"></span> <span id="mode"></span> <span id="link">&#9679;</span></div>
+<table><tr><td>SNR</td><td id="snr"></td><td>RSSI</td><td id="rssi"></td></tr>
+<tr><td>Battery</td><td id="volt"></td><td>Volume</td><td id="vol"></td></tr>
+<tr><td>Step</td><td id="step"></td><td>BW</td><td id="bw"></td></tr></table>
+<img id="screen" alt="Screenshot" src="screenshot.bmp"><br><button onclick="refresh()">Refresh screenshot</button>
+<script>
+const units = {snr: " dB", rssi: " dBuV", volt: " V"}, state = {}, link = document.getElementById("link");
+function refresh() { document.getElementById("screen").src = "screenshot.bmp?" + Date.now(); }
+const events = new EventSource("events");
+events.onopen = () => link.className = "live"; events.onerror = () => link.className = "";
+events.onmessage = (e) => {
+  const changed = JSON.parse(e.data); Object.assign(state, changed);
+  for (const field in changed) { const cell = document.getElementById(field); if (cell) cell.textContent = state[field] + (units[field] || ""); }
+};
+</script></body></html>
+"""
+
+
+def status_snapshot(status):
+    """RadioStatus -> the JSON object served for it: its fields plus the tuned frequency in Hz and as displayed."""
+    return dict(status._asdict(), freq_hz=status.frequency_hz, frequency=status.frequency_text().split(": ", 1)[-1])
+
+
+# --- Server ---
+class TelemetryHttpServer:
+    """Serves one open radio (AsyncRadioController or RadioClient) to any number of browsers. Each changed status is
+    turned into JSON once and each delta is encoded once for all viewers that last saw the same status, so viewers
+    never touch the serial path; only screenshots do, at most once per screenshot_max_age however many ask."""
+    DEFAULT_INTERVAL = 0.5; MIN_INTERVAL = 0.1 # Seconds between one viewer's events
+    KEEPALIVE = 15.0 # Comment sent to an idle event stream so proxies keep it open
+    REQUEST_TIMEOUT = 10.0
+    ROUTES = {'/': '_get_dashboard', '/status': '_get_status', '/events': '_get_events', '/screenshot.bmp': '_get_screenshot'}
+
+    def __init__(self, radio, interval=DEFAULT_INTERVAL, screenshot_max_age=60.0):
+        self.radio = radio; self.interval = max(self.MIN_INTERVAL, interval); self.screenshot_max_age = screenshot_max_age
+        self.server = None; self.tasks = []; self.connections = {}; self.closed = False
+        self.status = None; self.version = 0; self.changed = asyncio.Event(); self.deltas = {}
+        self.screenshot = None; self.screenshot_at = 0.0; self.screenshot_pending = None
+        self.next_viewer_id = 1; self.stats = {'frames': 0, 'changes': 0, 'events': 0, 'event_bytes': 0, 'screenshots_taken': 0,
+                                               'screenshots_served': 0, 'screenshots_not_modified': 0}
+
+    async def start(self, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        """Listens on host:port (port 0 picks a free one); returns the address actually bound."""
+        self.server = await asyncio.start_server(self._serve, host, port)
+        self.tasks = [asyncio.ensure_future(self._track_status())]
+        return self.server.sockets[0].getsockname()[:2]
+
+    async def close(self):
+        self.closed = True
+        if self.server: self.server.close()
+        handlers = list(self.connections.values())
+        for writer in list(self.connections): writer.close()
+        for task in self.tasks + handlers: task.cancel()
+        await asyncio.gather(*self.tasks, *handlers, return_exceptions=True)
+        if self.server: await self.server.wait_closed()
+
+    # --- Status ---
+    async def _track_status(self):
+        try:
+            if self.radio.status: self._update(self.radio.status)
+            async for status in self.radio.status_frames(): self._update(status)
+        finally: self.closed = True; self.changed.set() # Ends the event streams
+
+    def _update(self, status):
+        self.stats['frames'] += 1; snapshot = status_snapshot(status)
+        if snapshot == self.status: return # Repeated frames wake nobody
+        self.status = snapshot; self.version += 1; self.deltas.clear(); self.stats['changes'] += 1
+        self.changed.set(); self.changed = asyncio.Event()
+
+    def _event(self, sent, sent_version):
+        """The event that brings a viewer from sent (the status at sent_version) to the latest one; shared by every viewer
+        at the same version until the status changes again."""
+        data = self.deltas.get(sent_version)
+        if data is None:
+            changed = {field: value for field, value in self.status.items() if sent.get(field) != value}
+            data = self.deltas[sent_version] = f"id: {self.version}\ndata: {json.dumps(changed, separators=(',', ':'))}\n\n".encode()
+        return data
+
+    # --- HTTP ---
+    async def _serve(self, reader, writer):
+        self.connections[writer] = asyncio.current_task()
+        try:
+            head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), self.REQUEST_TIMEOUT)
+            request_line, *header_lines = head.decode('latin-1').split("\r\n")
+            method, target, _ = request_line.split(" ", 2)
+            headers = {name.strip().lower(): value.strip() for name, _, value in (line.partition(":") for line in header_lines if line)}
+            path, _, query = target.partition("?")
+            handler = self.ROUTES.get(path)
+            if method not in ("GET", "HEAD"): self._respond(writer, 405, b"Only GET and HEAD.\n", headers=["Allow: GET, HEAD"])
+            elif handler is None: self._respond(writer, 404, b"Not found.\n")
+            else: await getattr(self, handler)(writer, headers, urllib.parse.parse_qs(query), method == "HEAD")
+            await writer.drain()
+        except (ValueError, asyncio.LimitOverrunError): self._respond(writer, 400, b"Bad request.\n")
+        except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError): pass
+        except asyncio.CancelledError:
+            if not self.closed: raise # Otherwise close() ended the connection
+        finally: self.connections.pop(writer, None); writer.close()
+
+    @staticmethod
+    def _respond(writer, code, body=b"", content_type="text/plain; charset=utf-8", headers=(), head=False):
+        lines = [f"HTTP/1.1 {code} {STATUS_TEXT[code]}", "Connection: close"] + list(headers)
+        if code != 304: lines += [f"Content-Type: {content_type}", f"Content-Length: {len(body)}"]
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode('latin-1') + (b"" if head or code == 304 else body))
+
+    async def _get_dashboard(self, writer, headers, params, head):
+        self._respond(writer, 200, DASHBOARD.encode(), "text/html; charset=utf-8", head=head)
+
+    async def _get_status(self, writer, headers, params, head):
+        if self.status is None: return self._respond(writer, 503, b"No status from the radio yet.\n", headers=["Retry-After: 1"], head=head)
+        self._respond(writer, 200, json.dumps(self.status).encode(), "application/json", ["Cache-Control: no-cache"], head)
+
+    async def _get_events(self, writer, headers, params, head):
+        try: interval = max(self.MIN_INTERVAL, float(params['interval'][0])) if 'interval' in params else self.interval
+        except ValueError: return self._respond(writer, 400, b"interval must be a number of seconds.\n")
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nCache-Control: no-cache\r\n\r\n")
+        if head: return
+        viewer_id = self.next_viewer_id; self.next_viewer_id += 1; peer = writer.get_extra_info('peername')
+        print(f"{self.radio.port}: viewer {viewer_id} connected from {peer[0]}:{peer[1]}.")
+        sent = {}; sent_version = 0; events = sent_bytes = 0 # Version 0: nothing sent, so the first event is the whole status
+        try:
+            writer.write(b"retry: 3000\n\n"); await writer.drain()
+            while not self.closed:
+                if self.version == sent_version:
+                    try: await asyncio.wait_for(self.changed.wait(), self.KEEPALIVE)
+                    except asyncio.TimeoutError: writer.write(b": keepalive\n\n"); await writer.drain()
+                    continue
+                data = self._event(sent, sent_version); sent, sent_version = self.status, self.version
+                writer.write(data); await writer.drain(); events += 1; sent_bytes += len(data)
+                self.stats['events'] += 1; self.stats['event_bytes'] += len(data)
+                await asyncio.sleep(interval) # Changes during the wait are merged into the next event
+        finally: print(f"{self.radio.port}: viewer {viewer_id} disconnected ({events} updates, {sent_bytes} bytes).")
+
+    async def _get_screenshot(self, writer, headers, params, head):
+        try: data, etag = await self._latest_screenshot()
+        except RadioOperationError as e: return self._respond(writer, 503, f"{e}\n".encode(), head=head)
+        max_age = max(0, int(self.screenshot_max_age - (time.monotonic() - self.screenshot_at)))
+        cache_headers = [f"ETag: {etag}", f"Cache-Control: max-age={max_age}"]
+        if_none_match = [tag.strip() for tag in headers.get('if-none-match', "").split(",")]
+        if etag in if_none_match or "*" in if_none_match:
+            self.stats['screenshots_not_modified'] += 1; return self._respond(writer, 304, headers=cache_headers)
+        self.stats['screenshots_served'] += 1; self._respond(writer, 200, data, "image/bmp", cache_headers, head)
+
+    async def _latest_screenshot(self):
+        """(BMP bytes, ETag) of the cached screenshot, or of a new one when it is too old; concurrent requests share it."""
+        if self.screenshot and time.monotonic() - self.screenshot_at < self.screenshot_max_age: return self.screenshot
+        if self.screenshot_pending is None: self.screenshot_pending = asyncio.ensure_future(self._take_screenshot())
+        return await asyncio.shield(self.screenshot_pending) # A viewer that goes away does not cancel it for the others
+
+    async def _take_screenshot(self):
+        try:
+            data = await self.radio.screenshot(); self.stats['screenshots_taken'] += 1
+            self.screenshot = (data, f'"{hashlib.sha1(data).hexdigest()[:20]}"'); self.screenshot_at = time.monotonic()
+            return self.screenshot
+        finally: self.screenshot_pending = None
@@ -0,0 +1,298 @@
+"""Local TCP multiplexer for one ATS-Mini: the server owns the serial port and shares the radio with any number of
+clients on this machine (the telemetry daemon, scripts, one-shot CLI commands), which could otherwise not open it at once.
+
+    python miniradio.py serve PORT [--listen 127.0.0.1:7373]
+    python miniradio.py status tcp://127.0.0.1:7373
+
+Protocol: one JSON object per line in each direction.
+    client -> server  {"id": 1, "op": "send", "command": "V"}                   plain one-character command
+                      {"id": 2, "op": "screenshot" | "memory" | "theme" | "status"}
+                      {"id": 3, "op": "write_memory", "slots": [...]} / {"op": "theme", "set": "x0000..."}
+                      {"id": 4, "op": "tune", "freq_hz": 95000000} / {"op": "scan", "step": "100k", "dwell": 0.5}
+                      {"id": 5, "op": "lock"} / {"op": "unlock"}                   exclusive use of the radio
+                      {"id": 6, "op": "subscribe", "status": true, "lines": true}  raw lines are off by default
+    server -> client  {"type": "hello", "client": 3, "port": "/dev/ttyACM0", "lock": null}
+                      {"type": "status", "status": {RadioStatus fields}}
+                      {"type": "line", "line": "..."}
+                      {"type": "reply", "id": 2, "result": ...} or {"type": "reply", "id": 2, "error": "..."}
+                      {"type": "lock", "owner": 3}                               owner null when released
+Screenshots travel base64-encoded.
+"""
+import asyncio
+import base64
+import contextlib
+import json
+import time
+
+from radio_core import RadioDataQueue, RadioStatus, CMD_TOGGLE_LOG, CMD_SCREENSHOT, CMD_SHOW_MEM, CMD_THEME_EDITOR_TOGGLE, CMD_THEME_GET
+from async_radio import AsyncRadioController, RadioOperationError
+
+DEFAULT_HOST = "127.0.0.1"; DEFAULT_PORT = 7373
+STREAM_LIMIT = 4 * 1024 * 1024 # Longest line either side reads: a base64 screenshot is a few hundred KB
+RESERVED_COMMANDS = {CMD_TOGGLE_LOG: "the server keeps the status log on", CMD_SCREENSHOT: "use the screenshot operation",
+                     CMD_SHOW_MEM: "use the memory operation", CMD_THEME_EDITOR_TOGGLE: "use the theme operation", CMD_THEME_GET: "use the theme operation"}
+
+
+def encode(message): return (json.dumps(message, separators=(',', ':')) + '\n').encode()
+
+
+def parse_address(text, default_port=DEFAULT_PORT):
+    """'tcp://host:port', 'host:port', ':port' or 'host' -> (host, port)."""
+    address = text.split("://", 1)[-1]; host, separator, port = address.rpartition(":")
+    if not separator: host, port = address, ""
+    return host or DEFAULT_HOST, int(port) if port else default_port
+
+
+# --- Server ---
+class _Client:
+    """A connected client and its outgoing RadioDataQueue, drained by a sender task as fast as the client reads:
+    replies are always delivered, a slow reader gets the newest status frame and loses the oldest raw lines."""
+
+    def __init__(self, client_id, writer, lines_max):
+        self.id = client_id; self.writer = writer; self.peer = writer.get_extra_info('peername')
+        self.outbox = RadioDataQueue(console_max=lines_max); self.wake = asyncio.Event()
+        self.want_status = True; self.want_lines = False; self.requests = set()
+
+    def post(self, data, kind): self.outbox.put(data, kind); self.wake.set()
+
+
+class RadioServer:
+    """Shares one open AsyncRadioController with TCP clients. Each status frame and raw line is encoded once and queued
+    to every subscribed client, so a stalled client never holds up the radio or the others. Plain commands from all
+    clients go through one writer task in arrival order. While a client holds the lock (explicitly, or for the length
+    of its tune or scan), only its commands and operations are accepted."""
+    COMMAND_GAP = 0.03 # Between merged commands, the pacing of the GUI's encoder bursts
+    LINES_MAX = RadioDataQueue.CONSOLE_MAX
+    OPERATIONS = {'send': '_op_send', 'status': '_op_status', 'screenshot': '_op_screenshot', 'memory': '_op_memory',
+                  'write_memory': '_op_write_memory', 'theme': '_op_theme', 'tune': '_op_tune', 'scan': '_op_scan',
+                  'lock': '_op_lock', 'unlock': '_op_unlock', 'subscribe': '_op_subscribe'}
+
+    def __init__(self, radio):
+        self.radio = radio; self.clients = {}; self.next_client_id = 1; self.lock_owner = None
+        self.commands = asyncio.Queue(); self.server = None; self.tasks = []
+
+    async def start(self, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        """Listens on host:port (port 0 picks a free one); returns the address actually bound."""
+        self.server = await asyncio.start_server(self._serve_client, host, port, limit=STREAM_LIMIT)
+        self.radio.line_listeners.append(self._on_line)
+        self.tasks = [asyncio.ensure_future(self._fan_out_status()), asyncio.ensure_future(self._write_commands())]
+        return self.server.sockets[0].getsockname()[:2]
+
+    async def close(self):
+        if self._on_line in self.radio.line_listeners: self.radio.line_listeners.remove(self._on_line)
+        if self.server: self.server.close()
+        for client in list(self.clients.values()): client.writer.close()
+        for task in self.tasks: task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        if self.server: await self.server.wait_closed()
+
+    def _broadcast(self, message, kind=RadioDataQueue.RESULT):
+        data = encode(message)
+        for client in self.clients.values(): client.post(data, kind)
+
+    # --- Fan-out ---
+    async def _fan_out_status(self):
+        async for status in self.radio.status_frames():
+            data = encode({'type': 'status', 'status': status._asdict()})
+            for client in self.clients.values():
+                if client.want_status: client.post(data, RadioDataQueue.STATUS)
+
+    def _on_line(self, line):
+        data = None
+        for client in self.clients.values():
+            if client.want_lines and line: data = data or encode({'type': 'line', 'line': line}); client.post(data, RadioDataQueue.CONSOLE)
+
+    async def _send_to(self, client):
+        try:
+            while True:
+                await client.wake.wait(); client.wake.clear()
+                while not client.outbox.empty(): client.writer.write(client.outbox.get_nowait())
+                await client.writer.drain() # Only this client's sender waits; the fan-out above never does
+        except ConnectionError: client.writer.close()
+
+    # --- Clients ---
+    async def _serve_client(self, reader, writer):
+        client = _Client(self.next_client_id, writer, self.LINES_MAX); self.next_client_id += 1; self.clients[client.id] = client
+        print(f"{self.radio.port}: client {client.id} connected from {client.peer[0]}:{client.peer[1]}.")
+        client.post(encode({'type': 'hello', 'client': client.id, 'port': self.radio.port, 'lock': self.lock_owner}), RadioDataQueue.RESULT)
+        if self.radio.status: client.post(encode({'type': 'status', 'status': self.radio.status._asdict()}), RadioDataQueue.STATUS)
+        sender = asyncio.ensure_future(self._send_to(client))
+        try:
+            while True:
+                line = await reader.readline()
+                if not line: break
+                try: request = json.loads(line)
+                except ValueError: request = None
+                if not isinstance(request, dict): client.post(encode({'type': 'reply', 'id': None, 'error': "Malformed request."}), RadioDataQueue.RESULT); continue
+                task = asyncio.ensure_future(self._handle(client, request)); client.requests.add(task); task.add_done_callback(client.requests.discard)
+        except (ConnectionError, ValueError): pass # ValueError: a line longer than the stream limit
+        finally:
+            del self.clients[client.id]
+            for task in list(client.requests) + [sender]: task.cancel()
+            if self.lock_owner == client.id: self._set_lock(None)
+            writer.close()
+            print(f"{self.radio.port}: client {client.id} disconnected ({client.outbox.format_counters()}).")
+
+    async def _handle(self, client, request):
+        reply = {'type': 'reply', 'id': request.get('id')}
+        try:
+            handler = self.OPERATIONS.get(request.get('op'))
+            if handler is None: raise RadioOperationError(f"Unknown operation {request.get('op')!r}.")
+            reply['result'] = await getattr(self, handler)(client, request)
+        except RadioOperationError as e: reply['error'] = str(e)
+        except (KeyError, TypeError, ValueError) as e: reply['error'] = f"Bad request: {e!r}"
+        client.post(encode(reply), RadioDataQueue.RESULT)
+
+    # --- Arbitration ---
+    def _check_lock(self, client):
+        if self.lock_owner not in (None, client.id): raise RadioOperationError(f"The radio is locked by client {self.lock_owner}.")
+
+    def _set_lock(self, owner): self.lock_owner = owner; self._broadcast({'type': 'lock', 'owner': owner})
+
+    @contextlib.asynccontextmanager
+    async def _exclusive(self, client):
+        self._check_lock(client); already_held = self.lock_owner == client.id
+        if not already_held: self._set_lock(client.id)
+        try: yield
+        finally:
+            if not already_held and self.lock_owner == client.id: self._set_lock(None)
+
+    async def _write_commands(self):
+        while True:
+            client_id, command, done = await self.commands.get()
+            try:
+                if self.lock_owner not in (None, client_id): raise RadioOperationError(f"The radio was locked by client {self.lock_owner}.")
+                await self.radio.send(command)
+            except RadioOperationError as e:
+                if not done.done(): done.set_exception(e)
+            else:
+                if not done.done(): done.set_result(None)
+            await asyncio.sleep(self.COMMAND_GAP)
+
+    # --- Operations ---
+    async def _op_send(self, client, request):
+        command = request['command']
+        if not isinstance(command, str) or len(command) != 1 or not command.isprintable(): raise ValueError("command must be one character")
+        if command in RESERVED_COMMANDS: raise RadioOperationError(f"'{command}' is not sent for clients: {RESERVED_COMMANDS[command]}.")
+        self._check_lock(client)
+        done = asyncio.get_running_loop().create_future(); await self.commands.put((client.id, command, done))
+        await done
+
+    async def _op_status(self, client, request): return (self.radio.status or await self.radio.next_status())._asdict()
+
+    async def _op_screenshot(self, client, request): self._check_lock(client); return base64.b64encode(await self.radio.screenshot()).decode('ascii')
+    async def _op_memory(self, client, request): self._check_lock(client); return await self.radio.memory_slots()
+    async def _op_write_memory(self, client, request): self._check_lock(client); return await self.radio.write_memory_slots(request['slots'])
+    async def _op_theme(self, client, request): self._check_lock(client); return await self.radio.theme(request.get('set'))
+
+    async def _op_tune(self, client, request):
+        async with self._exclusive(client): return (await self.radio.tune(int(request['freq_hz']), request.get('band'), request.get('mode')))._asdict()
+
+    async def _op_scan(self, client, request):
+        async with self._exclusive(client):
+            frames = await self.radio.scan(request.get('step', "100k"), float(request.get('dwell', 0.5)), int(request.get('max_steps', 500)))
+            return [frame._asdict() for frame in frames]
+
+    async def _op_lock(self, client, request):
+        self._check_lock(client)
+        if self.lock_owner != client.id: self._set_lock(client.id)
+
+    async def _op_unlock(self, client, request):
+        if self.lock_owner != client.id: raise RadioOperationError("This client does not hold the lock.")
+        self._set_lock(None)
+
+    async def _op_subscribe(self, client, request):
+        client.want_status = bool(request.get('status', client.want_status)); client.want_lines = bool(request.get('lines', client.want_lines))
+
+
+# --- Client ---
+class RadioClient(AsyncRadioController):
+    """AsyncRadioController for a radio shared by a RadioServer: the same operations, status frames and errors over one
+    TCP connection, plus the raw lines and the lock. miniradio.py uses it for ports given as tcp://host:port."""
+
+    def __init__(self, url, baudrate=None, log=True):
+        super().__init__(url, baudrate, log)
+        self.address = parse_address(url); self.reader = None; self.writer = None; self.receiver = None
+        self.client_id = None; self.lock_owner = None; self.requests = {}; self.next_request_id = 1; self.line_subscribers = set()
+
+    async def open(self):
+        self.loop = asyncio.get_running_loop()
+        try:
+            self.reader, self.writer = await asyncio.open_connection(*self.address, limit=STREAM_LIMIT)
+            hello = json.loads(await self.reader.readline() or b"null")
+        except (OSError, ValueError) as e: raise RadioOperationError(f"Failed to connect to {self.port}: {e}") from e
+        if not isinstance(hello, dict) or hello.get('type') != 'hello': raise RadioOperationError(f"{self.port} is not a radio server.")
+        self.client_id = hello['client']; self.lock_owner = hello['lock']
+        self.receiver = asyncio.ensure_future(self._receive())
+        return self
+
+    async def close(self):
+        if self.writer is None: return
+        self._fail(RadioOperationError("Connection closed."))
+        self.receiver.cancel(); self.writer.close(); self.writer = None
+
+    def _fail(self, error):
+        super()._fail(error)
+        for future in self.requests.values():
+            if not future.done(): future.set_exception(error)
+        self.requests.clear()
+        for subscriber in self.line_subscribers: self._offer(subscriber, error)
+
+    async def _receive(self):
+        try:
+            while True:
+                line = await self.reader.readline()
+                if not line: break
+                message = json.loads(line); kind = message.get('type')
+                if kind == 'status': self._publish_status(RadioStatus(**message['status']), time.monotonic())
+                elif kind == 'line':
+                    for subscriber in self.line_subscribers: self._offer(subscriber, message['line'])
+                elif kind == 'reply':
+                    future = self.requests.pop(message.get('id'), None)
+                    if future and not future.done():
+                        if 'error' in message: future.set_exception(RadioOperationError(message['error']))
+                        else: future.set_result(message.get('result'))
+                elif kind == 'lock': self.lock_owner = message['owner']
+        except (ConnectionError, ValueError): pass
+        self._fail(RadioOperationError(f"{self.port} closed the connection."))
+
+    async def _request(self, op, **args):
+        if self.error: raise self.error
+        request_id = self.next_request_id; self.next_request_id += 1
+        future = self.loop.create_future(); self.requests[request_id] = future
+        try: self.writer.write(encode(dict(args, id=request_id, op=op))); await self.writer.drain()
+        except ConnectionError as e: self.requests.pop(request_id, None); raise RadioOperationError(f"Lost connection to {self.port}: {e}") from e
+        return await future
+
+    # --- Operations ---
+    async def send(self, command): await self._request('send', command=command)
+    async def screenshot(self): return base64.b64decode(await self._request('screenshot'))
+    async def memory_slots(self): return await self._request('memory')
+    async def write_memory_slots(self, slot_entries): return await self._request('write_memory', slots=list(slot_entries))
+    async def theme(self, set_theme=None): return await self._request('theme', set=set_theme)
+    async def tune(self, freq_hz, band=None, mode=None): return RadioStatus(**await self._request('tune', freq_hz=freq_hz, band=band, mode=mode))
+
+    async def scan(self, step="100k", dwell=0.5, max_steps=500):
+        return [RadioStatus(**frame) for frame in await self._request('scan', step=step, dwell=dwell, max_steps=max_steps)]
+
+    async def lock(self): await self._request('lock')
+    async def unlock(self): await self._request('unlock')
+
+    @contextlib.asynccontextmanager
+    async def exclusive(self):
+        """Holds the server's lock for a block of commands that must not be interleaved with other clients' ones."""
+        await self.lock()
+        try: yield self
+        finally:
+            if not self.error: await self.unlock()
+
+    async def lines(self, buffer=RadioDataQueue.CONSOLE_MAX):
+        """Async iterator of every raw line the radio sends; a consumer that falls behind loses the oldest."""
+        subscriber = asyncio.Queue(maxsize=buffer); self.line_subscribers.add(subscriber)
+        if len(self.line_subscribers) == 1: await self._request('subscribe', lines=True)
+        try:
+            while True:
+                item = await subscriber.get()
+                if isinstance(item, Exception): raise item
+                yield item
+        finally: self.line_subscribers.discard(subscriber)
@@ -0,0 +1,247 @@
+"""Offline analytics for MiniRadio4 telemetry (--telemetry .mrt files) and saved FM scan results.
+
+    python telemetry_analysis.py ~/.miniradio/telemetry [--scans scan1.txt ...] [--output report/]
+
+Telemetry files are memory-mapped and walked one chunk at a time as NumPy views over the mapped pages,
+so memory use depends on the number of distinct frequencies and minutes logged, not on file size.
+Writes summary tables (occupancy.csv, scan_occupancy.csv, snr_by_hour.csv, battery.csv) and PNG plots
+(occupancy.png, snr_by_hour.png, battery.png) to the output directory, and prints the headline numbers.
+"""
+import argparse
+import csv
+import glob
+import mmap
+import os
+import re
+import sys
+import time
+
+from PIL import Image, ImageDraw
+try: import numpy as np
+except ImportError: np = None
+
+from radio_core import TelemetryLogger
+
+SNR_OCCUPIED = 10 # dB; a frequency counts as occupied when its mean SNR reaches this
+BATTERY_BIN = 60 # seconds per battery curve point
+SESSION_GAP = 600 # seconds without frames that ends a discharge segment
+CHARGE_RISE_MV = 50 # a rise this large between bins means the radio was charging
+SCAN_LINE_PATTERN = re.compile(r"Frequency:\s*([\d.]+)\s*(MHz|kHz),\s*SNR:\s*(-?\d+)")
+
+
+# --- Accumulation ---
+class TelemetrySummary:
+    """Running totals merged from one chunk at a time; only per-frequency, per-hour and per-minute aggregates are kept."""
+    def __init__(self):
+        self.frames = 0; self.files = 0; self.first_time = None; self.last_time = None
+        self.bands = [] # Global band names; per-chunk codes are remapped onto these
+        self.occupancy = {} # (band index, freq_hz) -> [frames, snr sum, frames at/above SNR_OCCUPIED, max snr]
+        self.hour_snr = {} # band index -> float64[2, 24] of (snr sum, frames) per UTC hour
+        self.battery = {} # minute bin -> [voltage mV sum, frames]
+
+    def _band_index(self, name):
+        if name not in self.bands: self.bands.append(name)
+        return self.bands.index(name)
+
+    def add_file(self, path):
+        with open(path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0: return 0
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        rows_before = self.frames
+        for tables, rows, chunk in TelemetryLogger.iter_chunks(data):
+            if rows: self.add_chunk(tables, {name: np.frombuffer(view, dtype=dtype) for name, (dtype, view) in chunk.items()})
+        self.files += 1
+        return self.frames - rows_before
+
+    def add_chunk(self, tables, columns):
+        t = columns['time']; freq = columns['freq_hz']; snr = columns['snr'].astype(np.int64); volt = columns['voltage_mv']
+        band_map = np.array([self._band_index(name) for name in tables['band']] or [0], dtype=np.int64)
+        band = band_map[np.minimum(columns['band'], len(band_map) - 1)]
+        self.frames += len(t)
+        self.first_time = float(t.min()) if self.first_time is None else min(self.first_time, float(t.min()))
+        self.last_time = float(t.max()) if self.last_time is None else max(self.last_time, float(t.max()))
+
+        keys, inverse = np.unique((band << 32) | freq.astype(np.int64), return_inverse=True)
+        counts = np.bincount(inverse, minlength=len(keys)); sums = np.bincount(inverse, weights=snr, minlength=len(keys))
+        occupied = np.bincount(inverse, weights=snr >= SNR_OCCUPIED, minlength=len(keys))
+        maxima = np.full(len(keys), np.iinfo(np.int64).min); np.maximum.at(maxima, inverse, snr)
+        for key, n, s, o, m in zip(keys.tolist(), counts.tolist(), sums.tolist(), occupied.tolist(), maxima.tolist()):
+            entry = self.occupancy.get((key >> 32, key & 0xFFFFFFFF))
+            if entry is None: self.occupancy[(key >> 32, key & 0xFFFFFFFF)] = [n, s, o, m]
+            else: entry[0] += n; entry[1] += s; entry[2] += o; entry[3] = max(entry[3], m)
+
+        hours = ((t // 3600) % 24).astype(np.int64)
+        for band_index in np.unique(band).tolist():
+            mask = band == band_index
+            grid = self.hour_snr.setdefault(band_index, np.zeros((2, 24)))
+            grid[0] += np.bincount(hours[mask], weights=snr[mask], minlength=24); grid[1] += np.bincount(hours[mask], minlength=24)
+
+        powered = volt > 0
+        if powered.any():
+            minutes, inverse = np.unique((t[powered] // BATTERY_BIN).astype(np.int64), return_inverse=True)
+            sums = np.bincount(inverse, weights=volt[powered]); counts = np.bincount(inverse)
+            for minute, s, n in zip(minutes.tolist(), sums.tolist(), counts.tolist()):
+                entry = self.battery.get(minute)
+                if entry is None: self.battery[minute] = [s, n]
+                else: entry[0] += s; entry[1] += n
+
+    def occupancy_rows(self):
+        """(band, freq_hz, frames, mean snr, occupied fraction, max snr) sorted by band then frequency."""
+        rows = [(self.bands[b], f, n, s / n, o / n, m) for (b, f), (n, s, o, m) in self.occupancy.items()]
+        return sorted(rows, key=lambda r: (r[0], r[1]))
+
+    def battery_curve(self):
+        """Returns (times, volts) as arrays of per-bin mean voltage."""
+        minutes = np.array(sorted(self.battery), dtype=np.int64)
+        volts = np.array([self.battery[m][0] / self.battery[m][1] / 1000.0 for m in minutes.tolist()])
+        return minutes * BATTERY_BIN, volts
+
+    def discharge_segments(self, min_minutes=30):
+        """Splits the battery curve at gaps and charging steps; yields (start, end, start V, end V, drain mV/h)."""
+        times, volts = self.battery_curve()
+        if len(times) < 2: return []
+        breaks = np.nonzero((np.diff(times) > SESSION_GAP) | (np.diff(volts) * 1000 > CHARGE_RISE_MV))[0] + 1
+        segments = []
+        for seg_t, seg_v in zip(np.split(times, breaks), np.split(volts, breaks)):
+            if seg_t[-1] - seg_t[0] < min_minutes * 60: continue
+            slope = np.polyfit((seg_t - seg_t[0]) / 3600.0, seg_v * 1000, 1)[0]
+            segments.append((float(seg_t[0]), float(seg_t[-1]), float(seg_v[0]), float(seg_v[-1]), -slope))
+        return segments
+
+
+def read_scan_files(paths):
+    """Streams saved FM scan result files; returns {freq_khz: [scans seen in, snr sum, max snr]} and the file count."""
+    stations = {}; scans = 0
+    for path in paths:
+        seen = set()
+        with open(path, encoding='utf-8', errors='replace') as f:
+            for line in f:
+                m = SCAN_LINE_PATTERN.search(line)
+                if not m: continue
+                freq_khz = round(float(m.group(1)) * (1000 if m.group(2) == 'MHz' else 1)); snr = int(m.group(3))
+                if freq_khz in seen: continue
+                seen.add(freq_khz)
+                entry = stations.setdefault(freq_khz, [0, 0, snr])
+                entry[0] += 1; entry[1] += snr; entry[2] = max(entry[2], snr)
+        scans += 1
+    return stations, scans
+
+
+# --- Plotting ---
+def _color_ramp(value):
+    """0..1 -> dark blue through green to yellow."""
+    value = max(0.0, min(1.0, value))
+    return (int(255 * max(0.0, value * 2 - 1)), int(40 + 200 * min(1.0, value * 1.5)), int(160 * (1 - value)))
+
+
+def plot_occupancy(rows, path, width=1000, strip_height=120):
+    """One strip per band: a bar per frequency, height = mean SNR, color = fraction of frames at/above SNR_OCCUPIED."""
+    bands = sorted({r[0] for r in rows})
+    image = Image.new('RGB', (width, max(1, len(bands)) * (strip_height + 30) + 10), 'white'); draw = ImageDraw.Draw(image)
+    max_snr = max([r[3] for r in rows] + [1])
+    for i, band in enumerate(bands):
+        band_rows = [r for r in rows if r[0] == band]; top = 10 + i * (strip_height + 30); base = top + strip_height
+        lo = min(r[1] for r in band_rows); hi = max(r[1] for r in band_rows); span = max(hi - lo, 1)
+        draw.text((5, top), f"{band}: {lo / 1000:g}-{hi / 1000:g} kHz", fill='black')
+        draw.line([(60, base), (width - 10, base)], fill='gray')
+        for _, freq, _, mean_snr, occupied, _ in band_rows:
+            x = 60 + int((freq - lo) / span * (width - 80)); h = int(max(mean_snr, 0) / max_snr * (strip_height - 15))
+            draw.rectangle([x, base - h, x + 2, base], fill=_color_ramp(occupied))
+    image.save(path)
+
+
+def plot_heatmap(summary, path, cell=28):
+    """Mean SNR per band (rows) and UTC hour (columns)."""
+    band_indices = sorted(summary.hour_snr, key=lambda b: summary.bands[b])
+    grids = [summary.hour_snr[b] for b in band_indices]
+    means = [np.where(g[1] > 0, g[0] / np.maximum(g[1], 1), np.nan) for g in grids]
+    finite = [m[np.isfinite(m)] for m in means]; values = np.concatenate(finite) if finite else np.array([])
+    lo = float(values.min()) if values.size else 0.0; hi = float(values.max()) if values.size else 1.0
+    left = 70; image = Image.new('RGB', (left + 24 * cell + 10, 30 + max(1, len(band_indices)) * cell + 10), 'white'); draw = ImageDraw.Draw(image)
+    for hour in range(0, 24, 3): draw.text((left + hour * cell + 4, 8), f"{hour:02d}", fill='black')
+    draw.text((5, 8), f"{lo:.0f}-{hi:.0f} dB", fill='black')
+    for row, (b, mean) in enumerate(zip(band_indices, means)):
+        y = 30 + row * cell; draw.text((5, y + cell // 3), summary.bands[b][:10], fill='black')
+        for hour in range(24):
+            fill = (235, 235, 235) if not np.isfinite(mean[hour]) else _color_ramp((mean[hour] - lo) / max(hi - lo, 1e-9))
+            draw.rectangle([left + hour * cell, y, left + (hour + 1) * cell - 2, y + cell - 2], fill=fill)
+    image.save(path)
+
+
+def plot_battery(times, volts, path, width=1000, height=300):
+    image = Image.new('RGB', (width, height), 'white'); draw = ImageDraw.Draw(image)
+    if len(times) < 2: image.save(path); return
+    lo = float(volts.min()) - 0.05; hi = float(volts.max()) + 0.05; t0 = float(times[0]); span = max(float(times[-1]) - t0, 1.0)
+    for v in np.arange(np.ceil(lo * 10) / 10, hi, 0.1):
+        y = int(height - 20 - (v - lo) / (hi - lo) * (height - 40)); draw.line([(50, y), (width - 10, y)], fill=(225, 225, 225)); draw.text((5, y - 6), f"{v:.1f}V", fill='black')
+    xs = 50 + (times - t0) / span * (width - 60); ys = height - 20 - (volts - lo) / (hi - lo) * (height - 40)
+    gaps = np.diff(times) > SESSION_GAP
+    for i in range(len(xs) - 1):
+        if not gaps[i]: draw.line([(xs[i], ys[i]), (xs[i + 1], ys[i + 1])], fill=(30, 90, 200), width=2)
+    draw.text((50, height - 15), time.strftime("%Y-%m-%d %H:%M", time.gmtime(t0)) + " UTC", fill='black')
+    draw.text((width - 180, height - 15), time.strftime("%Y-%m-%d %H:%M", time.gmtime(float(times[-1]))) + " UTC", fill='black')
+    image.save(path)
+
+
+# --- Reports ---
+def write_csv(path, header, rows):
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f); writer.writerow(header); writer.writerows(rows)
+
+
+def expand_paths(paths, pattern):
+    files = []
+    for path in paths:
+        files.extend(sorted(glob.glob(os.path.join(path, pattern))) if os.path.isdir(path) else [path])
+    return files
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize MiniRadio4 telemetry and FM scan logs into tables and PNG plots.")
+    parser.add_argument("telemetry", nargs="*", default=[TelemetryLogger.DEFAULT_DIR], help="Telemetry .mrt files or directories.")
+    parser.add_argument("--scans", nargs="+", default=[], help="Saved FM scan result .txt files or directories.")
+    parser.add_argument("--output", default="telemetry-report", help="Directory for CSV tables and PNG plots.")
+    args = parser.parse_args()
+    if np is None: parser.error("numpy is required for telemetry analysis (pip install numpy).")
+    os.makedirs(args.output, exist_ok=True)
+
+    summary = TelemetrySummary(); started = time.perf_counter()
+    for path in expand_paths(args.telemetry, "*" + TelemetryLogger.SUFFIX):
+        try: print(f"{path}: {summary.add_file(path)} frames")
+        except (OSError, ValueError) as e: print(f"{path}: skipped ({e})")
+    if summary.frames:
+        occupancy = summary.occupancy_rows()
+        write_csv(os.path.join(args.output, "occupancy.csv"), ["band", "freq_hz", "frames", "mean_snr", "occupied_fraction", "max_snr"],
+                  [(b, f, n, f"{s:.1f}", f"{o:.3f}", m) for b, f, n, s, o, m in occupancy])
+        write_csv(os.path.join(args.output, "snr_by_hour.csv"), ["band"] + [f"{h:02d}" for h in range(24)],
+                  [[summary.bands[b]] + ["" if g[1][h] == 0 else f"{g[0][h] / g[1][h]:.1f}" for h in range(24)] for b, g in sorted(summary.hour_snr.items(), key=lambda i: summary.bands[i[0]])])
+        times, volts = summary.battery_curve()
+        write_csv(os.path.join(args.output, "battery.csv"), ["time_utc", "voltage"],
+                  [(time.strftime("%Y-%m-%d %H:%M", time.gmtime(t)), f"{v:.3f}") for t, v in zip(times.tolist(), volts.tolist())])
+        plot_occupancy(occupancy, os.path.join(args.output, "occupancy.png"))
+        plot_heatmap(summary, os.path.join(args.output, "snr_by_hour.png"))
+        plot_battery(times, volts, os.path.join(args.output, "battery.png"))
+
+        print(f"\n{summary.frames} frames from {summary.files} files, {time.strftime('%Y-%m-%d %H:%M', time.gmtime(summary.first_time))} to "
+              f"{time.strftime('%Y-%m-%d %H:%M', time.gmtime(summary.last_time))} UTC")
+        print(f"{'Band':<10} {'Freqs':>6} {'Occupied':>9} {'Frames':>9}")
+        for band in sorted(set(summary.bands)):
+            band_rows = [r for r in occupancy if r[0] == band]
+            if band_rows: print(f"{band:<10} {len(band_rows):>6} {sum(1 for r in band_rows if r[3] >= SNR_OCCUPIED):>9} {sum(r[2] for r in band_rows):>9}")
+        for start, end, v0, v1, drain in summary.discharge_segments():
+            print(f"Discharge {time.strftime('%m-%d %H:%M', time.gmtime(start))}-{time.strftime('%m-%d %H:%M', time.gmtime(end))}: "
+                  f"{v0:.2f}V -> {v1:.2f}V over {(end - start) / 3600:.1f}h ({drain:.0f} mV/h)")
+
+    scan_files = expand_paths(args.scans, "*.txt")
+    if scan_files:
+        stations, scans = read_scan_files(scan_files)
+        rows = sorted((f, n, f"{n / scans:.3f}", f"{s / n:.1f}", m) for f, (n, s, m) in stations.items())
+        write_csv(os.path.join(args.output, "scan_occupancy.csv"), ["freq_khz", "scans_seen", "seen_fraction", "mean_snr", "max_snr"], rows)
+        print(f"\n{len(stations)} stations across {scans} scans; seen in every scan: {sum(1 for _, n, _, _, _ in rows if n == scans)}")
+    if not summary.frames and not scan_files: print("No telemetry frames or scan files found."); return 1
+    print(f"\nReport written to {args.output} in {time.perf_counter() - started:.1f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())